@@ -0,0 +1,63 @@
+"""新浪行情解析微基准：输出每秒解析的行数
+
+用法: python benchmarks/bench_sina_parser.py [--symbols 1000] [--repeat 20]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sina_parser import parse_payload, parse_payload_array  # noqa: E402
+
+SAMPLE_FIELDS = ("浦发银行,10.20,10.10,10.35,10.50,10.01,10.34,10.35,12345600,127000000.00,"
+                 "100,10.34,200,10.33,300,10.32,400,10.31,500,10.30,"
+                 "100,10.35,200,10.36,300,10.37,400,10.38,500,10.39,2025-03-14,15:00:00,00")
+
+
+def make_payload(symbols):
+    """生成包含 symbols 行的GBK编码响应"""
+    lines = [f'var hq_str_sh{600000 + i}="{SAMPLE_FIELDS}";' for i in range(symbols)]
+    return '\n'.join(lines).encode('gbk')
+
+
+def parse_legacy(data):
+    """旧实现的做法：逐行正则匹配后逐字段 float 转换，用作对照"""
+    text = data.decode('gbk')
+    result = {}
+    for line in text.split('\n'):
+        match = re.search(r'"(.*)"', line)
+        if match:
+            stock_data = match.group(1).split(',')
+            result[line[11:19]] = [float(v) for v in stock_data[1:30]]
+    return result
+
+
+def bench(func, data, lines, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        best = min(best, time.perf_counter() - start)
+    return lines / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', type=int, nargs='+', default=[1, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'symbols':>8} {'legacy':>14} {'parse_payload':>14} {'parse_array':>14}  (lines/sec)")
+    for symbols in args.symbols:
+        data = make_payload(symbols)
+        print(f"{symbols:>8} "
+              f"{bench(parse_legacy, data, symbols, args.repeat):>14,.0f} "
+              f"{bench(parse_payload, data, symbols, args.repeat):>14,.0f} "
+              f"{bench(parse_payload_array, data, symbols, args.repeat):>14,.0f}")
+
+
+if __name__ == '__main__':
+    main()
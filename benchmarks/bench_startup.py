@@ -0,0 +1,75 @@
+"""启动耗时基准：模块导入时间和窗口首次绘制时间
+
+每次测量都在新的Python进程中进行，避免模块缓存影响结果。
+用法: python benchmarks/bench_startup.py [--runs 5] [--offscreen]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子进程中执行：记录导入耗时、首次绘制耗时以及启动时已加载的重量级模块
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+import pyramid_stock_tool
+imported = time.perf_counter()
+
+from PyQt5.QtCore import QEvent, QObject, QTimer
+from PyQt5.QtWidgets import QApplication
+
+class FirstPaint(QObject):
+    painted = None
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and self.painted is None:
+            self.painted = time.perf_counter()
+            QTimer.singleShot(0, app.quit)
+        return False
+
+app = QApplication(sys.argv)
+probe = FirstPaint()
+window = pyramid_stock_tool.PyramidStockTool()
+window.installEventFilter(probe)
+window.show()
+QTimer.singleShot(10000, app.quit)
+app.exec_()
+
+print(json.dumps({
+    'import_s': imported - start,
+    'first_paint_s': (probe.painted or time.perf_counter()) - start,
+    'loaded': [m for m in ('matplotlib', 'requests', 'pyramid_chart', 'sina_quote')
+               if m in sys.modules],
+}))
+'''
+
+
+def measure(offscreen):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    if offscreen:
+        env['QT_QPA_PLATFORM'] = 'offscreen'
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--offscreen', action='store_true', help="使用Qt offscreen平台(无显示器环境)")
+    args = parser.parse_args()
+
+    results = [measure(args.offscreen) for _ in range(args.runs)]
+    import_ms = statistics.median(r['import_s'] for r in results) * 1000
+    paint_ms = statistics.median(r['first_paint_s'] for r in results) * 1000
+    print(f"导入耗时(中位数):     {import_ms:8.1f} ms")
+    print(f"首次绘制耗时(中位数): {paint_ms:8.1f} ms")
+    print(f"启动时已加载的延迟模块: {results[-1]['loaded'] or '无'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""行情刷新链路压力测试
+
+在本地回放服务器(sina_replay_server.py)上运行 RefreshScheduler + SinaQuoteClient 的完整刷新循环：
+调度器按请求预算取出到期的股票，客户端分批并发请求、解析，结果写回调度器安排下一次刷新。
+可以模拟数千只股票、接口延迟和错误，不访问真实的新浪接口。
+
+输出每次刷新(一次 due() 取出的全部股票)的往返耗时分位数、吞吐量、每只股票的实际刷新间隔，
+以及客户端重试、失败次数和服务器注入的故障数。
+
+用法:
+    python benchmarks/load_test_refresh.py --symbols 5000 --duration 30
+    python benchmarks/load_test_refresh.py --latency 50 --jitter 30 --error-rate 0.02 --rps 20
+    python benchmarks/load_test_refresh.py --url http://127.0.0.1:8765/list= --symbols 1000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+
+from perf_metrics import metrics, format_snapshot  # noqa: E402
+from refresh_scheduler import RefreshScheduler, MARKET_TZ  # noqa: E402
+from sina_quote import SinaQuoteClient  # noqa: E402
+from sina_replay_server import (start_replay_server, synthetic_codes, load_recorded_feed,  # noqa: E402
+                                SyntheticFeed)
+
+# 调度器只在交易时段内刷新，测试时钟从某个交易日的开盘后开始走
+SESSION_START = datetime(2025, 3, 10, 9, 30, tzinfo=MARKET_TZ)
+# 没有完成的请求时主循环的等待时间(秒)
+POLL_INTERVAL = 0.005
+
+
+def session_clock(start=SESSION_START):
+    """与真实时间同速、从 start 开始的时钟"""
+    offset = start.timestamp() - time.time()
+    return lambda: time.time() + offset
+
+
+def percentiles(values, qs=(50, 95, 99)):
+    if not values:
+        return {f'p{q}_ms': 0.0 for q in qs}
+    array = np.asarray(values) * 1000
+    return {f'p{q}_ms': float(np.percentile(array, q)) for q in qs}
+
+
+def run(codes, url, duration, interval, rps, batch_size, workers, retries, backoff):
+    """运行刷新循环 duration 秒，返回统计字典"""
+    client = SinaQuoteClient(base_url=url, batch_size=batch_size, max_workers=workers,
+                             retries=retries, backoff=backoff)
+    scheduler = RefreshScheduler(base_interval=interval, fast_interval=interval,
+                                 slow_interval=interval, max_requests_per_second=rps,
+                                 batch_size=batch_size, clock=session_clock())
+    for code in codes:
+        scheduler.add(code)
+    metrics.reset()
+
+    inflight = {}  # Future -> (开始时间, 代码列表)
+    roundtrips = []
+    refreshes = dict.fromkeys(codes, 0)
+    quotes = empty = failed_symbols = failed_rounds = 0
+
+    start = time.perf_counter()
+    deadline = start + duration
+    try:
+        while time.perf_counter() < deadline:
+            due = scheduler.due()
+            if due:
+                inflight[client.submit(due)] = (time.perf_counter(), due)
+            if not inflight:
+                time.sleep(POLL_INTERVAL)
+                continue
+            done, _ = wait(list(inflight), timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                submitted, batch = inflight.pop(future)
+                roundtrips.append(time.perf_counter() - submitted)
+                try:
+                    result = future.result()
+                except Exception:
+                    # 整批失败：按原间隔重新安排，不立即重试
+                    failed_rounds += 1
+                    failed_symbols += len(batch)
+                    for code in batch:
+                        scheduler.record_quote(code, None)
+                    continue
+                for code in batch:
+                    quote = result.get(code)
+                    if quote is None:
+                        empty += 1
+                        scheduler.record_quote(code, None)
+                        continue
+                    quotes += 1
+                    refreshes[code] += 1
+                    scheduler.record_quote(code, quote.price)
+        # 等待最后一批请求完成，耗时不计入吞吐量
+        if inflight:
+            wait(list(inflight))
+    finally:
+        elapsed = time.perf_counter() - start
+        client.close()
+
+    counts = np.fromiter(refreshes.values(), dtype=np.float64, count=len(refreshes))
+    refreshed = counts[counts > 0]
+    snapshot = metrics.snapshot()
+    http = snapshot['spans'].get('quote.http', {})
+    return {
+        'symbols': len(codes),
+        'duration_s': elapsed,
+        'rounds': len(roundtrips),
+        'http_requests': http.get('count', 0),
+        'quotes': quotes,
+        'quotes_per_s': quotes / elapsed if elapsed else 0.0,
+        'empty_quotes': empty,
+        'failed_rounds': failed_rounds,
+        'failed_symbols': failed_symbols,
+        'retries': snapshot['counters'].get('quote.retries', 0),
+        'roundtrip': dict(percentiles(roundtrips), max_ms=max(roundtrips, default=0.0) * 1000),
+        # 每只股票相邻两次成功刷新之间的平均间隔
+        'refresh_interval_s': float(elapsed / refreshed.mean()) if len(refreshed) else None,
+        'never_refreshed': int(len(counts) - len(refreshed)),
+        'deferred_by_budget': scheduler.deferred_by_budget,
+        'metrics': snapshot,
+    }
+
+
+def format_report(report):
+    roundtrip = report['roundtrip']
+    interval = report['refresh_interval_s']
+    lines = [
+        f"股票数量      {report['symbols']}",
+        f"运行时间      {report['duration_s']:.1f} 秒",
+        f"刷新轮次      {report['rounds']}  (HTTP请求 {report['http_requests']}，重试 {report['retries']})",
+        f"行情数量      {report['quotes']}  ({report['quotes_per_s']:.0f} 条/秒，无数据 {report['empty_quotes']})",
+        f"失败          {report['failed_rounds']} 轮 / {report['failed_symbols']} 只次",
+        f"往返耗时      P50 {roundtrip['p50_ms']:.1f}ms  P95 {roundtrip['p95_ms']:.1f}ms  "
+        f"P99 {roundtrip['p99_ms']:.1f}ms  最大 {roundtrip['max_ms']:.1f}ms",
+        f"实际刷新间隔  {'--' if interval is None else f'{interval:.2f} 秒'}"
+        f"  (从未刷新 {report['never_refreshed']} 只，预算不足推迟 {report['deferred_by_budget']} 次)",
+    ]
+    if 'server' in report:
+        server = report['server']
+        lines.append(f"服务器        请求 {server['requests']}，注入503 {server['errors']}，"
+                     f"断开 {server['disconnects']}，跳动 {server['tick']} 次")
+    lines += ['', format_snapshot(report['metrics'])]
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', type=int, default=2000, help="刷新的股票数量")
+    parser.add_argument('--duration', type=float, default=20.0, help="运行时间(秒)")
+    parser.add_argument('--interval', type=float, default=3.0, help="每只股票的刷新间隔(秒)")
+    parser.add_argument('--rps', type=float, default=50, help="调度器每秒请求预算")
+    parser.add_argument('--batch-size', type=int, default=100, help="单次请求合并的股票数量")
+    parser.add_argument('--workers', type=int, default=4, help="客户端并发请求数")
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--backoff', type=float, default=0.05, help="重试等待的初始时间(秒)")
+    parser.add_argument('--url', help="使用已启动的回放服务器，不在本进程内启动")
+    parser.add_argument('--replay', help="回放历史库或导出的行情历史，代替模拟行情")
+    parser.add_argument('--tick-rate', type=float, default=1.0)
+    parser.add_argument('--latency', type=float, default=0.0, help="服务器固定延迟(毫秒)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="服务器随机延迟上限(毫秒)")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--disconnect-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="把统计结果另存为JSON文件")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.url:
+        url = args.url
+        codes = synthetic_codes(args.symbols)
+    else:
+        feed = (load_recorded_feed(args.replay) if args.replay
+                else SyntheticFeed(args.symbols, seed=args.seed))
+        codes = feed.codes[:args.symbols]
+        server = start_replay_server(feed, tick_rate=args.tick_rate, latency=args.latency / 1000,
+                                     jitter=args.jitter / 1000, error_rate=args.error_rate,
+                                     disconnect_rate=args.disconnect_rate, seed=args.seed)
+        url = server.base_url
+
+    report = run(codes, url, args.duration, args.interval, args.rps, args.batch_size,
+                 args.workers, args.retries, args.backoff)
+    if server is not None:
+        report['server'] = server.stats()
+        server.shutdown()
+        server.server_close()
+    print(format_report(report))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
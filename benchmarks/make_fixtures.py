@@ -0,0 +1,68 @@
+"""生成基准测试使用的新浪行情响应样本
+
+样本按真实响应的格式(GBK编码、var hq_str_ 前缀)生成，包含沪深两市、停牌和无数据的代码，
+固定随机种子，重新生成的文件内容不变。
+用法: python benchmarks/make_fixtures.py
+"""
+import os
+import random
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FIXTURE_SIZES = (1, 100, 1000)
+
+NAMES = ('浦发银行', '平安银行', '万科Ａ', '贵州茅台', '中国平安', '招商银行', '五粮液', '宁德时代',
+         '东方财富', '比亚迪', '隆基绿能', '中信证券', '格力电器', '美的集团', '海康威视', '迈瑞医疗')
+
+
+def fixture_path(symbols):
+    return os.path.join(FIXTURE_DIR, f'sina_{symbols}.txt')
+
+
+def make_line(rng, index):
+    market = ('sh', 'sz', 'sz')[index % 3]
+    number = (600000, 1, 300001)[index % 3] + index
+    code = f'{market}{number:06d}'
+    if index % 97 == 96:
+        # 代码不存在时新浪返回空字符串
+        return f'var hq_str_{code}="";'
+
+    prev_close = round(rng.uniform(2, 200), 2)
+    suspended = index % 53 == 52
+    if suspended:
+        price = open_ = high = low = 0.0
+        volume = amount = 0
+    else:
+        price = round(prev_close * rng.uniform(0.9, 1.1), 2)
+        open_ = round(prev_close * rng.uniform(0.97, 1.03), 2)
+        high = max(price, open_) + round(rng.uniform(0, 0.05) * price, 2)
+        low = min(price, open_) - round(rng.uniform(0, 0.05) * price, 2)
+        volume = rng.randrange(100, 50000000, 100)
+        amount = round(volume * price, 2)
+
+    fields = [NAMES[index % len(NAMES)], f'{open_:.2f}', f'{prev_close:.2f}', f'{price:.2f}',
+              f'{high:.2f}', f'{low:.2f}', f'{max(price - 0.01, 0):.2f}', f'{price:.2f}',
+              str(volume), f'{amount:.2f}']
+    # 五档买盘和卖盘，数量和价格交替
+    for side in (-1, 1):
+        for level in range(5):
+            fields.append(str(rng.randrange(0, 100000, 100)))
+            fields.append(f'{max(price + side * 0.01 * (level + (side > 0)), 0):.2f}')
+    fields += ['2025-03-14', '15:00:00', '03' if suspended else '00']
+    return f'var hq_str_{code}="{",".join(fields)}";'
+
+
+def make_fixture(symbols, seed=20250314):
+    rng = random.Random(seed)
+    return '\n'.join(make_line(rng, i) for i in range(symbols)).encode('gbk') + b'\n'
+
+
+def main():
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for symbols in FIXTURE_SIZES:
+        with open(fixture_path(symbols), 'wb') as f:
+            f.write(make_fixture(symbols))
+        print(f"已生成 {fixture_path(symbols)}")
+
+
+if __name__ == '__main__':
+    main()
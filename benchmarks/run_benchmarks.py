@@ -0,0 +1,378 @@
+"""基准测试套件
+
+覆盖计划计算、批量场景、导出和导入、行情解析、表格填充、图表绘制(离屏)和本地桩服务器上的行情刷新。
+每项测试自动确定循环次数，重复采样后记录中位数、最小值和标准差；
+结果按提交号保存在 benchmarks/results/ 下，可与之前的结果对比。
+
+用法:
+    python benchmarks/run_benchmarks.py                     # 运行全部并保存结果
+    python benchmarks/run_benchmarks.py -k parse chart      # 只运行名称包含 parse 或 chart 的测试
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/abc1234.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, 'benchmarks')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+# 表格和图表测试使用离屏平台，在无显示器的环境也能运行
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np  # noqa: E402
+
+from make_fixtures import fixture_path, FIXTURE_SIZES  # noqa: E402
+
+# 每个样本至少持续的时间(秒)，耗时很短的函数在一个样本内循环多次
+MIN_SAMPLE_TIME = 0.05
+DEFAULT_REPEAT = 7
+# 对比时超过该比例视为变慢
+REGRESSION_THRESHOLD = 1.10
+
+PLAN_LEVELS = (20, 200, 2000)
+BATCH_SIZES = (10000, 100000)
+
+_CASES = []
+
+
+class SkipBenchmark(Exception):
+    """缺少可选依赖时跳过该项测试"""
+
+
+def benchmark(name, params=(None,)):
+    """注册基准测试：被装饰的函数接收参数，返回要计时的无参函数"""
+    def decorator(setup):
+        for param in params:
+            full_name = name if param is None else f'{name}[{param}]'
+            _CASES.append((full_name, setup, param))
+        return setup
+    return decorator
+
+
+def measure(func, repeat=DEFAULT_REPEAT, min_time=MIN_SAMPLE_TIME):
+    """返回单次调用耗时(秒)的统计"""
+    func()  # 预热，排除首次调用的导入和缓存开销
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+    samples = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - start) / loops)
+    return {
+        'median': statistics.median(samples),
+        'min': min(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'loops': loops,
+        'repeat': len(samples),
+    }
+
+
+# ---- 计划计算 ----
+
+@benchmark('plan.compute', PLAN_LEVELS)
+def bench_plan_compute(levels):
+    from pyramid_engine import compute_plan
+    return lambda: compute_plan(10.0, 8.0, 100000.0, 12.0, intervals=levels)
+
+
+@benchmark('plan.update_target', PLAN_LEVELS)
+def bench_plan_update_target(levels):
+    """只修改目标价时的增量重算"""
+    from plan_model import PlanModel
+    model = PlanModel(intervals=levels)
+    targets = iter(np.resize(np.linspace(11, 13, 50), 10 ** 7))
+    return lambda: model.update(10.0, 8.0, 100000.0, next(targets))
+
+
+@benchmark('batch.sweep', BATCH_SIZES)
+def bench_batch_sweep(scenarios):
+    from pyramid_engine import compute_plans_batch
+    rng = np.random.default_rng(0)
+    current = rng.uniform(5, 100, scenarios)
+    stop = current * rng.uniform(0.5, 0.95, scenarios)
+    capital = rng.uniform(1e4, 1e6, scenarios)
+    return lambda: compute_plans_batch(current, stop, capital, include_ladders=False)
+
+
+def _sweep_export(fmt):
+    """返回把10万个场景的风险指标分块写出到临时文件的函数和文件路径"""
+    import tempfile
+    from pyramid_engine import iter_plan_batches
+    from pyramid_export import export_sweep
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SkipBenchmark("未安装 pyarrow")
+    rng = np.random.default_rng(0)
+    current = rng.uniform(5, 100, BATCH_SIZES[-1])
+    stop = current * rng.uniform(0.5, 0.95, len(current))
+    capital = rng.uniform(1e4, 1e6, len(current))
+    path = os.path.join(tempfile.mkdtemp(), f'sweep.{fmt}')
+    return lambda: export_sweep(path, iter_plan_batches(current, stop, capital,
+                                                        include_ladders=False)), path
+
+
+@benchmark('export.sweep', ('csv', 'parquet'))
+def bench_export_sweep(fmt):
+    return _sweep_export(fmt)[0]
+
+
+@benchmark('import.sweep', ('csv', 'parquet'))
+def bench_import_sweep(fmt):
+    from pyramid_export import read_plan_inputs
+    export, path = _sweep_export(fmt)
+    export()
+    return lambda: read_plan_inputs(path)
+
+
+# ---- 行情解析 ----
+
+def _load_fixture(symbols):
+    with open(fixture_path(symbols), 'rb') as f:
+        return f.read()
+
+
+@benchmark('parse.payload', FIXTURE_SIZES)
+def bench_parse_payload(symbols):
+    from sina_parser import parse_payload
+    data = _load_fixture(symbols)
+    return lambda: parse_payload(data)
+
+
+@benchmark('parse.array', FIXTURE_SIZES)
+def bench_parse_array(symbols):
+    from sina_parser import parse_payload_array
+    data = _load_fixture(symbols)
+    return lambda: parse_payload_array(data)
+
+
+# ---- 界面 ----
+
+_qt_app = None
+
+
+def _qt_application():
+    global _qt_app
+    try:
+        from PyQt5.QtWidgets import QApplication
+    except ImportError:
+        raise SkipBenchmark("未安装 PyQt5")
+    if _qt_app is None:
+        _qt_app = QApplication.instance() or QApplication([])
+    return _qt_app
+
+
+@benchmark('table.populate', PLAN_LEVELS)
+def bench_table_populate(levels):
+    """切换计划并绘制表格视图"""
+    _qt_application()
+    from PyQt5.QtWidgets import QTableView
+    from plan_table_model import PlanTableModel
+    from pyramid_engine import compute_plan
+
+    model = PlanTableModel()
+    view = QTableView()
+    view.setModel(model)
+    view.resize(1000, 600)
+    plans = [compute_plan(10.0, 8.0, 100000.0, target, intervals=levels) for target in (12.0, 13.0)]
+    state = {'index': 0}
+
+    def run():
+        state['index'] ^= 1
+        model.set_plan(plans[state['index']])
+        view.viewport().grab()
+    return run
+
+
+def _agg_chart():
+    try:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+    except ImportError:
+        raise SkipBenchmark("未安装 matplotlib")
+    from pyramid_chart import PyramidChart, set_matplotlib_chinese_font
+    set_matplotlib_chinese_font()
+    figure = Figure(figsize=(5, 8), dpi=100)
+    return PyramidChart(figure, FigureCanvasAgg(figure))
+
+
+@benchmark('chart.full_draw', (20, 200))
+def bench_chart_full_draw(levels):
+    import warnings
+    from pyramid_engine import compute_plan
+    warnings.filterwarnings('ignore', message='Glyph')  # 未安装中文字体时的缺字警告
+    chart = _agg_chart()
+    plans = [compute_plan(10.0, stop, 100000.0, 12.0, intervals=levels) for stop in (8.0, 7.5)]
+    state = {'index': 0}
+
+    def run():
+        state['index'] ^= 1
+        chart.update(plans[state['index']])
+    return run
+
+
+@benchmark('chart.live_price')
+def bench_chart_live_price(_):
+    import warnings
+    from pyramid_engine import compute_plan
+    warnings.filterwarnings('ignore', message='Glyph')
+    chart = _agg_chart()
+    chart.update(compute_plan(10.0, 8.0, 100000.0, 12.0))
+    prices = iter(np.resize(np.linspace(8.5, 9.5, 100), 10 ** 7))
+    return lambda: chart.update_live_price(next(prices))
+
+
+# ---- 行情刷新 ----
+
+_stub_server = None
+
+
+def _stub_url():
+    global _stub_server
+    if _stub_server is None:
+        from stub_server import start_stub_server
+        _stub_server = start_stub_server()
+    return f'http://127.0.0.1:{_stub_server.server_port}/list='
+
+
+@benchmark('refresh.stub', FIXTURE_SIZES)
+def bench_refresh_stub(symbols):
+    """对本地桩服务器的批量刷新，不使用缓存"""
+    try:
+        from sina_quote import SinaQuoteClient
+    except ImportError:
+        raise SkipBenchmark("未安装 requests")
+    from sina_parser import iter_payload_lines
+    codes = [code for code, _ in iter_payload_lines(_load_fixture(symbols))]
+    client = SinaQuoteClient(base_url=_stub_url())
+    return lambda: client.fetch(codes)
+
+
+# ---- 结果保存与对比 ----
+
+def git_revision():
+    """当前提交号，工作区有未提交修改时加上 -dirty"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run(patterns, repeat):
+    results = {}
+    for name, setup, param in _CASES:
+        if patterns and not any(p in name for p in patterns):
+            continue
+        try:
+            func = setup(param)
+        except SkipBenchmark as e:
+            print(f"{name:<28} 跳过: {e}")
+            continue
+        stats = measure(func, repeat)
+        results[name] = stats
+        print(f"{name:<28} {format_seconds(stats['median']):>12}  "
+              f"(最小 {format_seconds(stats['min'])}, ±{stats['stdev'] / stats['median'] * 100:.1f}%)")
+    return results
+
+
+def format_seconds(seconds):
+    if seconds >= 1:
+        return f"{seconds:.3f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.1f} us"
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """打印与基线的对比，返回变慢的测试数量"""
+    print(f"\n对比基线 {baseline.get('revision', '?')} -> {current.get('revision', '?')}")
+    regressions = 0
+    for name, stats in current['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        ratio = stats['median'] / old['median']
+        flag = ''
+        if ratio > threshold:
+            flag = '  变慢'
+            regressions += 1
+        elif ratio < 1 / threshold:
+            flag = '  变快'
+        print(f"{name:<28} {format_seconds(old['median']):>12} -> "
+              f"{format_seconds(stats['median']):>12}  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-k', dest='patterns', nargs='*', default=[],
+                        help="只运行名称包含任一关键字的测试")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--compare', help="与之前保存的结果文件对比")
+    parser.add_argument('--output', help="结果文件路径，默认 benchmarks/results/<提交号>.json")
+    parser.add_argument('--no-save', action='store_true', help="不保存结果")
+    parser.add_argument('--list', action='store_true', help="只列出测试名称")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, _, _ in _CASES:
+            print(name)
+        return 0
+
+    revision = git_revision()
+    report = {
+        'revision': revision,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment(),
+        'results': run(args.patterns, args.repeat),
+    }
+
+    if not args.no_save:
+        path = args.output or os.path.join(RESULTS_DIR, f'{revision}.json')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {path}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        return 1 if compare(report, baseline) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""基准测试用的本地行情桩服务器
+
+按请求的代码从样本文件中返回对应行，未知代码返回空字符串，响应格式与新浪接口一致。
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from make_fixtures import fixture_path, FIXTURE_SIZES
+
+
+def load_fixture_lines(symbols=max(FIXTURE_SIZES)):
+    """返回 {代码: GBK编码的整行}"""
+    lines = {}
+    with open(fixture_path(symbols), 'rb') as f:
+        for line in f.read().split(b'\n'):
+            start = line.find(b'hq_str_')
+            if start < 0:
+                continue
+            end = line.find(b'=', start)
+            lines[line[start + 7:end].decode('ascii')] = line + b'\n'
+    return lines
+
+
+class StubQuoteHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 保持连接，与真实接口一样复用连接
+    # 响应头和正文分两次写出，关闭Nagle算法避免与延迟确认叠加出40ms等待
+    disable_nagle_algorithm = True
+    lines = {}
+
+    def do_GET(self):
+        _, _, codes = self.path.partition('list=')
+        body = b''.join(self.lines.get(code) or f'var hq_str_{code}="";\n'.encode('ascii')
+                        for code in codes.split(',') if code)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/javascript; charset=GBK')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(host='127.0.0.1', port=0):
+    """在后台线程启动桩服务器，port 为0时自动分配端口"""
+    handler = type('Handler', (StubQuoteHandler,), {'lines': load_fixture_lines()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='stub-quote-server', daemon=True).start()
+    return server
@@ -0,0 +1,107 @@
+"""诊断面板
+
+显示关键路径耗时统计和各组件的运行计数，提供性能分析开关和JSON导出。
+只在面板可见时定时刷新，不占用界面线程。
+"""
+import json
+
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
+                             QPlainTextEdit, QFileDialog, QLabel)
+from PyQt5.QtGui import QFontDatabase
+from PyQt5.QtCore import QTimer
+
+from perf_metrics import metrics, format_snapshot, profiler
+
+# 面板可见时的刷新间隔(毫秒)
+DIAGNOSTICS_REFRESH_MS = 1000
+
+
+class DiagnosticsPanel(QWidget):
+    """耗时统计面板，sections() 返回 {标题: 字典} 形式的附加运行信息"""
+
+    def __init__(self, sections=None, registry=metrics, profiler=profiler, parent=None):
+        super().__init__(parent)
+        self.sections = sections
+        self.registry = registry
+        self.profiler = profiler
+
+        layout = QVBoxLayout(self)
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        layout.addWidget(self.text)
+
+        button_layout = QHBoxLayout()
+        self.profile_button = QPushButton("开始性能分析")
+        self.profile_button.clicked.connect(self.toggle_profiler)
+        button_layout.addWidget(self.profile_button)
+
+        export_button = QPushButton("导出JSON")
+        export_button.clicked.connect(self.export_json)
+        button_layout.addWidget(export_button)
+
+        reset_button = QPushButton("清空统计")
+        reset_button.clicked.connect(self.reset)
+        button_layout.addWidget(reset_button)
+
+        self.status_label = QLabel("")
+        button_layout.addWidget(self.status_label, 1)
+        layout.addLayout(button_layout)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self.refresh()
+        self.timer.start(DIAGNOSTICS_REFRESH_MS)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def report(self):
+        """面板显示的完整文本"""
+        text = format_snapshot(self.registry.snapshot())
+        if self.sections is not None:
+            for title, values in self.sections().items():
+                if not values:
+                    continue
+                text += f"\n\n[{title}]"
+                for key, value in values.items():
+                    value = f"{value:.4g}" if isinstance(value, float) else value
+                    text += f"\n{key:<24}{value}"
+        if self.profiler.last_stats:
+            text += "\n\n[最近一次性能分析]\n" + self.profiler.last_stats
+        return text
+
+    def refresh(self):
+        # 保持滚动位置，避免查看分析结果时跳回顶部
+        scroll = self.text.verticalScrollBar().value()
+        self.text.setPlainText(self.report())
+        self.text.verticalScrollBar().setValue(scroll)
+
+    def toggle_profiler(self):
+        running, _ = self.profiler.toggle()
+        self.profile_button.setText("停止性能分析" if running else "开始性能分析")
+        self.status_label.setText("正在分析界面线程和后台任务..." if running else "分析结果已显示在下方")
+        self.refresh()
+
+    def export_json(self):
+        path, _ = QFileDialog.getSaveFileName(self, "导出性能统计", "metrics.json", "JSON (*.json)")
+        if not path:
+            return
+        snapshot = self.registry.snapshot()
+        if self.sections is not None:
+            snapshot['sections'] = self.sections()
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False, indent=2, default=str)
+        except OSError as e:
+            self.status_label.setText(f"导出失败: {e}")
+            return
+        self.status_label.setText(f"已导出到 {path}")
+
+    def reset(self):
+        self.registry.reset()
+        self.refresh()
@@ -0,0 +1,205 @@
+"""实时行情与加仓价位的成交跟踪
+
+为多只股票保存当前生效的加仓计划，每收到一笔行情就找出被穿越的加仓价位，
+记为成交并更新实际平均成本和累计投入，再通知监听者。
+加仓价位从高到低排列，价格跌到某个价位时它上方的价位必然已经成交，
+因此每只股票只需记录已成交的价位数量，新行情用二分查找在 O(log n) 内定位。
+"""
+import bisect
+import threading
+import time
+
+FILL = 'fill'
+STOP = 'stop'
+
+
+class Fill:
+    """一个加仓价位的成交记录"""
+
+    __slots__ = ('symbol', 'level', 'level_price', 'price', 'shares', 'investment',
+                 'cumulative_investment', 'cumulative_shares', 'avg_cost', 'timestamp')
+
+    def __init__(self, symbol, level, level_price, price, shares, investment,
+                 cumulative_investment, cumulative_shares, avg_cost, timestamp):
+        self.symbol = symbol
+        self.level = level
+        self.level_price = level_price
+        self.price = price
+        self.shares = shares
+        self.investment = investment
+        self.cumulative_investment = cumulative_investment
+        self.cumulative_shares = cumulative_shares
+        self.avg_cost = avg_cost
+        self.timestamp = timestamp
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"Fill({self.symbol}, 第{self.level + 1}区间, {self.shares}股 @ {self.price:.2f})"
+
+
+class ActivePlan:
+    """一只股票当前生效的计划及成交进度"""
+
+    __slots__ = ('symbol', 'plan', 'rules', 'neg_prices', 'shares', 'filled', 'fills',
+                 'realized_investment', 'realized_shares', 'stopped')
+
+    def __init__(self, symbol, plan, rules=None):
+        self.symbol = symbol
+        self.plan = plan
+        # 生成计划时的 LotRules，成交投入与计划一样包含佣金；None 表示不计佣金
+        self.rules = rules
+        # 取负后为升序，便于 bisect 查找
+        self.neg_prices = [-float(p) for p in plan.buy_prices]
+        self.shares = [int(s) for s in plan.shares]
+        self.filled = 0
+        self.fills = []
+        self.realized_investment = 0.0
+        self.realized_shares = 0
+        self.stopped = False
+
+    @property
+    def next_level_price(self):
+        """下一个待成交的价位，全部成交后为 None"""
+        if self.filled >= len(self.neg_prices):
+            return None
+        return -self.neg_prices[self.filled]
+
+    @property
+    def avg_cost(self):
+        return self.realized_investment / self.realized_shares if self.realized_shares else 0.0
+
+    def same_orders(self, plan):
+        """新计划的价位和股数是否与当前计划相同(例如只修改了目标价)"""
+        return (len(plan.buy_prices) == len(self.neg_prices)
+                and all(-a == float(b) for a, b in zip(self.neg_prices, plan.buy_prices))
+                and all(a == int(b) for a, b in zip(self.shares, plan.shares)))
+
+
+class FillTracker:
+    """多只股票加仓计划的成交跟踪器
+
+    监听者签名为 listener(kind, symbol, payload)：kind 为 FILL 时 payload 为本笔行情
+    新成交的 Fill 列表，为 STOP 时 payload 为触发止损的价格。监听者在调用 on_tick 的线程中执行。
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._active = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.ticks = 0
+        self.fill_count = 0
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def __contains__(self, symbol):
+        return symbol in self._active
+
+    def __len__(self):
+        return len(self._active)
+
+    def set_plan(self, symbol, plan, rules=None):
+        """设置股票的生效计划，rules 为生成计划时的下单规则；价位和股数没有变化时保留已有的成交进度"""
+        with self._lock:
+            active = self._active.get(symbol)
+            if active is not None and active.same_orders(plan):
+                active.plan = plan
+                active.rules = rules
+                return active
+            active = ActivePlan(symbol, plan, rules)
+            self._active[symbol] = active
+            return active
+
+    def remove(self, symbol):
+        with self._lock:
+            self._active.pop(symbol, None)
+
+    def get(self, symbol):
+        return self._active.get(symbol)
+
+    def on_tick(self, symbol, price, timestamp=None):
+        """处理一笔行情，返回新成交的 Fill 列表"""
+        if not price or price <= 0:
+            # 停牌或未开盘
+            return []
+        with self._lock:
+            self.ticks += 1
+            active = self._active.get(symbol)
+            if active is None or active.stopped:
+                return []
+            stop_hit = price < active.plan.stop_loss
+            # 价格不低于下一个待成交价位时直接返回，绝大多数行情走这条路径
+            if active.filled >= len(active.neg_prices) or price > -active.neg_prices[active.filled]:
+                fills = []
+            else:
+                fills = self._fill(active, price, timestamp)
+            if stop_hit:
+                active.stopped = True
+
+        if fills:
+            self._notify(FILL, symbol, fills)
+        if stop_hit:
+            self._notify(STOP, symbol, price)
+        return fills
+
+    def on_quotes(self, quotes, timestamp=None):
+        """批量处理 {代码: Quote}，返回 {代码: 新成交的 Fill 列表}，只包含有成交的股票"""
+        result = {}
+        for symbol, quote in quotes.items():
+            if quote is not None and symbol in self._active:
+                fills = self.on_tick(symbol, quote.price, timestamp)
+                if fills:
+                    result[symbol] = fills
+        return result
+
+    def _fill(self, active, price, timestamp):
+        """调用方需持有锁：成交所有不低于 price 的价位"""
+        crossed = bisect.bisect_right(active.neg_prices, -price)
+        timestamp = self.clock() if timestamp is None else timestamp
+        fills = []
+        for level in range(active.filled, crossed):
+            level_price = -active.neg_prices[level]
+            # 跳空穿越多个价位时按当前价成交
+            fill_price = min(level_price, price)
+            shares = active.shares[level]
+            investment = shares * fill_price
+            if active.rules is not None:
+                investment += float(active.rules.commission(investment))
+            active.realized_investment += investment
+            active.realized_shares += shares
+            fill = Fill(active.symbol, level, level_price, fill_price, shares, investment,
+                        active.realized_investment, active.realized_shares, active.avg_cost, timestamp)
+            active.fills.append(fill)
+            fills.append(fill)
+        active.filled = crossed
+        self.fill_count += len(fills)
+        return fills
+
+    def _notify(self, kind, symbol, payload):
+        for listener in list(self._listeners):
+            try:
+                listener(kind, symbol, payload)
+            except Exception as e:
+                print(f"成交通知处理失败: {e}")
+
+    def summary(self, symbol):
+        """某只股票的成交进度，没有生效计划时返回 None"""
+        active = self._active.get(symbol)
+        if active is None:
+            return None
+        return {
+            'filled_levels': active.filled,
+            'intervals': len(active.neg_prices),
+            'next_level_price': active.next_level_price,
+            'realized_investment': active.realized_investment,
+            'realized_shares': active.realized_shares,
+            'avg_cost': active.avg_cost,
+            'stopped': active.stopped,
+        }
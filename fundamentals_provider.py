@@ -0,0 +1,289 @@
+"""股票基本面数据
+
+FundamentalsProvider.get(code, price) 返回基本面字典，没有该股票的数据时返回 None。
+
+- SnapshotFundamentalsProvider 读取全市场的每日快照(CSV/Parquet)。首次读取后转换成同名 .npy，
+  之后以只读内存映射打开；启动时建立一次 代码→行号 索引，每次查询为 O(1)，不需要网络。
+- EstimatedFundamentalsProvider 是原来按当前价格推算的演示数据，只在没有快照或快照中没有
+  该股票时兜底，结果的 source 标记为估算值。
+"""
+import csv
+import datetime
+import math
+import os
+
+import numpy as np
+
+# 基本面字段：市盈率(TTM)、市净率、总市值(亿元)、换手率(%)、股息率(%)
+FUNDAMENTAL_FIELDS = ('pe_ratio', 'pb_ratio', 'market_cap', 'turnover_rate', 'dividend_yield')
+
+# 快照文件中可以使用的列名，不区分大小写
+SYMBOL_COLUMNS = ('symbol', 'code', 'ts_code')
+FIELD_COLUMNS = {
+    'pe_ratio': ('pe_ratio', 'pe_ttm', 'pe'),
+    'pb_ratio': ('pb_ratio', 'pb'),
+    'market_cap': ('market_cap',),
+    'turnover_rate': ('turnover_rate', 'turnover'),
+    'dividend_yield': ('dividend_yield', 'dv_ttm', 'dv_ratio'),
+}
+
+SOURCE_SNAPSHOT = 'snapshot'
+SOURCE_ESTIMATE = 'estimate'
+
+SNAPSHOT_ENV = 'PYRAMID_FUNDAMENTALS'
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.expanduser('~'), '.pyramid_stock_tool')
+DEFAULT_SNAPSHOT_NAMES = ('fundamentals.parquet', 'fundamentals.csv')
+
+SYMBOL_LENGTH = 12
+SNAPSHOT_DTYPE = np.dtype([('symbol', f'U{SYMBOL_LENGTH}')] + [(f, 'f8') for f in FUNDAMENTAL_FIELDS])
+
+
+def normalize_code(code):
+    """统一股票代码：600000、sh600000、600000.SH 都视为 600000"""
+    code = str(code).strip().lower()
+    if code[:2] in ('sh', 'sz', 'bj') and code[2:].isdigit():
+        code = code[2:]
+    return code.split('.')[0]
+
+
+def _find_column(names, candidates):
+    lookup = {name.strip().lower(): name for name in names}
+    for candidate in candidates:
+        if candidate in lookup:
+            return lookup[candidate]
+    return None
+
+
+def _to_float(values):
+    """数值列转换为浮点数组，空值和无法解析的值为 NaN"""
+    array = np.asarray(values)
+    if array.dtype.kind in 'fiu':
+        return array.astype(np.float64)
+    result = np.full(len(array), np.nan)
+    for i, value in enumerate(array.tolist()):
+        try:
+            result[i] = float(value)
+        except (TypeError, ValueError):
+            pass
+    return result
+
+
+def snapshot_from_columns(columns):
+    """由 {列名: 序列} 构造按代码排序的快照结构化数组，重复的代码保留最后一条"""
+    symbol_column = _find_column(columns, SYMBOL_COLUMNS)
+    if symbol_column is None:
+        raise ValueError(f"基本面快照缺少代码列，可用列名: {', '.join(SYMBOL_COLUMNS)}")
+    symbols = [normalize_code(s) for s in np.asarray(columns[symbol_column]).tolist()]
+    snapshot = np.empty(len(symbols), dtype=SNAPSHOT_DTYPE)
+    snapshot['symbol'] = symbols
+    for field, candidates in FIELD_COLUMNS.items():
+        column = _find_column(columns, candidates)
+        snapshot[field] = np.nan if column is None else _to_float(columns[column])
+
+    # 倒序后 unique 取到的是每个代码最后一次出现的位置
+    _, last = np.unique(snapshot['symbol'][::-1], return_index=True)
+    return snapshot[len(snapshot) - 1 - last]
+
+
+def read_snapshot_csv(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = [row for row in reader if row]
+    values = list(zip(*rows)) if rows else [()] * len(header)
+    return snapshot_from_columns(dict(zip(header, values)))
+
+
+def read_snapshot_parquet(path):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("读取Parquet需要安装 pyarrow: pip install pyarrow")
+    table = pq.read_table(path)
+    columns = {name: table.column(name).to_numpy(zero_copy_only=False) for name in table.column_names}
+    return snapshot_from_columns(columns)
+
+
+def load_snapshot(path, cache=True):
+    """读取快照，返回结构化数组
+
+    .npy 文件以只读内存映射打开。cache 为 True 时 CSV/Parquet 的解析结果保存为同名 .npy，
+    源文件未更新时下次直接内存映射读取。
+    """
+    base, ext = os.path.splitext(path)
+    ext = ext.lower()
+    if ext == '.npy':
+        snapshot = np.load(path, mmap_mode='r', allow_pickle=False)
+        if snapshot.dtype != SNAPSHOT_DTYPE:
+            raise ValueError(f"{path} 不是基本面快照文件")
+        return snapshot
+
+    cache_path = base + '.npy'
+    if cache and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+        return load_snapshot(cache_path)
+
+    if ext == '.csv':
+        snapshot = read_snapshot_csv(path)
+    elif ext in ('.parquet', '.pq'):
+        snapshot = read_snapshot_parquet(path)
+    else:
+        raise ValueError(f"不支持的基本面快照格式: {path}")
+
+    if cache:
+        # 先写临时文件再替换，避免读到写了一半的缓存
+        tmp_path = cache_path + '.tmp.npy'
+        try:
+            np.save(tmp_path, snapshot, allow_pickle=False)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            # 目录只读或磁盘已满时直接使用已解析的数据，下次启动再重新解析
+            print(f"写入基本面快照缓存失败: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return snapshot
+        return load_snapshot(cache_path)
+    return snapshot
+
+
+class FundamentalsProvider:
+    """基本面数据源接口"""
+
+    source = None
+
+    def get(self, code, price=None):
+        """返回 FUNDAMENTAL_FIELDS 和 source 组成的字典，缺失的字段为 None；没有该股票时返回 None"""
+        raise NotImplementedError
+
+    def describe(self):
+        """界面显示的数据来源说明"""
+        return self.source
+
+    def stats(self):
+        return {}
+
+
+class SnapshotFundamentalsProvider(FundamentalsProvider):
+    """全市场每日快照，内存映射 + 代码索引"""
+
+    source = SOURCE_SNAPSHOT
+
+    def __init__(self, path, cache=True):
+        self.path = path
+        self.snapshot = load_snapshot(path, cache)
+        # 只读取代码列建立索引，其余字段在查询时才从映射的文件中读出
+        self.index = {symbol: row for row, symbol in enumerate(self.snapshot['symbol'].tolist())}
+        self.date = datetime.date.fromtimestamp(os.path.getmtime(path))
+        self.lookups = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, code):
+        return normalize_code(code) in self.index
+
+    def get(self, code, price=None):
+        self.lookups += 1
+        row = self.index.get(normalize_code(code))
+        if row is None:
+            self.misses += 1
+            return None
+        # item() 一次取出整行，第一个元素为代码
+        values = self.snapshot[row].item()[1:]
+        result = {field: None if math.isnan(value) else round(value, 2)
+                  for field, value in zip(FUNDAMENTAL_FIELDS, values)}
+        result['source'] = self.source
+        return result
+
+    def describe(self):
+        return f"本地快照({os.path.basename(self.path)}, {self.date:%Y-%m-%d})"
+
+    def stats(self):
+        return {'symbols': len(self), 'lookups': self.lookups, 'misses': self.misses}
+
+
+class EstimatedFundamentalsProvider(FundamentalsProvider):
+    """按当前价格推算的演示数据，不是真实基本面，只作为兜底"""
+
+    source = SOURCE_ESTIMATE
+
+    def get(self, code, price=None):
+        if not price:
+            return None
+        # 假设流通股本为10亿股
+        float_shares = 1000000000
+        market_cap = price * float_shares
+
+        # 修正估算公式，避免显示过于夸张的数据
+        if normalize_code(code).startswith('6'):  # 假设上证指数公司规模更大
+            pe_ratio = round(25 + (price % 10), 2)  # 示例PE从25到35
+            pb_ratio = round(1.5 + (price % 5) / 10, 2)  # 示例PB从1.5到2.0
+            dividend_yield = round(2 + (price % 3) / 10, 2)  # 示例股息率从2%到2.3%
+            turnover_rate = round(2 + (price % 5) / 10, 2)  # 示例换手率从2%到2.5%
+        else:
+            pe_ratio = round(20 + (price % 15), 2)  # 示例PE从20到35
+            pb_ratio = round(1.2 + (price % 8) / 10, 2)  # 示例PB从1.2到2.0
+            dividend_yield = round(1.5 + (price % 5) / 10, 2)  # 示例股息率从1.5%到2%
+            turnover_rate = round(3 + (price % 7) / 10, 2)  # 示例换手率从3%到3.7%
+
+        return {
+            'pe_ratio': pe_ratio,
+            'pb_ratio': pb_ratio,
+            # 调整市值单位为亿元
+            'market_cap': round(market_cap / 100000000, 2),
+            'turnover_rate': turnover_rate,
+            'dividend_yield': dividend_yield,
+            'source': self.source,
+        }
+
+    def describe(self):
+        return "估算值(非真实数据，仅供演示)"
+
+
+class ChainedFundamentalsProvider(FundamentalsProvider):
+    """依次查询多个数据源，返回第一个有结果的"""
+
+    def __init__(self, providers):
+        self.providers = list(providers)
+
+    def get(self, code, price=None):
+        for provider in self.providers:
+            result = provider.get(code, price)
+            if result is not None:
+                return result
+        return None
+
+    def describe(self):
+        return ' / '.join(p.describe() for p in self.providers)
+
+    def stats(self):
+        stats = {}
+        for provider in self.providers:
+            stats.update({f'{provider.source}.{k}': v for k, v in provider.stats().items()})
+        return stats
+
+
+def find_snapshot(path=None):
+    """快照路径：参数、环境变量 PYRAMID_FUNDAMENTALS、默认目录下的 fundamentals.parquet/.csv"""
+    if path:
+        return path
+    if os.environ.get(SNAPSHOT_ENV):
+        return os.environ[SNAPSHOT_ENV]
+    for name in DEFAULT_SNAPSHOT_NAMES:
+        candidate = os.path.join(DEFAULT_SNAPSHOT_DIR, name)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def default_provider(path=None):
+    """本地快照优先，没有快照或读取失败时只使用估算值"""
+    providers = []
+    path = find_snapshot(path)
+    if path:
+        try:
+            providers.append(SnapshotFundamentalsProvider(path))
+        except (ValueError, RuntimeError, OSError) as e:
+            print(f"读取基本面快照失败: {e}")
+    providers.append(EstimatedFundamentalsProvider())
+    return ChainedFundamentalsProvider(providers)
@@ -0,0 +1,324 @@
+"""耗时统计与性能分析
+
+在网络请求、行情解析、计划计算、表格刷新和图表绘制等关键路径上记录耗时，
+汇总为计数器和直方图，可以导出为 Prometheus 文本格式(内置HTTP端点)或定期写入JSON文件，
+并提供可随时开关的 cProfile 分析(包括后台线程中的任务)，用于排查线上刷新变慢的问题。
+"""
+import bisect
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# 直方图分桶上限(秒)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 每个耗时项保留最近多少个样本用于计算分位数
+RECENT_SAMPLES = 256
+METRIC_PREFIX = 'pyramid'
+# Python 3.12 起 cProfile 基于 sys.monitoring：一个分析器就记录全部线程，
+# 同一时间也只能开启一个，后台线程再开启会抛出 ValueError
+PROFILE_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+class Histogram:
+    """累计分桶直方图，另外保留最近的样本计算分位数"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'total', 'max', 'recent')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个为 +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def percentile(self, q):
+        """最近样本的分位数，q 取 0~100"""
+        if not self.recent:
+            return 0.0
+        values = sorted(self.recent)
+        return values[min(int(len(values) * q / 100), len(values) - 1)]
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total_s': self.total,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+
+class MetricsRegistry:
+    """线程安全的耗时直方图和计数器集合"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, clock=time.perf_counter):
+        self.buckets = buckets
+        self.clock = clock
+        self._spans = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._spans.get(name)
+            if histogram is None:
+                histogram = self._spans[name] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    @contextmanager
+    def span(self, name):
+        """记录 with 块的耗时，块内抛出异常时同时累加 <name>.errors 计数"""
+        start = self.clock()
+        try:
+            yield
+        except BaseException:
+            self.increment(name + '.errors')
+            raise
+        finally:
+            self.observe(name, self.clock() - start)
+
+    def timed(self, name):
+        """装饰器形式的 span"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """全部耗时项和计数器的摘要，可直接序列化为JSON"""
+        with self._lock:
+            return {
+                'timestamp': time.time(),
+                'spans': {name: h.summary() for name, h in sorted(self._spans.items())},
+                'counters': dict(sorted(self._counters.items())),
+            }
+
+    def to_prometheus(self):
+        """Prometheus 文本格式"""
+        lines = []
+        span_metric = f'{METRIC_PREFIX}_span_seconds'
+        counter_metric = f'{METRIC_PREFIX}_events_total'
+        with self._lock:
+            if self._spans:
+                lines.append(f'# HELP {span_metric} 关键路径耗时')
+                lines.append(f'# TYPE {span_metric} histogram')
+            for name, histogram in sorted(self._spans.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{span_metric}_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{span_metric}_bucket{{span="{name}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{span_metric}_sum{{span="{name}"}} {histogram.total}')
+                lines.append(f'{span_metric}_count{{span="{name}"}} {histogram.count}')
+            if self._counters:
+                lines.append(f'# HELP {counter_metric} 事件计数')
+                lines.append(f'# TYPE {counter_metric} counter')
+            for name, value in sorted(self._counters.items()):
+                lines.append(f'{counter_metric}{{event="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def dump_json(self, path):
+        """原子写入JSON快照"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+# 进程内默认的统计对象，各模块直接使用
+metrics = MetricsRegistry()
+span = metrics.span
+timed = metrics.timed
+
+
+def format_snapshot(snapshot):
+    """诊断面板使用的纯文本表格"""
+    # 中文字符占两列，表头宽度按显示宽度对齐
+    lines = [f"{'耗时项':<21}{'次数':>6}{'平均ms':>8}{'P50ms':>10}{'P95ms':>10}{'最大ms':>8}"]
+    for name, s in snapshot['spans'].items():
+        lines.append(f"{name:<24}{s['count']:>8}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}"
+                     f"{s['p95_ms']:>10.2f}{s['max_ms']:>10.2f}")
+    if snapshot['counters']:
+        lines.append('')
+        for name, value in snapshot['counters'].items():
+            lines.append(f"{name:<24}{value:>8}")
+    return '\n'.join(lines)
+
+
+def _metrics_response(registry, path):
+    """返回 (状态码, 内容类型, 内容)"""
+    path = path.split('?')[0]
+    if path == '/metrics':
+        return 200, 'text/plain; version=0.0.4; charset=utf-8', registry.to_prometheus().encode('utf-8')
+    if path == '/metrics.json':
+        body = json.dumps(registry.snapshot(), ensure_ascii=False).encode('utf-8')
+        return 200, 'application/json; charset=utf-8', body
+    return 404, 'text/plain; charset=utf-8', b'not found'
+
+
+def start_http_server(port, host='127.0.0.1', registry=metrics):
+    """在后台线程提供 /metrics(Prometheus) 和 /metrics.json，返回服务器对象"""
+    # 只有开启HTTP端点时才导入，不增加程序启动耗时
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, content_type, body = _metrics_response(registry, self.path)
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    return server
+
+
+class JsonDumper:
+    """后台线程定期把快照写入JSON文件"""
+
+    def __init__(self, path, interval=60.0, registry=metrics):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics-dump', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        try:
+            self.registry.dump_json(self.path)
+        except OSError as e:
+            print(f"写入性能统计失败: {e}")
+
+    def stop(self):
+        """停止并写入最后一次快照"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.dump()
+
+
+class Profiler:
+    """可随时开关的 cProfile 分析器
+
+    Python 3.12 以前 cProfile 只记录开启它的线程(界面线程)。后台线程中的任务(行情解析、计划计算、导出)
+    用 worker() 包裹，分析开启期间每个任务单独记录，停止时与界面线程的结果合并；
+    3.12 起界面线程的分析器已经覆盖全部线程，worker() 不再单独记录。
+    """
+
+    def __init__(self):
+        self._profile = None
+        self._workers = []
+        self._lock = threading.Lock()
+        # 当前线程是否已在记录，嵌套的任务不再重复开启
+        self._local = threading.local()
+        self.last_stats = None
+
+    @property
+    def running(self):
+        return self._profile is not None
+
+    def start(self):
+        if self._profile is None:
+            import cProfile
+            with self._lock:
+                self._workers = []
+            self._local.active = True
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    @contextmanager
+    def worker(self):
+        """在后台线程执行的任务外使用；分析未开启时没有额外开销"""
+        if (self._profile is None or PROFILE_ALL_THREADS
+                or getattr(self._local, 'active', False)):
+            yield
+            return
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # 已有其他分析工具在运行，不记录这个任务，任务本身照常执行
+            yield
+            return
+        self._local.active = True
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._local.active = False
+            with self._lock:
+                if self._profile is not None:
+                    self._workers.append(profile)
+
+    def stop(self, path=None, limit=25):
+        """停止分析，path 不为空时保存 .prof 文件，返回按累计耗时排序的前 limit 项文本"""
+        if self._profile is None:
+            return ''
+        self._profile.disable()
+        self._local.active = False
+        profile, self._profile = self._profile, None
+        with self._lock:
+            workers, self._workers = self._workers, []
+        import pstats
+        output = io.StringIO()
+        stats = pstats.Stats(profile, stream=output)
+        for worker in workers:
+            stats.add(worker)
+        if path:
+            stats.dump_stats(path)
+        stats.sort_stats('cumulative').print_stats(limit)
+        self.last_stats = output.getvalue()
+        return self.last_stats
+
+    def toggle(self, path=None):
+        """开启或停止分析，返回 (是否正在分析, 停止时的统计文本)"""
+        if self.running:
+            return False, self.stop(path)
+        self.start()
+        return True, ''
+
+
+# 进程内默认的分析器，诊断面板开关，后台任务通过 profiler.worker() 接入
+profiler = Profiler()
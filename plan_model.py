@@ -0,0 +1,110 @@
+"""加仓计划模型：记录输入参数，按变化的参数增量重算并给出需要刷新的行和列"""
+import numpy as np
+
+from pyramid_engine import (compute_plan, default_target_price,
+                            DEFAULT_INTERVALS, DEFAULT_WEIGHT_EXPONENT)
+
+# 影响价格阶梯、股数和平均成本的参数
+LADDER_INPUTS = ('current_price', 'stop_loss', 'capital', 'intervals', 'weight_exponent',
+                 'rules', 'strategy')
+
+# 表格展示的逐区间数据，顺序与表格第1~8列一致
+TABLE_FIELDS = ('buy_prices', 'allocation_ratios', 'shares', 'investments',
+                'cumulative_investments', 'avg_costs', 'profit_points', 'potential_returns')
+
+
+class PlanDiff:
+    """一次更新后界面需要刷新的内容
+
+    full 为 True 时行数发生变化，需要整表重建；
+    否则 rows 为有变化的行号，fields 为有变化的数据列。
+    """
+
+    __slots__ = ('full', 'rows', 'fields', 'risk_changed')
+
+    def __init__(self, full=False, rows=(), fields=(), risk_changed=False):
+        self.full = full
+        self.rows = rows
+        self.fields = fields
+        self.risk_changed = risk_changed
+
+    def __bool__(self):
+        return self.full or bool(len(self.rows)) or self.risk_changed
+
+    def __repr__(self):
+        return (f"PlanDiff(full={self.full}, rows={list(map(int, self.rows))}, "
+                f"fields={list(self.fields)}, risk_changed={self.risk_changed})")
+
+
+def diff_plans(old, new):
+    """比较两个计划，找出数值有变化的行和列"""
+    if old is None or old.intervals != new.intervals:
+        return PlanDiff(full=True, rows=np.arange(new.intervals),
+                        fields=TABLE_FIELDS, risk_changed=True)
+
+    changed_rows = np.zeros(new.intervals, dtype=bool)
+    fields = []
+    for name in TABLE_FIELDS:
+        old_values = getattr(old, name)
+        new_values = getattr(new, name)
+        # 增量重算时未变化的列直接复用同一个数组
+        if old_values is new_values:
+            continue
+        changed = old_values != new_values
+        if changed.any():
+            changed_rows |= changed
+            fields.append(name)
+    return PlanDiff(rows=np.flatnonzero(changed_rows), fields=tuple(fields),
+                    risk_changed=old.risk_metrics != new.risk_metrics)
+
+
+class PlanModel:
+    """保存当前计划及其输入参数，只重算受影响的部分"""
+
+    def __init__(self, intervals=DEFAULT_INTERVALS, weight_exponent=DEFAULT_WEIGHT_EXPONENT,
+                 rules=None, strategy=None):
+        self.intervals = intervals
+        self.weight_exponent = weight_exponent
+        # 下单规则(LotRules)，修改后下一次 update 会整体重算
+        self.rules = rules
+        # 加仓策略名称(见 pyramid_strategies)，None 为默认策略
+        self.strategy = strategy
+        self.inputs = None
+        self.plan = None
+        self.full_recomputes = 0
+        self.partial_recomputes = 0
+
+    def update(self, current_price, stop_loss, capital, target_price=None,
+               intervals=None, weight_exponent=None):
+        """更新输入参数，返回 PlanDiff；参数不合法时抛出ValueError且不修改当前计划"""
+        if target_price is None:
+            target_price = default_target_price(current_price)
+        inputs = {
+            'current_price': current_price,
+            'stop_loss': stop_loss,
+            'capital': capital,
+            'target_price': target_price,
+            'intervals': self.intervals if intervals is None else intervals,
+            'weight_exponent': self.weight_exponent if weight_exponent is None else weight_exponent,
+            'rules': self.rules,
+            'strategy': self.strategy,
+        }
+        if inputs == self.inputs:
+            return PlanDiff()
+
+        old = self.plan
+        ladder_changed = (self.inputs is None or
+                          any(inputs[name] != self.inputs[name] for name in LADDER_INPUTS))
+        if ladder_changed:
+            plan = compute_plan(current_price, stop_loss, capital, target_price,
+                                inputs['intervals'], inputs['weight_exponent'], inputs['rules'],
+                                inputs['strategy'])
+            self.full_recomputes += 1
+        else:
+            # 价格阶梯、股数和平均成本与目标价格无关
+            plan = old.with_target(target_price)
+            self.partial_recomputes += 1
+
+        self.inputs = inputs
+        self.plan = plan
+        return diff_plans(old, plan)
@@ -0,0 +1,126 @@
+"""加仓列表的Qt表格模型
+
+直接读取 PyramidPlan 的NumPy数组，文字格式和颜色在 data() 中按需计算，
+视图只会请求可见行，渲染开销与计划的区间数量无关。
+"""
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant
+from PyQt5.QtGui import QColor
+
+# 第0列为区间序号，其余各列对应的计划数据和显示格式
+PLAN_TABLE_COLUMNS = [
+    ("价格区间", None, None),
+    ("买入价格", 'buy_prices', lambda v: f"{v:.2f}"),
+    ("买入比例", 'allocation_ratios', lambda v: f"{v*100:.2f}%"),
+    ("买入股数", 'shares', lambda v: f"{v}"),
+    ("本次投入", 'investments', lambda v: f"{v:.2f}"),
+    ("累计投入", 'cumulative_investments', lambda v: f"{v:.2f}"),
+    ("平均成本", 'avg_costs', lambda v: f"{v:.2f}"),
+    ("盈亏平衡", 'profit_points', lambda v: f"{v:.2f}"),
+    ("收益分析", 'potential_returns', lambda v: f"{v:.2f}%"),
+]
+
+RETURN_COLUMN = len(PLAN_TABLE_COLUMNS) - 1
+
+POSITIVE_COLOR = QColor(255, 0, 0)  # 正收益显示为红色
+NEGATIVE_COLOR = QColor(0, 128, 0)  # 负收益显示为绿色
+FILLED_COLOR = QColor(200, 225, 255)  # 已成交的区间
+
+
+def _row_spans(rows):
+    """把有序行号合并成连续区间 [(首行, 末行), ...]"""
+    spans = []
+    for row in rows:
+        row = int(row)
+        if spans and row == spans[-1][1] + 1:
+            spans[-1][1] = row
+        else:
+            spans.append([row, row])
+    return spans
+
+
+class PlanTableModel(QAbstractTableModel):
+    """以 PyramidPlan 为数据源的只读表格模型"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.plan = None
+        self.filled = 0  # 已成交的区间数量，成交总是从第一个区间开始
+        self._columns = [field for _, field, _ in PLAN_TABLE_COLUMNS]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.plan is None:
+            return 0
+        return self.plan.intervals
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(PLAN_TABLE_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return QVariant()
+        if orientation == Qt.Horizontal:
+            return PLAN_TABLE_COLUMNS[section][0]
+        return str(section + 1)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or self.plan is None:
+            return QVariant()
+        row = index.row()
+        col = index.column()
+
+        if role == Qt.DisplayRole:
+            _, field, fmt = PLAN_TABLE_COLUMNS[col]
+            if field is None:
+                return f"第{row+1}区间"
+            return fmt(getattr(self.plan, field)[row])
+
+        if role == Qt.ForegroundRole and col == RETURN_COLUMN:
+            value = self.plan.potential_returns[row]
+            if value > 0:
+                return POSITIVE_COLOR
+            if value < 0:
+                return NEGATIVE_COLOR
+            return QVariant()
+
+        if role == Qt.BackgroundRole and row < self.filled:
+            return FILLED_COLOR
+
+        if role == Qt.ToolTipRole and row < self.filled:
+            return "已成交"
+
+        if role == Qt.BackgroundRole:
+            # 颜色渐变，突出显示买入力度（低价区间颜色更深）
+            intensity = int(200 * (row / max(self.plan.intervals - 1, 1)))
+            return QColor(255, 255 - intensity, 255 - intensity)
+
+        return QVariant()
+
+    def set_plan(self, plan, diff=None):
+        """切换到新计划，diff 为 PlanDiff 时只通知有变化的单元格"""
+        if diff is None or diff.full or self.plan is None:
+            self.beginResetModel()
+            self.plan = plan
+            self.endResetModel()
+            return
+
+        self.plan = plan
+        columns = [col for col, field in enumerate(self._columns) if field in diff.fields]
+        if not columns:
+            return
+        left, right = min(columns), max(columns)
+        for first, last in _row_spans(diff.rows):
+            self.dataChanged.emit(self.index(first, left), self.index(last, right))
+
+    def set_filled(self, filled):
+        """更新已成交的区间数量，只通知状态变化的行"""
+        if filled == self.filled:
+            return
+        first, last = sorted((self.filled, filled))
+        self.filled = filled
+        if self.plan is None:
+            return
+        last = min(last, self.plan.intervals) - 1
+        if first <= last:
+            self.dataChanged.emit(self.index(first, 0), self.index(last, len(PLAN_TABLE_COLUMNS) - 1))
@@ -0,0 +1,191 @@
+"""组合视图
+
+导入持仓CSV，按总资金、单只和单行业上限生成组合计划，
+表格每行一只股票(可按任一列排序)，上方显示组合汇总和行业分布。
+传入 WorkerPipeline 时组合计划在后台线程中计算。
+"""
+import functools
+
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
+                             QLineEdit, QTableView, QHeaderView, QFileDialog, QMessageBox)
+from PyQt5.QtGui import QDoubleValidator, QColor
+from PyQt5.QtCore import (Qt, QAbstractTableModel, QModelIndex, QVariant,
+                          QSortFilterProxyModel, pyqtSignal)
+
+from pyramid_portfolio import (plan_portfolio, read_positions, format_summary_text,
+                               DEFAULT_MAX_NAME_PCT)
+
+# 表头、PortfolioPlan.rows() 中的字段和显示格式
+PORTFOLIO_TABLE_COLUMNS = [
+    ("代码", 'symbol', str),
+    ("行业", 'sector', str),
+    ("当前价", 'current_price', lambda v: f"{v:.2f}"),
+    ("止损价", 'stop_loss', lambda v: f"{v:.2f}"),
+    ("目标价", 'target_price', lambda v: f"{v:.2f}"),
+    ("分配本金", 'allocation', lambda v: f"{v:,.2f}"),
+    ("最大投入", 'max_investment', lambda v: f"{v:,.2f}"),
+    ("区间数", 'intervals', lambda v: f"{v}"),
+    ("总股数", 'total_shares', lambda v: f"{v}"),
+    ("盈亏平衡", 'breakeven_price', lambda v: f"{v:.2f}"),
+    ("最坏亏损", 'worst_case_loss', lambda v: f"{v:,.2f}"),
+    ("占总资金", 'loss_pct_of_budget', lambda v: f"{v:.2f}%"),
+    ("风险收益比", 'risk_reward_ratio', lambda v: f"{v:.2f}"),
+]
+
+INVALID_COLOR = QColor(160, 160, 160)  # 不可交易(未分配资金)的股票
+
+
+class PortfolioTableModel(QAbstractTableModel):
+    """以 PortfolioPlan.rows() 为数据源的只读表格模型，Qt.UserRole 返回原始数值用于排序"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.portfolio = None
+        self.rows = []
+
+    def set_portfolio(self, portfolio):
+        self.beginResetModel()
+        self.portfolio = portfolio
+        self.rows = portfolio.rows() if portfolio is not None else []
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(PORTFOLIO_TABLE_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return QVariant()
+        if orientation == Qt.Horizontal:
+            return PORTFOLIO_TABLE_COLUMNS[section][0]
+        return str(section + 1)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        row = self.rows[index.row()]
+        _, field, fmt = PORTFOLIO_TABLE_COLUMNS[index.column()]
+        value = row[field]
+        if role == Qt.DisplayRole:
+            return "--" if value is None else fmt(value)
+        if role == Qt.UserRole:
+            # 无效值排在最后
+            return float('-inf') if value is None else value
+        if role == Qt.ForegroundRole and not row['valid']:
+            return INVALID_COLOR
+        if role == Qt.ToolTipRole and not row['valid']:
+            return "止损价不低于当前价或未分配到资金"
+        return QVariant()
+
+
+class PortfolioPanel(QWidget):
+    """组合计划面板；rules 和 strategy 与单只股票的设置保持一致，pipeline 为 None 时在界面线程中计算"""
+
+    # 双击某只股票时发出 (代码, PyramidPlan)
+    plan_selected = pyqtSignal(str, object)
+
+    def __init__(self, rules=None, strategy=None, pipeline=None, parent=None):
+        super().__init__(parent)
+        self.rules = rules
+        self.strategy = strategy
+        self.pipeline = pipeline
+        self.positions = None
+        self.portfolio = None
+
+        layout = QVBoxLayout(self)
+        input_layout = QHBoxLayout()
+        load_button = QPushButton("导入持仓CSV")
+        load_button.clicked.connect(self.load_positions)
+        input_layout.addWidget(load_button)
+
+        self.budget_edit = QLineEdit()
+        self.budget_edit.setValidator(QDoubleValidator(0.00, 1e12, 2))
+        self.max_name_edit = QLineEdit(f"{DEFAULT_MAX_NAME_PCT:g}")
+        self.max_name_edit.setValidator(QDoubleValidator(0.00, 100.00, 2))
+        self.max_sector_edit = QLineEdit()
+        self.max_sector_edit.setValidator(QDoubleValidator(0.00, 100.00, 2))
+        self.max_sector_edit.setPlaceholderText("不限")
+        for label, edit in (("总资金(元):", self.budget_edit),
+                            ("单只上限(%):", self.max_name_edit),
+                            ("单行业上限(%):", self.max_sector_edit)):
+            input_layout.addWidget(QLabel(label))
+            input_layout.addWidget(edit)
+
+        generate_button = QPushButton("生成组合计划")
+        generate_button.clicked.connect(self.generate)
+        input_layout.addWidget(generate_button)
+        layout.addLayout(input_layout)
+
+        self.summary_label = QLabel("导入持仓CSV后生成组合计划")
+        self.summary_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        layout.addWidget(self.summary_label)
+
+        self.model = PortfolioTableModel(self)
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setSortRole(Qt.UserRole)
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
+        self.table.setSortingEnabled(True)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.doubleClicked.connect(self.on_double_clicked)
+        layout.addWidget(self.table)
+
+    def load_positions(self):
+        path, _ = QFileDialog.getOpenFileName(self, "导入持仓", "", "CSV (*.csv)")
+        if path:
+            self.load_positions_file(path)
+
+    def load_positions_file(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+                self.positions = read_positions(f)
+        except (ValueError, OSError) as e:
+            QMessageBox.warning(self, "导入失败", str(e))
+            return False
+        self.summary_label.setText(f"已导入 {len(self.positions['symbols'])} 只股票")
+        return True
+
+    def generate(self):
+        if self.positions is None:
+            QMessageBox.warning(self, "输入错误", "请先导入持仓CSV!")
+            return
+        try:
+            budget = float(self.budget_edit.text())
+            max_name_pct = float(self.max_name_edit.text()) if self.max_name_edit.text() else None
+            max_sector_pct = float(self.max_sector_edit.text()) if self.max_sector_edit.text() else None
+        except ValueError:
+            QMessageBox.warning(self, "输入错误", "请输入有效的数字!")
+            return
+        positions = dict(self.positions)
+        positions['strategies'] = [s or self.strategy for s in positions['strategies']]
+        compute = functools.partial(plan_portfolio, budget=budget, max_name_pct=max_name_pct,
+                                    max_sector_pct=max_sector_pct, rules=self.rules, **positions)
+        if self.pipeline is not None:
+            # 重复点击时只显示最后一次的结果
+            self.summary_label.setText("正在生成组合计划...")
+            self.pipeline.submit('portfolio', compute, on_result=self.set_portfolio,
+                                 on_error=self.on_generate_failed, metric='portfolio.roundtrip')
+            return
+        try:
+            portfolio = compute()
+        except ValueError as e:
+            self.on_generate_failed(str(e))
+            return
+        self.set_portfolio(portfolio)
+
+    def on_generate_failed(self, message):
+        self.summary_label.setText("生成组合计划失败")
+        QMessageBox.warning(self, "输入错误", message)
+
+    def set_portfolio(self, portfolio):
+        self.portfolio = portfolio
+        self.model.set_portfolio(portfolio)
+        self.summary_label.setText(format_summary_text(portfolio))
+
+    def on_double_clicked(self, index):
+        row = self.model.rows[self.proxy.mapToSource(index).row()]
+        if row['valid']:
+            self.plan_selected.emit(row['symbol'], self.portfolio.plan(row['symbol']))
@@ -0,0 +1,372 @@
+"""金字塔加仓计划的历史回测
+
+在日线或分钟K线上检验加仓阶梯的实际成交情况：以起始K线开盘价为当前价生成计划，
+K线最低价触及的加仓价位视为成交，最低价跌破止损价时止损离场，最高价触及目标价时止盈离场。
+各事件的首次发生位置通过累计最小/最大值加 searchsorted 一次求出，不逐根K线循环。
+
+K线可从 CSV、Parquet 或 .npy 文件读取；.npy 以内存映射方式打开，
+多年的分钟数据不需要整体读入内存。多只股票在进程池中并行回测。
+"""
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from pyramid_engine import (compute_plan, DEFAULT_INTERVALS, DEFAULT_WEIGHT_EXPONENT,
+                            DEFAULT_TARGET_RATIO, LotRules, A_SHARE_COMMISSION_RATE,
+                            A_SHARE_MIN_COMMISSION)
+from pyramid_strategies import (get_strategy, average_true_range, strategy_names, process_strategy_name,
+                                DEFAULT_ATR_PERIOD)
+
+BAR_DTYPE = np.dtype([
+    ('timestamp', 'datetime64[s]'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'f8'),
+])
+
+# CSV/Parquet 中可以作为时间列的列名
+TIMESTAMP_COLUMNS = ('timestamp', 'datetime', 'date', 'time', 'trade_date')
+
+# 离场方式
+EXIT_TARGET = 'target'
+EXIT_STOP = 'stop'
+EXIT_OPEN = 'open'  # 回测结束时仍持仓，按最后收盘价估值
+EXIT_NO_FILL = 'no_fill'  # 没有任何价位成交
+
+BACKTEST_FIELDS = ('symbol', 'start', 'end', 'bars', 'current_price', 'stop_loss', 'target_price',
+                   'filled_levels', 'shares', 'capital_deployed', 'avg_cost',
+                   'stopped_out', 'target_hit', 'exit', 'exit_time', 'exit_price',
+                   'pnl', 'pnl_pct', 'pnl_at_target')
+
+
+def _find_column(names, candidates):
+    lookup = {name.strip().lower(): name for name in names}
+    for candidate in candidates:
+        if candidate in lookup:
+            return lookup[candidate]
+    return None
+
+
+def _bars_from_columns(columns):
+    """由 {列名: 序列} 构造K线结构化数组，列名不区分大小写"""
+    time_column = _find_column(columns, TIMESTAMP_COLUMNS)
+    if time_column is None:
+        raise ValueError(f"K线数据缺少时间列，可用列名: {', '.join(TIMESTAMP_COLUMNS)}")
+    length = len(columns[time_column])
+    bars = np.empty(length, dtype=BAR_DTYPE)
+    timestamps = np.asarray(columns[time_column])
+    if timestamps.dtype.kind in 'Miu':
+        # 日期时间类型直接转换，整数按Unix秒处理
+        bars['timestamp'] = timestamps.astype('datetime64[s]')
+    else:
+        bars['timestamp'] = np.asarray([str(t).strip().replace('/', '-') for t in timestamps],
+                                       dtype='datetime64[s]')
+    for name in ('open', 'high', 'low', 'close', 'volume'):
+        column = _find_column(columns, (name,))
+        if column is None:
+            if name == 'volume':
+                bars[name] = 0.0
+                continue
+            raise ValueError(f"K线数据缺少列: {name}")
+        bars[name] = np.asarray(columns[column], dtype=np.float64)
+    return bars
+
+
+def read_bars_csv(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = [row for row in reader if row]
+    values = list(zip(*rows)) if rows else [()] * len(header)
+    return _bars_from_columns(dict(zip(header, values)))
+
+
+def read_bars_parquet(path):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("读取Parquet需要安装 pyarrow: pip install pyarrow")
+    table = pq.read_table(path)
+    columns = {name: table.column(name).to_numpy(zero_copy_only=False) for name in table.column_names}
+    return _bars_from_columns(columns)
+
+
+def save_bars(bars, path):
+    """把K线保存为 .npy，之后可以内存映射方式读取"""
+    np.save(path, np.asarray(bars, dtype=BAR_DTYPE), allow_pickle=False)
+
+
+def load_bars(path, cache=False):
+    """读取K线，返回按时间排序的结构化数组
+
+    .npy 文件以只读内存映射打开。cache 为 True 时，CSV/Parquet 解析结果会保存到
+    同名的 .npy 文件，源文件未更新时下次直接内存映射读取。
+    """
+    base, ext = os.path.splitext(path)
+    ext = ext.lower()
+    if ext == '.npy':
+        bars = np.load(path, mmap_mode='r', allow_pickle=False)
+        if bars.dtype != BAR_DTYPE:
+            raise ValueError(f"{path} 不是K线数据文件")
+        return bars
+
+    cache_path = base + '.npy'
+    if cache and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+        return load_bars(cache_path)
+
+    if ext == '.csv':
+        bars = read_bars_csv(path)
+    elif ext in ('.parquet', '.pq'):
+        bars = read_bars_parquet(path)
+    else:
+        raise ValueError(f"不支持的K线文件格式: {path}")
+
+    if len(bars) > 1 and np.any(bars['timestamp'][1:] < bars['timestamp'][:-1]):
+        bars = bars[np.argsort(bars['timestamp'], kind='stable')]
+    if cache:
+        save_bars(bars, cache_path)
+        return load_bars(cache_path)
+    return bars
+
+
+def _first_at_or_below(running_min, value):
+    """running_min 单调不增，返回首次 <= value 的位置(可为多个 value)，从未发生时为长度"""
+    return np.searchsorted(-running_min, -np.asarray(value), side='left')
+
+
+def backtest_plan(bars, plan, start=0, symbol=None, rules=None):
+    """在 bars[start:] 上回测一个加仓计划，返回结果字典
+
+    rules 为生成计划时使用的下单规则，每个成交价位按成交金额计入买入佣金。
+
+    成交规则：
+    - 某根K线最低价 <= 加仓价位时该价位成交，跳空低开时按开盘价成交；
+    - 最低价 < 止损价时按止损价(跳空时按开盘价)全部卖出；
+    - 首次成交之后最高价 >= 目标价时按目标价(跳空时按开盘价)全部卖出；
+    - 同一根K线同时触及止损和目标价时按止损处理，离场K线上的成交计入持仓。
+    """
+    window = bars[start:]
+    count = len(window)
+    if count == 0:
+        raise ValueError("回测区间内没有K线")
+    opens = np.asarray(window['open'], dtype=np.float64)
+    lows = np.asarray(window['low'], dtype=np.float64)
+    highs = np.asarray(window['high'], dtype=np.float64)
+    running_low = np.minimum.accumulate(lows)
+
+    # 每个价位首次被触及的K线位置
+    fill_bars = _first_at_or_below(running_low, plan.buy_prices)
+    # 止损：首次最低价严格低于止损价
+    stop_bar = int(np.searchsorted(-running_low, -plan.stop_loss, side='right'))
+
+    first_fill = int(fill_bars[0]) if len(fill_bars) else count
+    target_bar = count
+    if first_fill < count:
+        running_high = np.maximum.accumulate(highs[first_fill:])
+        target_bar = first_fill + int(np.searchsorted(running_high, plan.target_price, side='left'))
+
+    exit_bar = min(stop_bar, target_bar)
+    if first_fill >= count or first_fill > exit_bar:
+        exit_kind = EXIT_NO_FILL
+    elif stop_bar <= target_bar and stop_bar < count:
+        exit_kind = EXIT_STOP
+    elif target_bar < count:
+        exit_kind = EXIT_TARGET
+    else:
+        exit_kind = EXIT_OPEN
+
+    filled = fill_bars <= min(exit_bar, count - 1)
+    fill_index = np.minimum(fill_bars[filled], count - 1)
+    fill_prices = np.minimum(plan.buy_prices[filled], opens[fill_index])
+    shares = plan.shares[filled]
+    total_shares = int(shares.sum())
+    deployed = float(np.dot(shares, fill_prices))
+    if rules is not None:
+        deployed += float(rules.commission(shares * fill_prices).sum())
+    avg_cost = deployed / total_shares if total_shares > 0 else 0.0
+
+    if exit_kind == EXIT_STOP:
+        exit_index = stop_bar
+        exit_price = min(plan.stop_loss, opens[exit_index])
+    elif exit_kind == EXIT_TARGET:
+        exit_index = target_bar
+        exit_price = max(plan.target_price, opens[exit_index])
+    else:
+        exit_index = count - 1
+        exit_price = float(window['close'][exit_index])
+
+    pnl = (exit_price - avg_cost) * total_shares
+    timestamps = window['timestamp']
+    return {
+        'symbol': symbol,
+        'start': str(timestamps[0]),
+        'end': str(timestamps[-1]),
+        'bars': count,
+        'current_price': float(plan.current_price),
+        'stop_loss': float(plan.stop_loss),
+        'target_price': float(plan.target_price),
+        'filled_levels': int(filled.sum()),
+        'shares': total_shares,
+        'capital_deployed': deployed,
+        'avg_cost': avg_cost,
+        'stopped_out': exit_kind == EXIT_STOP,
+        'target_hit': exit_kind == EXIT_TARGET,
+        'exit': exit_kind,
+        'exit_time': str(timestamps[exit_index]),
+        'exit_price': float(exit_price),
+        'pnl': float(pnl),
+        'pnl_pct': float(pnl / deployed * 100) if deployed > 0 else 0.0,
+        'pnl_at_target': float((plan.target_price - avg_cost) * total_shares),
+    }
+
+
+def backtest_bars(bars, capital, stop_loss_pct, target_ratio=DEFAULT_TARGET_RATIO,
+                  intervals=DEFAULT_INTERVALS, weight_exponent=DEFAULT_WEIGHT_EXPONENT,
+                  start=0, symbol=None, strategy=None, atr_period=DEFAULT_ATR_PERIOD, rules=None):
+    """以 bars[start] 的开盘价为当前价生成计划并回测
+
+    stop_loss_pct 为止损价相对当前价的跌幅百分比，target_ratio 为目标价相对当前价的倍数，
+    不同价位的股票可以共用同一组参数。ATR间隔策略用 start 之前的 atr_period 根K线计算ATR。
+    rules 为下单规则(pyramid_engine.LotRules)，与界面一样按整手生成计划并计入佣金。
+    """
+    strategy = get_strategy(strategy)
+    atr = None
+    if strategy.atr_spaced:
+        if start < 1:
+            raise ValueError("ATR间隔策略需要起始K线之前的历史数据，请指定 start")
+        history = bars[max(0, start - atr_period - 1):start]
+        atr = average_true_range(history['high'], history['low'], history['close'], atr_period)
+    current_price = float(bars['open'][start])
+    plan = compute_plan(current_price, current_price * (1 - stop_loss_pct / 100), capital,
+                        current_price * target_ratio, intervals, weight_exponent,
+                        rules=rules, strategy=strategy, atr=atr)
+    return backtest_plan(bars, plan, start, symbol, rules)
+
+
+def _symbol_from_path(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _backtest_file(task):
+    """进程池任务：读取一个文件并回测，出错时返回带 error 字段的结果"""
+    path, kwargs, cache = task
+    symbol = _symbol_from_path(path)
+    try:
+        return backtest_bars(load_bars(path, cache=cache), symbol=symbol, **kwargs)
+    except (ValueError, RuntimeError, OSError) as e:
+        return {'symbol': symbol, 'error': str(e)}
+
+
+def backtest_files(paths, capital, stop_loss_pct, target_ratio=DEFAULT_TARGET_RATIO,
+                   intervals=DEFAULT_INTERVALS, weight_exponent=DEFAULT_WEIGHT_EXPONENT,
+                   max_workers=None, cache=False, chunksize=8, start=0, strategy=None,
+                   rules=None):
+    """并行回测多只股票，每个文件一只，文件名(不含扩展名)作为股票代码
+
+    按输入顺序逐个产出结果字典。多进程回测时 strategy 只能是已注册的策略，
+    直接传入的权重函数需要 max_workers=1。
+    """
+    paths = list(paths)
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers > 1 and len(paths) > 1:
+        strategy = process_strategy_name(strategy)
+    kwargs = dict(capital=capital, stop_loss_pct=stop_loss_pct, target_ratio=target_ratio,
+                  intervals=intervals, weight_exponent=weight_exponent,
+                  start=start, strategy=strategy, rules=rules)
+    tasks = [(path, kwargs, cache) for path in paths]
+    if max_workers == 1 or len(tasks) <= 1:
+        yield from map(_backtest_file, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        yield from pool.map(_backtest_file, tasks, chunksize=chunksize)
+
+
+def summarize(results):
+    """汇总多只股票的回测结果"""
+    results = [r for r in results if 'error' not in r]
+    if not results:
+        return {'symbols': 0}
+    pnl = np.array([r['pnl'] for r in results])
+    deployed = np.array([r['capital_deployed'] for r in results])
+    exits = [r['exit'] for r in results]
+    return {
+        'symbols': len(results),
+        'filled': int(np.count_nonzero(deployed > 0)),
+        'target_hits': exits.count(EXIT_TARGET),
+        'stop_outs': exits.count(EXIT_STOP),
+        'still_open': exits.count(EXIT_OPEN),
+        'no_fill': exits.count(EXIT_NO_FILL),
+        'capital_deployed': float(deployed.sum()),
+        'total_pnl': float(pnl.sum()),
+        'pnl_pct': float(pnl.sum() / deployed.sum() * 100) if deployed.sum() > 0 else 0.0,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="金字塔加仓计划历史回测")
+    parser.add_argument('files', nargs='+', help="K线文件(CSV/Parquet/.npy)，每个文件一只股票")
+    parser.add_argument('--capital', type=float, required=True, help="每只股票的本金")
+    parser.add_argument('--stop-loss-pct', type=float, required=True,
+                        help="止损价相对起始价的跌幅百分比")
+    parser.add_argument('--target-ratio', type=float, default=DEFAULT_TARGET_RATIO,
+                        help="目标价相对起始价的倍数")
+    parser.add_argument('--intervals', type=int, default=DEFAULT_INTERVALS)
+    parser.add_argument('--weight-exponent', type=float, default=DEFAULT_WEIGHT_EXPONENT)
+    parser.add_argument('--strategy', choices=strategy_names(), help="加仓策略，默认幂次加权")
+    parser.add_argument('--start', type=int, default=0,
+                        help="从第几根K线开始回测，之前的K线用于计算ATR")
+    parser.add_argument('--lot-size', type=int,
+                        help="按整手下单的每手股数(A股为100)，默认按1股取整且不计佣金")
+    parser.add_argument('--commission-rate', type=float, default=A_SHARE_COMMISSION_RATE,
+                        help="佣金费率，只在指定 --lot-size 时生效")
+    parser.add_argument('--min-commission', type=float, default=A_SHARE_MIN_COMMISSION,
+                        help="每笔最低佣金(元)，只在指定 --lot-size 时生效")
+    parser.add_argument('--workers', type=int, default=None, help="进程数，默认CPU核数")
+    parser.add_argument('--cache', action='store_true',
+                        help="把解析后的K线保存为同名 .npy，下次内存映射读取")
+    parser.add_argument('-o', '--output', default='-', help="结果CSV文件，默认标准输出")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    rules = None
+    if args.lot_size is not None:
+        try:
+            rules = LotRules(args.lot_size, args.commission_rate, args.min_commission)
+        except ValueError as e:
+            print(f"错误: {e}", file=sys.stderr)
+            return 2
+    stream = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+    writer = csv.DictWriter(stream, fieldnames=BACKTEST_FIELDS + ('error',), extrasaction='ignore')
+    writer.writeheader()
+    results = []
+    try:
+        for result in backtest_files(args.files, args.capital, args.stop_loss_pct, args.target_ratio,
+                                     args.intervals, args.weight_exponent, args.workers, args.cache,
+                                     start=args.start, strategy=args.strategy, rules=rules):
+            writer.writerow(result)
+            results.append(result)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+    summary = summarize(results)
+    errors = sum(1 for r in results if 'error' in r)
+    print(f"回测 {summary['symbols']} 只股票，失败 {errors} 只", file=sys.stderr)
+    if summary['symbols']:
+        print(f"止盈 {summary['target_hits']}，止损 {summary['stop_outs']}，"
+              f"持仓中 {summary['still_open']}，未成交 {summary['no_fill']}；"
+              f"投入 {summary['capital_deployed']:.2f} 元，盈亏 {summary['total_pnl']:.2f} 元"
+              f"({summary['pnl_pct']:.2f}%)", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
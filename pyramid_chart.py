@@ -0,0 +1,235 @@
+"""加仓计划分析图表
+
+子图、坐标轴、折线、柱状图和参考线只创建一次，之后每次生成计划只原地更新数据；
+实时价格线使用 blitting 重绘，不触发整张图的重新布局和绘制。
+matplotlib 在第一次创建画布时才导入，主窗口启动时不加载绘图库。
+"""
+import functools
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+from perf_metrics import metrics
+
+# 保留最近多少次绘制耗时用于统计
+RENDER_HISTORY = 200
+
+
+@functools.lru_cache(maxsize=None)
+def set_matplotlib_chinese_font():
+    """设置matplotlib中文字体，只在第一次调用时查找已安装的字体，返回选中的字体名"""
+    import matplotlib
+    from matplotlib import font_manager
+
+    # 判断操作系统类型
+    if sys.platform.startswith('win'):
+        # Windows系统
+        font_family = ['Microsoft YaHei', 'SimHei', 'SimSun']
+    elif sys.platform.startswith('darwin'):
+        # macOS系统
+        font_family = ['Heiti SC', 'Hei', 'STHeiti', 'SimHei']
+    else:
+        # Linux系统
+        font_family = ['WenQuanYi Micro Hei', 'WenQuanYi Zen Hei', 'SimHei']
+
+    # 按优先级选择第一个已安装的字体
+    installed = {font.name for font in font_manager.fontManager.ttflist}
+    font_found = next((font for font in font_family if font in installed), None)
+
+    if font_found:
+        matplotlib.rcParams['font.family'] = [font_found]
+        print(f"已设置中文字体: {font_found}")
+    else:
+        # 如果未找到中文字体，使用通用设置
+        matplotlib.rcParams['font.family'] = 'sans-serif'
+        matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'DejaVu Sans', 'Arial']
+
+    # 修复负号显示问题
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    return font_found
+
+
+def create_chart_canvas(figsize=(5, 8), dpi=100):
+    """创建Qt画布及图表，首次调用时才导入matplotlib的Qt后端"""
+    set_matplotlib_chinese_font()
+    from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=figsize, dpi=dpi)
+    canvas = FigureCanvas(figure)
+    return PyramidChart(figure, canvas)
+
+
+def format_risk_text(risk):
+    text = "风险评估指标:\n"
+    text += f"最大投入: {risk['max_investment']:.2f}元\n"
+    text += f"最大回撤: {risk['max_drawdown_pct']:.2f}%\n"
+    text += f"风险收益比: {risk['risk_reward_ratio']:.2f}\n"
+    text += f"盈亏平衡价: {risk['breakeven_price']:.2f}元\n"
+    text += f"目标收益率: {risk['max_return']:.2f}%"
+    return text
+
+
+class PyramidChart:
+    """持久化图元的三联图：买点图、平均成本图、预期收益率图"""
+
+    def __init__(self, figure, canvas):
+        self.figure = figure
+        self.canvas = canvas
+        self._built = False
+        self._background = None
+        self.live_price = None
+
+        self.full_draws = 0
+        self.blit_draws = 0
+        self.render_times = deque(maxlen=RENDER_HISTORY)
+
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _build(self):
+        """创建全部子图和图元，只执行一次"""
+        gs = self.figure.add_gridspec(3, 1, height_ratios=[2, 1, 1])
+
+        # 第一个子图：买入价格和股数
+        ax1 = self.figure.add_subplot(gs[0])
+        self.shares_line, = ax1.plot([], [], 'b-', marker='o', label='买入股数')
+
+        # 创建第二个Y轴显示投入金额
+        ax1_twin = ax1.twinx()
+        self.investment_line, = ax1_twin.plot([], [], 'r-', marker='x', label='本次投入')
+
+        ax1.set_title('金字塔加仓买点图', fontsize=12)
+        ax1.set_ylabel('买入股数', color='b', fontsize=10)
+        ax1_twin.set_ylabel('投入金额(元)', color='r', fontsize=10)
+        ax1.grid(True, linestyle='--', alpha=0.7)
+        lines1, labels1 = ax1.get_legend_handles_labels()
+        lines2, labels2 = ax1_twin.get_legend_handles_labels()
+        ax1.legend(lines1 + lines2, labels1 + labels2, loc='upper right', fontsize=9)
+        ax1.axhline(y=0, color='k', linestyle='-', alpha=0.3)
+
+        # 风险指标文本框
+        self.risk_text = ax1.text(0.98, 0.02, '', transform=ax1.transAxes, fontsize=8,
+                                  verticalalignment='bottom', horizontalalignment='right',
+                                  bbox=dict(boxstyle='round,pad=0.5', facecolor='white', alpha=0.8))
+
+        # 第二个子图：平均成本变化及止损、当前、目标价格线
+        ax2 = self.figure.add_subplot(gs[1], sharex=ax1)
+        self.avg_cost_line, = ax2.plot([], [], 'g-', marker='s', label='平均成本')
+        self.stop_loss_line = ax2.axhline(y=0, color='r', linestyle='--', alpha=0.5, label='止损价')
+        self.current_price_line = ax2.axhline(y=0, color='b', linestyle='--', alpha=0.5, label='当前价')
+        self.target_price_line = ax2.axhline(y=0, color='g', linestyle='--', alpha=0.5, label='目标价')
+        ax2.set_ylabel('价格(元)', fontsize=10)
+        ax2.grid(True, linestyle='--', alpha=0.7)
+        self.price_legend = ax2.legend(loc='upper right', fontsize=8)
+
+        # 实时价格线只通过 blitting 绘制
+        self.live_price_line = ax2.axhline(y=0, color='orange', linewidth=1.2,
+                                           animated=True, visible=False)
+
+        # 第三个子图：收益分析
+        ax3 = self.figure.add_subplot(gs[2], sharex=ax1)
+        self.return_bars = None
+        ax3.set_title('预期收益率分析 (基于目标价格)', fontsize=11)
+        ax3.set_xlabel('买入价格', fontsize=10)
+        ax3.set_ylabel('收益率(%)', fontsize=10)
+        ax3.grid(True, linestyle='--', alpha=0.7)
+
+        for ax in [ax1, ax1_twin, ax2, ax3]:
+            ax.tick_params(labelsize=8)
+
+        self.ax1, self.ax1_twin, self.ax2, self.ax3 = ax1, ax1_twin, ax2, ax3
+        self._built = True
+
+    def _update_bars(self, buy_prices, potential_returns):
+        """柱子数量不变时原地修改位置和高度，否则重建柱状图"""
+        if self.return_bars is None or len(self.return_bars) != len(buy_prices):
+            if self.return_bars is not None:
+                self.return_bars.remove()
+            self.return_bars = self.ax3.bar(buy_prices, potential_returns, alpha=0.7,
+                                            label='预期收益率(%)')
+        else:
+            for bar, x, height in zip(self.return_bars, buy_prices, potential_returns):
+                bar.set_x(x - bar.get_width() / 2)
+                bar.set_height(height)
+        # 使用颜色区分正负收益
+        for bar, height in zip(self.return_bars, potential_returns):
+            bar.set_color('red' if height >= 0 else 'green')
+
+    def update(self, plan):
+        """用新的计划原地更新全部图元并重绘"""
+        start = time.perf_counter()
+        first_draw = not self._built
+        if first_draw:
+            self._build()
+
+        buy_prices = plan.buy_prices
+        self.shares_line.set_data(buy_prices, plan.shares)
+        self.investment_line.set_data(buy_prices, plan.investments)
+        self.avg_cost_line.set_data(buy_prices, plan.avg_costs)
+        self._update_bars(buy_prices, plan.potential_returns)
+
+        self.stop_loss_line.set_ydata([plan.stop_loss, plan.stop_loss])
+        self.current_price_line.set_ydata([plan.current_price, plan.current_price])
+        self.target_price_line.set_ydata([plan.target_price, plan.target_price])
+        legend_texts = self.price_legend.get_texts()
+        legend_texts[1].set_text(f'止损价: {plan.stop_loss:.2f}')
+        legend_texts[2].set_text(f'当前价: {plan.current_price:.2f}')
+        legend_texts[3].set_text(f'目标价: {plan.target_price:.2f}')
+
+        self.risk_text.set_text(format_risk_text(plan.risk_metrics))
+
+        # 横轴范围两侧各延伸10%
+        price_range = np.max(buy_prices) - np.min(buy_prices)
+        price_extension = price_range * 0.1
+        self.ax1.set_xlim(np.min(buy_prices) - price_extension, np.max(buy_prices) + price_extension)
+        for ax in (self.ax1, self.ax1_twin, self.ax2, self.ax3):
+            ax.relim(visible_only=True)
+            ax.autoscale_view(scalex=False)
+
+        # 只在首次绘制时计算布局
+        if first_draw:
+            self.figure.tight_layout()
+        self.canvas.draw()
+        self._record('full', start)
+
+    def _on_draw(self, event):
+        """整图重绘后保存背景，并补画实时价格线"""
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        if self._built and self.live_price_line.get_visible():
+            self.ax2.draw_artist(self.live_price_line)
+
+    def update_live_price(self, price):
+        """移动实时价格线，只重绘这一条线"""
+        if not self._built:
+            return
+        start = time.perf_counter()
+        self.live_price = price
+        self.live_price_line.set_ydata([price, price])
+        self.live_price_line.set_visible(True)
+        if self._background is None:
+            self.canvas.draw()
+            self._record('full', start)
+            return
+        self.canvas.restore_region(self._background)
+        self.ax2.draw_artist(self.live_price_line)
+        self.canvas.blit(self.figure.bbox)
+        self._record('blit', start)
+
+    def _record(self, kind, start):
+        elapsed = time.perf_counter() - start
+        if kind == 'full':
+            self.full_draws += 1
+        else:
+            self.blit_draws += 1
+        self.render_times.append((kind, elapsed))
+        metrics.observe(f'chart.{kind}_draw', elapsed)
+
+    def render_stats(self):
+        """绘制次数和平均耗时(毫秒)"""
+        stats = {'full_draws': self.full_draws, 'blit_draws': self.blit_draws}
+        for kind in ('full', 'blit'):
+            times = [t for k, t in self.render_times if k == kind]
+            stats[f'{kind}_ms'] = sum(times) / len(times) * 1000 if times else 0.0
+        return stats
@@ -0,0 +1,185 @@
+"""金字塔加仓计划命令行工具
+
+从 CSV / JSON / JSON Lines 文件或标准输入读取场景，批量生成加仓计划，
+以 CSV、JSON Lines、Parquet 或 Excel 格式流式输出。不导入Qt和matplotlib，可在无显示器的环境运行。
+
+示例:
+    python pyramid_cli.py scenarios.csv -o plans.jsonl
+    cat scenarios.jsonl | python pyramid_cli.py - --input-format jsonl --levels
+"""
+import argparse
+import csv
+import json
+import sys
+
+import numpy as np
+
+from pyramid_engine import (iter_plan_batches, default_target_price,
+                            DEFAULT_INTERVALS, DEFAULT_WEIGHT_EXPONENT, DEFAULT_CHUNK_SIZE,
+                            LotRules, A_SHARE_COMMISSION_RATE, A_SHARE_MIN_COMMISSION)
+from pyramid_strategies import DEFAULT_STRATEGY, strategy_names
+from pyramid_export import (OUTPUT_FORMATS, guess_format, open_output,
+                            summary_columns, level_columns)
+
+# 场景输入字段，其余列(包括ATR间隔策略使用的 atr 列)原样输出
+SCENARIO_FIELDS = ('current_price', 'stop_loss', 'capital', 'target_price',
+                   'intervals', 'weight_exponent', 'strategy')
+
+INPUT_FORMATS = ('csv', 'json', 'jsonl')
+
+
+def read_scenarios(stream, fmt):
+    """逐条读取场景，产出字典"""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    elif fmt == 'json':
+        data = json.load(stream)
+        yield from (data if isinstance(data, list) else [data])
+    else:
+        raise ValueError(f"不支持的输入格式: {fmt}")
+
+
+def iter_chunks(records, chunk_size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _column(records, name, default, offset):
+    """取出一列并转换为浮点数组，空值使用默认值"""
+    values = np.empty(len(records), dtype=np.float64)
+    for i, record in enumerate(records):
+        value = record.get(name)
+        if value is None or value == '':
+            if default is None:
+                raise ValueError(f"第{offset + i + 1}条场景缺少字段: {name}")
+            values[i] = default
+        else:
+            try:
+                values[i] = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"第{offset + i + 1}条场景字段 {name} 不是有效数字: {value!r}")
+    return values
+
+
+def _count_column(records, name, default, offset):
+    """取出一列正整数(如区间数)，小数、0 和负数都报错，不静默截断"""
+    values = _column(records, name, default, offset)
+    bad = ~((values >= 1) & (values == np.floor(values)) & np.isfinite(values))
+    if bad.any():
+        i = int(np.argmax(bad))
+        raise ValueError(f"第{offset + i + 1}条场景字段 {name} 必须是不小于1的整数: "
+                         f"{records[i].get(name)!r}")
+    return values.astype(np.int64)
+
+
+def _text_column(records, name, default):
+    """取出一列文本，空值使用默认值"""
+    return [record.get(name) or default for record in records]
+
+
+def compute_chunk(records, offset, include_levels, rules=None, strategy=DEFAULT_STRATEGY):
+    """计算一块场景，返回 PlanBatch"""
+    current_prices = _column(records, 'current_price', None, offset)
+    stop_losses = _column(records, 'stop_loss', None, offset)
+    capitals = _column(records, 'capital', None, offset)
+    # 目标价格缺省为 NaN，之后按当前价格的默认比例补齐
+    target_prices = _column(records, 'target_price', np.nan, offset)
+    missing_target = np.isnan(target_prices)
+    if missing_target.any():
+        target_prices[missing_target] = default_target_price(current_prices[missing_target])
+    intervals = _count_column(records, 'intervals', DEFAULT_INTERVALS, offset)
+    exponents = _column(records, 'weight_exponent', DEFAULT_WEIGHT_EXPONENT, offset)
+    strategies = _text_column(records, 'strategy', strategy)
+    atr = _column(records, 'atr', np.nan, offset)
+
+    # 输入已经分块，这里整块一次计算
+    return next(iter_plan_batches(current_prices, stop_losses, capitals, target_prices,
+                                  intervals, exponents, chunk_size=max(len(records), 1),
+                                  include_ladders=include_levels, rules=rules,
+                                  strategies=strategies, atr=atr))
+
+
+def _passthrough_columns(records):
+    """输入中除场景字段以外的列，原样输出"""
+    names = dict.fromkeys(k for record in records for k in record if k not in SCENARIO_FIELDS)
+    return {name: [record.get(name) for record in records] for name in names}
+
+
+def run(input_stream, input_format, output, include_levels=False, chunk_size=DEFAULT_CHUNK_SIZE,
+        rules=None, strategy=DEFAULT_STRATEGY):
+    """读取全部场景并写出结果，返回处理的场景数量"""
+    offset = 0
+    with output:
+        for records in iter_chunks(read_scenarios(input_stream, input_format), chunk_size):
+            batch = compute_chunk(records, offset, include_levels, rules, strategy)
+            extra = _passthrough_columns(records)
+            if include_levels:
+                output.write(level_columns(batch, offset, extra, rules, include_inputs=True))
+            else:
+                output.write(summary_columns(batch, offset, extra, rules))
+            offset += len(records)
+    return offset
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="批量生成金字塔加仓计划")
+    parser.add_argument('input', nargs='?', default='-',
+                        help="场景文件(CSV/JSON/JSONL)，- 表示标准输入")
+    parser.add_argument('-o', '--output', default='-', help="输出文件，默认标准输出")
+    parser.add_argument('--input-format', choices=INPUT_FORMATS,
+                        help="输入格式，默认按扩展名判断，标准输入默认为csv")
+    parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS,
+                        help="输出格式，默认按扩展名判断，标准输出默认为csv")
+    parser.add_argument('--levels', action='store_true',
+                        help="输出每个价格区间的明细，而不是每个场景的风险指标")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="每次计算的场景数量")
+    parser.add_argument('--strategy', default=DEFAULT_STRATEGY,
+                        help=f"未指定 strategy 列的场景使用的加仓策略: {', '.join(strategy_names())}")
+    parser.add_argument('--lot-size', type=int,
+                        help="按整手下单的每手股数(A股为100)，默认按1股取整且不计佣金")
+    parser.add_argument('--commission-rate', type=float, default=A_SHARE_COMMISSION_RATE,
+                        help="佣金费率，只在指定 --lot-size 时生效")
+    parser.add_argument('--min-commission', type=float, default=A_SHARE_MIN_COMMISSION,
+                        help="每笔最低佣金(元)，只在指定 --lot-size 时生效")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    input_format = args.input_format or guess_format(args.input, INPUT_FORMATS, 'csv')
+    output_format = args.format or guess_format(args.output, OUTPUT_FORMATS, 'csv')
+
+    try:
+        rules = None
+        if args.lot_size is not None:
+            rules = LotRules(args.lot_size, args.commission_rate, args.min_commission)
+        output = open_output(args.output, output_format)
+        if args.input == '-':
+            count = run(sys.stdin, input_format, output, args.levels, args.chunk_size, rules,
+                        args.strategy)
+        else:
+            with open(args.input, 'r', encoding='utf-8', newline='') as stream:
+                count = run(stream, input_format, output, args.levels, args.chunk_size, rules,
+                            args.strategy)
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+
+    print(f"已处理 {count} 个场景", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
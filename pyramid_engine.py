@@ -0,0 +1,545 @@
+"""金字塔加仓计划计算引擎
+
+不依赖Qt和matplotlib，可在无界面的服务器环境中直接调用。
+"""
+import numpy as np
+
+from pyramid_strategies import get_strategy, group_rows, strategy_ratios, strategy_names_array
+
+# 默认价格区间数量
+DEFAULT_INTERVALS = 20
+# 默认权重指数：第i个区间权重为 i**2，越跌越买
+DEFAULT_WEIGHT_EXPONENT = 2
+# 未填写目标价格时，默认按当前价格上涨20%计算
+DEFAULT_TARGET_RATIO = 1.2
+
+
+# A股交易规则：100股为一手，佣金万分之2.5，每笔最低5元
+A_SHARE_LOT_SIZE = 100
+A_SHARE_COMMISSION_RATE = 0.00025
+A_SHARE_MIN_COMMISSION = 5.0
+
+
+class LotRules:
+    """下单规则：每手股数、佣金费率和每笔最低佣金
+
+    计划使用这些规则时，每个区间的股数为整手，本次投入包含佣金，
+    全部区间的投入(含佣金)不超过本金。
+    """
+
+    __slots__ = ('lot_size', 'commission_rate', 'min_commission')
+
+    def __init__(self, lot_size=A_SHARE_LOT_SIZE, commission_rate=A_SHARE_COMMISSION_RATE,
+                 min_commission=A_SHARE_MIN_COMMISSION):
+        if lot_size < 1:
+            raise ValueError("每手股数必须大于0!")
+        if commission_rate < 0 or min_commission < 0:
+            raise ValueError("佣金不能为负数!")
+        self.lot_size = int(lot_size)
+        self.commission_rate = float(commission_rate)
+        self.min_commission = float(min_commission)
+
+    def _key(self):
+        return (self.lot_size, self.commission_rate, self.min_commission)
+
+    def __eq__(self, other):
+        return isinstance(other, LotRules) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return (f"LotRules(lot_size={self.lot_size}, commission_rate={self.commission_rate}, "
+                f"min_commission={self.min_commission})")
+
+    def commission(self, amount):
+        """成交金额对应的佣金，金额为0(不下单)时佣金为0"""
+        amount = np.asarray(amount, dtype=np.float64)
+        return np.where(amount > 0, np.maximum(amount * self.commission_rate, self.min_commission), 0.0)
+
+
+A_SHARE_RULES = LotRules()
+
+
+def default_target_price(current_price):
+    """未指定目标价格时的默认目标价"""
+    return current_price * DEFAULT_TARGET_RATIO
+
+
+def validate_inputs(current_price, stop_loss, capital, intervals=DEFAULT_INTERVALS):
+    """检查计划参数，不合法时抛出ValueError"""
+    if current_price <= stop_loss:
+        raise ValueError("当前价格必须高于止损价格!")
+    if stop_loss <= 0:
+        raise ValueError("止损价格必须大于0!")
+    if capital <= 0:
+        raise ValueError("本金必须大于0!")
+    if intervals < 1:
+        raise ValueError("价格区间数量必须大于0!")
+
+
+class PyramidPlan:
+    """一次加仓计划的计算结果，所有逐区间数据均为NumPy数组"""
+
+    __slots__ = ('current_price', 'stop_loss', 'capital', 'target_price',
+                 'buy_prices', 'allocation_ratios', 'shares', 'investments',
+                 'cumulative_investments', 'cumulative_shares', 'avg_costs',
+                 'potential_returns', 'risk_metrics')
+
+    def __init__(self, current_price, stop_loss, capital, target_price,
+                 buy_prices, allocation_ratios, shares, investments,
+                 cumulative_investments, cumulative_shares, avg_costs,
+                 potential_returns, risk_metrics):
+        self.current_price = current_price
+        self.stop_loss = stop_loss
+        self.capital = capital
+        self.target_price = target_price
+        self.buy_prices = buy_prices
+        self.allocation_ratios = allocation_ratios
+        self.shares = shares
+        self.investments = investments
+        self.cumulative_investments = cumulative_investments
+        self.cumulative_shares = cumulative_shares
+        self.avg_costs = avg_costs
+        self.potential_returns = potential_returns
+        self.risk_metrics = risk_metrics
+
+    @property
+    def intervals(self):
+        return len(self.buy_prices)
+
+    @property
+    def profit_points(self):
+        """盈亏平衡点，即每次买入后的平均成本"""
+        return self.avg_costs
+
+    def with_target(self, target_price):
+        """只修改目标价格时复用价格阶梯、股数和平均成本，只重算收益和风险指标"""
+        potential_returns = compute_returns(target_price, self.cumulative_investments,
+                                            self.cumulative_shares, self.avg_costs)
+        risk_metrics = compute_risk_metrics(self.current_price, self.stop_loss, target_price,
+                                            self.cumulative_investments[-1],
+                                            self.cumulative_shares[-1], self.avg_costs[-1])
+        return PyramidPlan(self.current_price, self.stop_loss, self.capital, target_price,
+                           self.buy_prices, self.allocation_ratios, self.shares,
+                           self.investments, self.cumulative_investments,
+                           self.cumulative_shares, self.avg_costs,
+                           potential_returns, risk_metrics)
+
+    def to_dict(self):
+        """转换为界面使用的 last_generated_data 字典格式"""
+        return {
+            'current_price': self.current_price,
+            'stop_loss': self.stop_loss,
+            'buy_prices': self.buy_prices.tolist(),
+            'shares': self.shares.tolist(),
+            'investments': self.investments.tolist(),
+            'avg_costs': self.avg_costs.tolist(),
+            'profit_points': self.profit_points.tolist(),
+            'potential_returns': self.potential_returns.tolist(),
+            'target_price': self.target_price,
+            'risk_metrics': dict(self.risk_metrics)
+        }
+
+
+def allocate_lots(ratios, prices, capitals, rules):
+    """按整手分配股数，返回 (shares, investments)，投入包含佣金
+
+    ratios、prices 为 (场景数 × 区间数) 的二维数组，capitals 为每个场景的本金；
+    ratio 为0的区间(对齐用的填充区间)不分配。先按目标权重向下取整到整手，
+    超出本金(最低佣金导致)时从余数最小的区间逐手扣减，
+    再按最大余数法把剩余资金依次补到余数最大的区间，买不起的区间跳过，
+    直到剩余资金不够任何区间再买一手。本金买不起一手时全部区间的股数为0。
+    """
+    ratios = np.atleast_2d(ratios)
+    prices = np.atleast_2d(prices)
+    capitals = np.atleast_1d(np.asarray(capitals, dtype=np.float64))
+    active = ratios > 0
+    lot_value = np.where(active, prices * rules.lot_size, 0.0)
+
+    # 按比例佣金折算后的目标手数
+    with np.errstate(divide='ignore', invalid='ignore'):
+        target = np.where(active, ratios * capitals[:, np.newaxis]
+                          / (lot_value * (1 + rules.commission_rate)), 0.0)
+    lots = np.floor(target)
+
+    def order_cost(lot_counts):
+        amount = np.where(active, lot_counts * lot_value, 0.0)
+        return amount + rules.commission(amount)
+
+    rows = np.arange(len(lots))
+    # 最低佣金可能使向下取整后的总投入超过本金，每轮为超支的场景扣减一手
+    while True:
+        over = order_cost(lots).sum(axis=1) > capitals + 1e-9
+        if not over.any():
+            break
+        remainder = np.where(lots > 0, target - lots, np.inf)
+        level = np.argmin(remainder, axis=1)
+        lots[rows[over], level[over]] -= 1
+
+    # 最大余数法：先整体按余数从大到小补一手，直到遇到第一个买不起的区间
+    leftover = capitals - order_cost(lots).sum(axis=1)
+    remainder = np.where(active, target - lots, 0.0)
+    marginal = order_cost(lots + 1) - order_cost(lots)
+    order = np.argsort(-remainder, axis=1, kind='stable')
+    sorted_marginal = np.take_along_axis(marginal, order, axis=1)
+    sorted_remainder = np.take_along_axis(remainder, order, axis=1)
+    take = (np.cumsum(sorted_marginal, axis=1) <= leftover[:, np.newaxis] + 1e-9) & (sorted_remainder > 0)
+    extra = np.zeros_like(lots)
+    np.put_along_axis(extra, order, take.astype(lots.dtype), axis=1)
+    lots += extra
+
+    # 再逐手补齐：每轮为仍有余钱的场景在买得起的区间中选余数最大的加一手，
+    # 跳过买不起的区间，直到没有任何区间买得起
+    leftover = capitals - order_cost(lots).sum(axis=1)
+    pending = np.arange(len(lots))
+    while len(pending):
+        sub_lots = lots[pending]
+        sub_active = active[pending]
+        amount = sub_lots * lot_value[pending]
+        next_amount = amount + lot_value[pending]
+        marginal = (next_amount + rules.commission(next_amount)) - (amount + rules.commission(amount))
+        fits = sub_active & (marginal <= leftover[pending, np.newaxis] + 1e-9)
+        can_buy = fits.any(axis=1)
+        pending = pending[can_buy]
+        if not len(pending):
+            break
+        score = np.where(fits[can_buy], target[pending] - sub_lots[can_buy], -np.inf)
+        level = np.argmax(score, axis=1)
+        lots[pending, level] += 1
+        leftover[pending] -= marginal[can_buy][np.arange(len(pending)), level]
+
+    shares = (lots * rules.lot_size).astype(np.int64)
+    return shares, order_cost(lots)
+
+
+def compute_ladder(current_price, stop_loss, capital,
+                   intervals=DEFAULT_INTERVALS,
+                   weight_exponent=DEFAULT_WEIGHT_EXPONENT,
+                   rules=None, strategy=None):
+    """计算价格阶梯、资金比例和股数，返回 (buy_prices, ratios, shares, investments)
+
+    rules 为 None 时每个区间独立四舍五入到整数股；为 LotRules 时按整手和佣金分配。
+    strategy 为策略名称、LadderStrategy 或权重函数，None 为默认的幂次加权等距阶梯。
+    """
+    strategy = get_strategy(strategy)
+    levels = np.arange(1, intervals + 1, dtype=np.float64)
+    buy_prices = current_price - strategy.distances(levels, intervals, current_price, stop_loss)
+
+    # 缓存的归一化权重(只读)，默认策略低价位权重大，高价位权重小
+    allocation_ratios = strategy.weights(intervals, weight_exponent)
+
+    if rules is None:
+        # 每个区间独立四舍五入到整数股
+        shares = np.rint(allocation_ratios * capital / buy_prices).astype(np.int64)
+        investments = shares * buy_prices
+    else:
+        shares, investments = allocate_lots(allocation_ratios, buy_prices, capital, rules)
+        shares, investments = shares[0], investments[0]
+    return buy_prices, allocation_ratios, shares, investments
+
+
+def compute_cost_basis(shares, investments):
+    """累计投入、累计股数和每次买入后的平均成本"""
+    cumulative_investments = np.cumsum(investments)
+    cumulative_shares = np.cumsum(shares)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_costs = np.where(cumulative_shares > 0,
+                             cumulative_investments / cumulative_shares, 0.0)
+    return cumulative_investments, cumulative_shares, avg_costs
+
+
+def compute_returns(target_price, cumulative_investments, cumulative_shares, avg_costs):
+    """目标价格下每次买入后的预期收益率(%)"""
+    potential_profit = (target_price - avg_costs) * cumulative_shares
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(cumulative_investments > 0,
+                        potential_profit / cumulative_investments * 100, 0.0)
+
+
+def compute_risk_metrics(current_price, stop_loss, target_price,
+                         max_investment, total_shares, breakeven_price):
+    """根据计划终值计算风险评估指标"""
+    # 最大回撤 (基于当前价格到止损价格的跌幅)
+    max_drawdown_pct = (current_price - stop_loss) / current_price * 100
+
+    # 风险收益比 (潜在收益与潜在损失的比值)
+    potential_loss = max_investment * max_drawdown_pct / 100
+    potential_gain = (target_price - breakeven_price) * total_shares
+    risk_reward_ratio = potential_gain / potential_loss if potential_loss > 0 else float('inf')
+
+    # 最大预期收益率
+    if breakeven_price > 0:
+        max_return = (target_price - breakeven_price) / breakeven_price * 100
+    else:
+        max_return = 0.0
+
+    return {
+        'max_investment': float(max_investment),
+        'max_drawdown_pct': float(max_drawdown_pct),
+        'risk_reward_ratio': float(risk_reward_ratio),
+        'breakeven_price': float(breakeven_price),
+        'max_return': float(max_return)
+    }
+
+
+def compute_plan(current_price, stop_loss, capital, target_price=None,
+                 intervals=DEFAULT_INTERVALS,
+                 weight_exponent=DEFAULT_WEIGHT_EXPONENT,
+                 rules=None, strategy=None, atr=None):
+    """一次性向量化计算完整的金字塔加仓计划，rules 和 strategy 见 compute_ladder
+
+    ATR间隔的策略需要提供 atr，区间数由 (当前价 - 止损价) / ATR 决定，忽略 intervals。
+    """
+    strategy = get_strategy(strategy)
+    if strategy.atr_spaced:
+        if atr is None or not atr > 0:
+            raise ValueError("ATR间隔策略需要有效的ATR!")
+        intervals = int(strategy.atr_intervals(current_price, stop_loss, atr))
+    validate_inputs(current_price, stop_loss, capital, intervals)
+    if target_price is None:
+        target_price = default_target_price(current_price)
+
+    buy_prices, ratios, shares, investments = compute_ladder(
+        current_price, stop_loss, capital, intervals, weight_exponent, rules, strategy)
+    if rules is not None and not shares.any():
+        # 否则会得到全部为0股、风险收益比为无穷大的计划
+        lot_amount = float(buy_prices.min()) * rules.lot_size
+        raise ValueError(f"本金不足以买入一手，最少需要 "
+                         f"{lot_amount + float(rules.commission(lot_amount)):.2f} 元!")
+    cum_inv, cum_shares, avg_costs = compute_cost_basis(shares, investments)
+    potential_returns = compute_returns(target_price, cum_inv, cum_shares, avg_costs)
+    risk_metrics = compute_risk_metrics(current_price, stop_loss, target_price,
+                                        cum_inv[-1], cum_shares[-1], avg_costs[-1])
+
+    return PyramidPlan(current_price, stop_loss, capital, target_price,
+                       buy_prices, ratios, shares, investments,
+                       cum_inv, cum_shares, avg_costs,
+                       potential_returns, risk_metrics)
+
+
+# 批量计算时每块包含的场景数，控制中间数组的内存占用
+DEFAULT_CHUNK_SIZE = 10000
+
+RISK_METRIC_FIELDS = ('max_investment', 'max_drawdown_pct', 'risk_reward_ratio',
+                      'breakeven_price', 'max_return')
+
+
+class PlanBatch:
+    """批量计划结果：逐区间数据为 (场景数 × 区间数) 的二维数组，风险指标为列数组
+
+    区间数不同的场景按最大区间数对齐，mask 标记有效区间；
+    参数不合法的场景 valid 为 False，其风险指标为 NaN。
+    """
+
+    __slots__ = ('current_prices', 'stop_losses', 'capitals', 'target_prices',
+                 'intervals', 'weight_exponents', 'strategies', 'valid', 'mask',
+                 'buy_prices', 'allocation_ratios', 'shares', 'investments',
+                 'cumulative_investments', 'cumulative_shares', 'avg_costs',
+                 'potential_returns') + RISK_METRIC_FIELDS
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def __len__(self):
+        return len(self.current_prices)
+
+    @property
+    def has_ladders(self):
+        return self.buy_prices is not None
+
+    @property
+    def risk_metrics(self):
+        """风险指标列数组字典，字段与单次计划的 risk_metrics 相同"""
+        return {name: getattr(self, name) for name in RISK_METRIC_FIELDS}
+
+    def plan(self, index):
+        """取出第 index 个场景，还原为单个 PyramidPlan"""
+        if not self.has_ladders:
+            raise ValueError("该批量结果未保留逐区间数据")
+        if not self.valid[index]:
+            raise ValueError(f"第{index}个场景参数不合法")
+        n = int(self.intervals[index])
+        risk_metrics = {name: float(getattr(self, name)[index]) for name in RISK_METRIC_FIELDS}
+        return PyramidPlan(
+            float(self.current_prices[index]), float(self.stop_losses[index]),
+            float(self.capitals[index]), float(self.target_prices[index]),
+            self.buy_prices[index, :n], self.allocation_ratios[index, :n],
+            self.shares[index, :n], self.investments[index, :n],
+            self.cumulative_investments[index, :n], self.cumulative_shares[index, :n],
+            self.avg_costs[index, :n], self.potential_returns[index, :n],
+            risk_metrics)
+
+
+def _broadcast_inputs(current_prices, stop_losses, capitals, target_prices,
+                      intervals, weight_exponents):
+    """把标量或数组参数广播成等长的一维数组"""
+    current_prices = np.asarray(current_prices, dtype=np.float64)
+    if target_prices is None:
+        target_prices = default_target_price(current_prices)
+    arrays = np.broadcast_arrays(
+        current_prices,
+        np.asarray(stop_losses, dtype=np.float64),
+        np.asarray(capitals, dtype=np.float64),
+        np.asarray(target_prices, dtype=np.float64),
+        np.asarray(intervals, dtype=np.int64),
+        np.asarray(weight_exponents, dtype=np.float64))
+    return [np.ravel(a) for a in arrays]
+
+
+def _atr_intervals(names, cp, sl, n, atr):
+    """ATR间隔策略的场景改用由ATR决定的区间数，ATR无效时为0(场景不合法)"""
+    for strategy, rows in group_rows(names):
+        if strategy.atr_spaced:
+            n = np.array(n)
+            n[rows] = strategy.atr_intervals(cp[rows], sl[rows], atr[rows])
+    return n
+
+
+def _compute_chunk(cp, sl, cap, tp, n, exp, include_ladders, rules=None, names=None):
+    """对一块场景做二维向量化计算"""
+    valid = (cp > sl) & (sl > 0) & (cap > 0) & (n >= 1)
+    # 不合法的场景用安全的占位参数参与计算，最后再置为NaN
+    cp = np.where(valid, cp, 2.0)
+    sl = np.where(valid, sl, 1.0)
+    cap = np.where(valid, cap, 1.0)
+    n = np.where(valid, n, 1)
+
+    max_levels = int(n.max()) if len(n) else 0
+    levels = np.arange(1, max_levels + 1, dtype=np.float64)[np.newaxis, :]
+    mask = levels <= n[:, np.newaxis]
+
+    if names is None:
+        names = strategy_names_array(None, len(cp))
+    groups = list(group_rows(names))
+    buy_prices = np.empty((len(cp), max_levels))
+    for strategy, rows in groups:
+        buy_prices[rows] = cp[rows, np.newaxis] - strategy.distances(
+            levels, n[rows, np.newaxis], cp[rows, np.newaxis], sl[rows, np.newaxis])
+
+    # 每组 (策略, 区间数, 权重指数) 共用缓存的归一化权重，对齐区间为0
+    ratios = strategy_ratios(groups, n, exp, max_levels)
+
+    if rules is None:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            raw_shares = np.where(mask, ratios * cap[:, np.newaxis] / buy_prices, 0.0)
+        shares = np.rint(raw_shares).astype(np.int64)
+        investments = shares * np.where(mask, buy_prices, 0.0)
+    else:
+        shares, investments = allocate_lots(ratios, buy_prices, cap, rules)
+
+    # 对齐区间的投入为0，累计值在有效区间之后保持不变，最后一列即为终值
+    cum_inv = np.cumsum(investments, axis=1)
+    cum_shares = np.cumsum(shares, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_costs = np.where(cum_shares > 0, cum_inv / cum_shares, 0.0)
+        potential_returns = np.where(
+            cum_inv > 0, (tp[:, np.newaxis] - avg_costs) * cum_shares / cum_inv * 100, 0.0)
+
+    max_investment = cum_inv[:, -1]
+    total_shares = cum_shares[:, -1]
+    breakeven_price = avg_costs[:, -1]
+    if rules is not None:
+        # 本金买不起一手的场景没有可执行的计划，与不合法的参数一样处理
+        valid = valid & (total_shares > 0)
+
+    max_drawdown_pct = (cp - sl) / cp * 100
+    potential_loss = max_investment * max_drawdown_pct / 100
+    potential_gain = (tp - breakeven_price) * total_shares
+    with np.errstate(divide='ignore', invalid='ignore'):
+        risk_reward_ratio = np.where(potential_loss > 0, potential_gain / potential_loss, np.inf)
+        max_return = np.where(breakeven_price > 0,
+                              (tp - breakeven_price) / breakeven_price * 100, 0.0)
+
+    fields = {
+        'valid': valid,
+        'max_investment': np.where(valid, max_investment, np.nan),
+        'max_drawdown_pct': np.where(valid, max_drawdown_pct, np.nan),
+        'risk_reward_ratio': np.where(valid, risk_reward_ratio, np.nan),
+        'breakeven_price': np.where(valid, breakeven_price, np.nan),
+        'max_return': np.where(valid, max_return, np.nan),
+    }
+    if include_ladders:
+        # 对齐区间和不合法场景的浮点数据置为NaN，股数置为0
+        row_mask = mask & valid[:, np.newaxis]
+        fields.update({
+            'mask': row_mask,
+            'buy_prices': np.where(row_mask, buy_prices, np.nan),
+            'allocation_ratios': np.where(row_mask, ratios, np.nan),
+            'shares': np.where(row_mask, shares, 0),
+            'investments': np.where(row_mask, investments, np.nan),
+            'cumulative_investments': np.where(row_mask, cum_inv, np.nan),
+            'cumulative_shares': np.where(row_mask, cum_shares, 0),
+            'avg_costs': np.where(row_mask, avg_costs, np.nan),
+            'potential_returns': np.where(row_mask, potential_returns, np.nan),
+        })
+    return fields
+
+
+def iter_plan_batches(current_prices, stop_losses, capitals, target_prices=None,
+                      intervals=DEFAULT_INTERVALS,
+                      weight_exponents=DEFAULT_WEIGHT_EXPONENT,
+                      chunk_size=DEFAULT_CHUNK_SIZE, include_ladders=True, rules=None,
+                      strategies=None, atr=None):
+    """按块迭代批量计算结果，每次产出一个 PlanBatch，内存占用与块大小成正比
+
+    strategies 为单个策略或每个场景的策略序列，atr 为ATR间隔策略使用的ATR(标量或数组)。
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size 必须大于0!")
+    cp, sl, cap, tp, n, exp = _broadcast_inputs(
+        current_prices, stop_losses, capitals, target_prices, intervals, weight_exponents)
+    names = strategy_names_array(strategies, len(cp))
+    if atr is not None:
+        atr = np.broadcast_to(np.asarray(atr, dtype=np.float64), cp.shape)
+    else:
+        atr = np.full(cp.shape, np.nan)
+    n = _atr_intervals(names, cp, sl, n, atr)
+
+    for start in range(0, len(cp), chunk_size):
+        part = slice(start, start + chunk_size)
+        fields = _compute_chunk(cp[part], sl[part], cap[part], tp[part],
+                                n[part], exp[part], include_ladders, rules, names[part])
+        yield PlanBatch(current_prices=cp[part], stop_losses=sl[part],
+                        capitals=cap[part], target_prices=tp[part],
+                        intervals=n[part], weight_exponents=exp[part],
+                        strategies=names[part], **fields)
+
+
+def _pad_columns(arrays, fill):
+    """把列数不同的二维数组按最大列数右侧填充"""
+    width = max(a.shape[1] for a in arrays)
+    return [a if a.shape[1] == width
+            else np.pad(a, ((0, 0), (0, width - a.shape[1])), constant_values=fill)
+            for a in arrays]
+
+
+def compute_plans_batch(current_prices, stop_losses, capitals, target_prices=None,
+                        intervals=DEFAULT_INTERVALS,
+                        weight_exponents=DEFAULT_WEIGHT_EXPONENT,
+                        chunk_size=DEFAULT_CHUNK_SIZE, include_ladders=True, rules=None,
+                        strategies=None, atr=None):
+    """批量计算多个场景的加仓计划，所有参数可为标量或等长数组
+
+    rules 见 compute_ladder，strategies 和 atr 见 iter_plan_batches。
+
+    百万级场景扫描时建议 include_ladders=False，只保留风险指标列，
+    或直接使用 iter_plan_batches 流式处理。
+    """
+    chunks = list(iter_plan_batches(current_prices, stop_losses, capitals, target_prices,
+                                    intervals, weight_exponents, chunk_size, include_ladders, rules,
+                                    strategies, atr))
+    if not chunks:
+        return PlanBatch(**{name: np.empty(0) for name in PlanBatch.__slots__})
+
+    fields = {}
+    for name in PlanBatch.__slots__:
+        parts = [getattr(c, name) for c in chunks]
+        if parts[0] is None:
+            continue
+        if parts[0].ndim == 2:
+            fill = False if parts[0].dtype == bool else (0 if parts[0].dtype.kind == 'i' else np.nan)
+            parts = _pad_columns(parts, fill)
+        fields[name] = np.concatenate(parts)
+    return PlanBatch(**fields)
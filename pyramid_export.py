@@ -0,0 +1,543 @@
+"""导出和导入加仓计划、批量场景扫描结果和行情历史
+
+数据按块以列的形式写出(每块为 {列名: NumPy数组或列表})，导出百万行的扫描结果时
+内存中只保留当前一块。支持 CSV、JSON Lines、Parquet(需要 pyarrow)和 Excel(需要 openpyxl)，
+可选依赖只在使用对应格式时导入。
+
+导出的计划和扫描结果中带有计算参数，read_plan_inputs 只读取这些列，
+load_plans 交给引擎重新计算，得到与导出时相同的计划。
+"""
+import csv
+import itertools
+import json
+import operator
+import os
+import sys
+
+import numpy as np
+
+from pyramid_engine import (compute_plans_batch, default_target_price, LotRules,
+                            RISK_METRIC_FIELDS, DEFAULT_INTERVALS, DEFAULT_WEIGHT_EXPONENT)
+from pyramid_strategies import DEFAULT_STRATEGY, get_strategy
+
+OUTPUT_FORMATS = ('csv', 'jsonl', 'parquet', 'xlsx')
+
+# Excel每个工作表最多 1048576 行(含表头)，超出后写入下一个工作表
+EXCEL_MAX_ROWS = 1048576
+# 读取CSV/JSON Lines/Excel时每次转换的行数
+READ_CHUNK_SIZE = 100000
+# 导出行情历史时每次从历史库读取的记录数
+QUOTE_CHUNK_SIZE = 50000
+
+# 逐区间输出时每行的字段，对应 PyramidPlan 的数组和 PlanBatch 的二维数组
+LEVEL_FIELDS = (
+    ('buy_price', 'buy_prices'),
+    ('allocation_ratio', 'allocation_ratios'),
+    ('shares', 'shares'),
+    ('investment', 'investments'),
+    ('cumulative_investment', 'cumulative_investments'),
+    ('avg_cost', 'avg_costs'),
+    ('potential_return', 'potential_returns'),
+)
+
+# 计算参数，对应 PlanBatch 的列数组；导入时由这些列重新计算
+INPUT_FIELDS = (
+    ('current_price', 'current_prices'),
+    ('stop_loss', 'stop_losses'),
+    ('capital', 'capitals'),
+    ('target_price', 'target_prices'),
+    ('intervals', 'intervals'),
+    ('weight_exponent', 'weight_exponents'),
+    ('strategy', 'strategies'),
+)
+
+SUMMARY_FIELDS = INPUT_FIELDS + (('valid', 'valid'),) + tuple(
+    (name, name) for name in RISK_METRIC_FIELDS)
+
+# 下单规则(LotRules)的列，未使用下单规则时不输出
+RULE_FIELDS = ('lot_size', 'commission_rate', 'min_commission')
+
+# 导入计划时读取的列
+READ_COLUMNS = ('scenario', 'symbol', 'atr') + tuple(name for name, _ in INPUT_FIELDS) + RULE_FIELDS
+
+
+def guess_format(path, choices, default):
+    """根据文件扩展名判断格式"""
+    if not path or path == '-':
+        return default
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    ext = {'ndjson': 'jsonl', 'pq': 'parquet', 'xls': 'xlsx'}.get(ext, ext)
+    return ext if ext in choices else default
+
+
+def _clean_column(values):
+    """整列转换为Python列表，NaN/无穷大输出为空"""
+    if isinstance(values, (list, tuple)):
+        return list(values)
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        finite = np.isfinite(values)
+        if not finite.all():
+            return [v if ok else None for v, ok in zip(values.tolist(), finite.tolist())]
+    return values.tolist()
+
+
+def _column_size(columns):
+    return len(next(iter(columns.values()))) if columns else 0
+
+
+def _column_lists(columns, names):
+    """按 names 的顺序取出各列的Python列表，这一块中没有的列为空"""
+    size = _column_size(columns)
+    return [_clean_column(columns[name]) if name in columns else [None] * size for name in names]
+
+
+# ---- 输出 ----
+
+class _Output:
+    """按块写入 {列名: 数组} 的输出，第一块的列决定表头，之后缺少的列为空、多出的列忽略"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, columns):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CsvOutput(_Output):
+    def __init__(self, stream):
+        self.stream = stream
+        self.writer = csv.writer(stream)
+        self.fieldnames = None
+
+    def write(self, columns):
+        if not _column_size(columns):
+            return
+        if self.fieldnames is None:
+            self.fieldnames = list(columns)
+            self.writer.writerow(self.fieldnames)
+        # 整块按行写入，不逐行构造字典
+        self.writer.writerows(zip(*_column_lists(columns, self.fieldnames)))
+
+    def close(self):
+        if self.stream is sys.stdout:
+            self.stream.flush()
+        else:
+            self.stream.close()
+
+
+class JsonLinesOutput(_Output):
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, columns):
+        names = list(columns)
+        for values in zip(*_column_lists(columns, names)):
+            self.stream.write(json.dumps(dict(zip(names, values)), ensure_ascii=False))
+            self.stream.write('\n')
+
+    def close(self):
+        if self.stream is sys.stdout:
+            self.stream.flush()
+        else:
+            self.stream.close()
+
+
+class ParquetOutput(_Output):
+    """每块写入一个Parquet行组，NumPy数组直接转换为Arrow列，需要安装 pyarrow"""
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("输出Parquet需要安装 pyarrow: pip install pyarrow")
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.writer = None
+
+    def _array(self, values, type=None):
+        if isinstance(values, tuple):
+            values = list(values)
+        # from_pandas 把浮点列中的 NaN 写为空值，与CSV输出一致
+        return self.pa.array(values, type=type, from_pandas=True)
+
+    def write(self, columns):
+        size = _column_size(columns)
+        if not size:
+            return
+        if self.writer is None:
+            table = self.pa.table({name: self._array(values) for name, values in columns.items()})
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        else:
+            schema = self.writer.schema
+            arrays = [self._array(columns[field.name], field.type) if field.name in columns
+                      else self.pa.nulls(size, field.type) for field in schema]
+            table = self.pa.Table.from_arrays(arrays, schema=schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class ExcelOutput(_Output):
+    """以只写模式逐行写入xlsx，不在内存中保留整个工作簿，需要安装 openpyxl"""
+
+    def __init__(self, path, sheet_name='data'):
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise RuntimeError("输出Excel需要安装 openpyxl: pip install openpyxl")
+        self.path = path
+        self.sheet_name = sheet_name
+        self.workbook = Workbook(write_only=True)
+        self.sheet = None
+        self.sheet_rows = 0
+        self.fieldnames = None
+
+    def _new_sheet(self):
+        count = len(self.workbook.worksheets)
+        title = self.sheet_name if not count else f'{self.sheet_name}_{count + 1}'
+        self.sheet = self.workbook.create_sheet(title)
+        self.sheet.append(self.fieldnames)
+        self.sheet_rows = 1
+
+    def write(self, columns):
+        if not _column_size(columns):
+            return
+        if self.fieldnames is None:
+            self.fieldnames = list(columns)
+            self._new_sheet()
+        for row in zip(*_column_lists(columns, self.fieldnames)):
+            if self.sheet_rows >= EXCEL_MAX_ROWS:
+                self._new_sheet()
+            self.sheet.append(row)
+            self.sheet_rows += 1
+
+    def close(self):
+        if self.fieldnames is None:
+            # 没有数据时也输出只有一个空工作表的文件
+            self.workbook.create_sheet(self.sheet_name)
+        self.workbook.save(self.path)
+
+
+def open_output(path, fmt):
+    if fmt in ('parquet', 'xlsx'):
+        if not path or path == '-':
+            raise ValueError(f"{fmt}格式必须指定输出文件")
+        return ParquetOutput(path) if fmt == 'parquet' else ExcelOutput(path)
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {fmt}")
+    stream = sys.stdout if not path or path == '-' else open(path, 'w', encoding='utf-8', newline='')
+    return CsvOutput(stream) if fmt == 'csv' else JsonLinesOutput(stream)
+
+
+# ---- 列数据 ----
+
+def _rule_columns(rules, size):
+    if rules is None:
+        return {}
+    return {name: np.full(size, getattr(rules, name)) for name in RULE_FIELDS}
+
+
+def summary_columns(batch, offset=0, extra=None, rules=None):
+    """每个场景一行：场景编号、extra 中的附加列、输入参数和风险指标"""
+    columns = {'scenario': np.arange(offset, offset + len(batch))}
+    columns.update(extra or {})
+    for name, field in SUMMARY_FIELDS:
+        columns[name] = getattr(batch, field)
+    columns.update(_rule_columns(rules, len(batch)))
+    return columns
+
+
+def level_columns(batch, offset=0, extra=None, rules=None, include_inputs=False):
+    """每个场景的每个有效价格区间一行；extra 为按场景的附加列，
+    include_inputs 为 True 时每行带上场景的输入参数，导出的文件可以重新导入"""
+    rows, levels = np.nonzero(batch.mask)
+    columns = {'scenario': rows + offset}
+    for name, values in (extra or {}).items():
+        if isinstance(values, (list, tuple)):
+            columns[name] = [values[i] for i in rows.tolist()]
+        else:
+            columns[name] = np.asarray(values)[rows]
+    if include_inputs:
+        for name, field in INPUT_FIELDS:
+            columns[name] = getattr(batch, field)[rows]
+        columns.update(_rule_columns(rules, len(rows)))
+    columns['level'] = levels + 1
+    for name, field in LEVEL_FIELDS:
+        columns[name] = getattr(batch, field)[rows, levels]
+    return columns
+
+
+def plan_columns(plan, symbol=None, weight_exponent=DEFAULT_WEIGHT_EXPONENT, strategy=None,
+                 rules=None):
+    """单个计划的每个价格区间一行，带上计算参数"""
+    n = plan.intervals
+    columns = {
+        'scenario': np.zeros(n, dtype=np.int64),
+        'symbol': [symbol] * n,
+        'current_price': np.full(n, plan.current_price, dtype=np.float64),
+        'stop_loss': np.full(n, plan.stop_loss, dtype=np.float64),
+        'capital': np.full(n, plan.capital, dtype=np.float64),
+        'target_price': np.full(n, plan.target_price, dtype=np.float64),
+        'intervals': np.full(n, n),
+        'weight_exponent': np.full(n, weight_exponent, dtype=np.float64),
+        'strategy': [get_strategy(strategy).name] * n,
+    }
+    columns.update(_rule_columns(rules, n))
+    columns['level'] = np.arange(1, n + 1)
+    for name, field in LEVEL_FIELDS:
+        columns[name] = getattr(plan, field)
+    return columns
+
+
+# ---- 导出 ----
+
+def export_plan(path, plan, fmt=None, symbol=None, weight_exponent=DEFAULT_WEIGHT_EXPONENT,
+                strategy=None, rules=None):
+    """导出单个计划的加仓列表"""
+    fmt = fmt or guess_format(path, OUTPUT_FORMATS, 'csv')
+    with open_output(path, fmt) as output:
+        output.write(plan_columns(plan, symbol, weight_exponent, strategy, rules))
+
+
+def export_sweep(path, batches, fmt=None, include_levels=False, rules=None):
+    """逐块写出 iter_plan_batches 的结果，返回场景数量；rules 为计算时使用的下单规则"""
+    fmt = fmt or guess_format(path, OUTPUT_FORMATS, 'csv')
+    offset = 0
+    with open_output(path, fmt) as output:
+        for batch in batches:
+            if include_levels:
+                output.write(level_columns(batch, offset, rules=rules, include_inputs=True))
+            else:
+                output.write(summary_columns(batch, offset, rules=rules))
+            offset += len(batch)
+    return offset
+
+
+def export_quote_history(path, store, symbols=None, start=None, end=None, fmt=None,
+                         chunk_size=QUOTE_CHUNK_SIZE):
+    """导出历史库中的行情记录，返回记录数量；symbols 为 None 时导出全部股票"""
+    from quote_store import QUOTE_COLUMNS
+    fmt = fmt or guess_format(path, OUTPUT_FORMATS, 'csv')
+    # 先写入队列中尚未提交的行情
+    store.flush()
+    count = 0
+    with open_output(path, fmt) as output:
+        for rows in store.iter_quotes(symbols, start, end, chunk_size):
+            output.write(dict(zip(QUOTE_COLUMNS, zip(*rows))))
+            count += len(rows)
+    return count
+
+
+# ---- 导入 ----
+
+def _to_float(values):
+    """转换为浮点数组，空值和无法解析的值为 NaN"""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        pass
+    result = np.full(len(values), np.nan)
+    for i, value in enumerate(values):
+        try:
+            result[i] = float(value)
+        except (TypeError, ValueError):
+            pass
+    return result
+
+
+# 按文本读取的列，其余列转换为浮点数组
+TEXT_COLUMNS = ('symbol', 'strategy', 'name')
+
+
+def _convert_column(name, values):
+    return list(values) if name in TEXT_COLUMNS else _to_float(values)
+
+
+def _concat_columns(chunks, names):
+    """合并逐块转换好的列"""
+    columns = {}
+    for name in names:
+        parts = [chunk[name] for chunk in chunks]
+        if name in TEXT_COLUMNS:
+            columns[name] = [v for part in parts for v in part]
+        else:
+            columns[name] = np.concatenate(parts) if parts else np.empty(0)
+    return columns
+
+
+def _read_rows(header, rows, names):
+    """从逐行的记录中只取出需要的列，每次转换 READ_CHUNK_SIZE 行"""
+    header = [str(name).strip() if name is not None else '' for name in header]
+    present = [name for name in names if name in header]
+    if not present:
+        return {}
+    width = len(header)
+    indexes = [header.index(name) for name in present]
+    pick = operator.itemgetter(*indexes)
+    chunks = []
+    while True:
+        block = list(itertools.islice(rows, READ_CHUNK_SIZE))
+        if not block:
+            break
+        # 比表头短的行先补齐，按列号整行取出后转置为列
+        picked = [pick(row) if len(row) >= width else pick(list(row) + [None] * (width - len(row)))
+                  for row in block]
+        # 每块立即转换为数组，不保留大量字符串对象
+        chunks.append({name: _convert_column(name, values) for name, values
+                       in zip(present, zip(*picked) if len(indexes) > 1 else [picked])})
+    return _concat_columns(chunks, present)
+
+
+def _read_csv(path, names):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        header = [name.strip() for name in next(csv.reader(f), [])]
+    present = [name for name in names if name in header]
+    if not present:
+        return {}
+    options = {'delimiter': ',', 'quotechar': '"', 'skiprows': 1, 'encoding': 'utf-8-sig'}
+    try:
+        # 数值列没有空值时由NumPy的C解析器整列读取，比逐行解析快数倍
+        columns = {}
+        numeric = [name for name in present if name not in TEXT_COLUMNS]
+        if numeric:
+            values = np.loadtxt(path, usecols=[header.index(name) for name in numeric],
+                                ndmin=2, **options)
+            columns.update((name, np.ascontiguousarray(column))
+                           for name, column in zip(numeric, values.T))
+        for name in present:
+            if name in TEXT_COLUMNS:
+                columns[name] = np.loadtxt(path, usecols=header.index(name), dtype=str,
+                                           ndmin=1, **options).tolist()
+        return columns
+    except ValueError:
+        pass
+    # 有空值或行的列数不一致时逐行解析
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return _read_rows(header, filter(None, reader), names)
+
+
+def read_columns(path, names, fmt=None):
+    """只读取需要的列，返回 {列名: 数组或列表}；文件中没有的列不返回"""
+    fmt = fmt or guess_format(path, OUTPUT_FORMATS + ('json',), 'csv')
+    if fmt == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("读取Parquet需要安装 pyarrow: pip install pyarrow")
+        schema_names = pq.read_schema(path).names
+        table = pq.read_table(path, columns=[name for name in names if name in schema_names])
+        columns = {}
+        for name in table.column_names:
+            values = table.column(name).to_numpy(zero_copy_only=False)
+            columns[name] = _convert_column(name, values.tolist() if values.dtype == object else values)
+        return columns
+    if fmt == 'xlsx':
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise RuntimeError("读取Excel需要安装 openpyxl: pip install openpyxl")
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            # 超过一个工作表行数上限的导出分布在多个表头相同的工作表中
+            sheets = [sheet.iter_rows(values_only=True) for sheet in workbook.worksheets]
+            header = next(sheets[0], None) or ()
+            rows = itertools.chain(sheets[0], *(itertools.islice(s, 1, None) for s in sheets[1:]))
+            return _read_rows(header, rows, names)
+        finally:
+            workbook.close()
+    if fmt == 'csv':
+        return _read_csv(path, names)
+    if fmt in ('jsonl', 'json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            if fmt == 'json':
+                data = json.load(f)
+                records = iter(data if isinstance(data, list) else [data])
+            else:
+                records = (json.loads(line) for line in f if line.strip())
+            first = next(records, None)
+            if first is None:
+                return {}
+            # 以第一条记录中出现的字段为准
+            header = [name for name in names if name in first]
+            rows = ([record.get(name) for name in header]
+                    for record in itertools.chain([first], records))
+            return _read_rows(header, rows, header)
+    raise ValueError(f"不支持的输入格式: {fmt}")
+
+
+def _read_rules(columns):
+    if 'lot_size' not in columns:
+        return None
+    keys = np.column_stack([columns.get(name, np.full(len(columns['lot_size']), np.nan))
+                            for name in RULE_FIELDS])
+    keys = np.nan_to_num(keys[~np.isnan(keys[:, 0])])
+    if not len(keys):
+        return None
+    if not (keys == keys[0]).all():
+        raise ValueError("文件中的计划使用了不同的下单规则，请分别导入")
+    lot_size, commission_rate, min_commission = keys[0]
+    return LotRules(int(lot_size), commission_rate, min_commission)
+
+
+def read_plan_inputs(path, fmt=None):
+    """读取导出的计划或扫描结果中的计算参数
+
+    返回 compute_plans_batch 的参数字典，另有 symbols(没有代码列时为 None)。
+    逐区间导出的文件每个场景有多行，按 scenario 列只取第一行。
+    """
+    columns = read_columns(path, READ_COLUMNS, fmt)
+    for name in ('current_price', 'stop_loss', 'capital'):
+        if name not in columns:
+            raise ValueError(f"{path} 缺少计划参数列: {name}")
+
+    scenarios = columns.get('scenario')
+    # 每个场景一行的文件 scenario 严格递增，不需要去重
+    if scenarios is not None and not (np.diff(scenarios) > 0).all():
+        _, first = np.unique(scenarios, return_index=True)
+        first.sort()
+        if len(first) < len(scenarios):
+            columns = {name: ([values[i] for i in first.tolist()] if isinstance(values, list)
+                              else values[first]) for name, values in columns.items()}
+
+    current_prices = columns['current_price']
+    size = len(current_prices)
+    target_prices = columns.get('target_price', np.full(size, np.nan))
+    missing = np.isnan(target_prices)
+    if missing.any():
+        target_prices[missing] = default_target_price(current_prices[missing])
+    intervals = columns.get('intervals', np.full(size, np.nan))
+    weight_exponents = columns.get('weight_exponent', np.full(size, np.nan))
+    strategies = columns.get('strategy', [None] * size)
+    return {
+        'current_prices': current_prices,
+        'stop_losses': columns['stop_loss'],
+        'capitals': columns['capital'],
+        'target_prices': target_prices,
+        'intervals': np.where(np.isnan(intervals), DEFAULT_INTERVALS, intervals).astype(np.int64),
+        'weight_exponents': np.where(np.isnan(weight_exponents), DEFAULT_WEIGHT_EXPONENT,
+                                     weight_exponents),
+        'strategies': [s or DEFAULT_STRATEGY for s in strategies],
+        'atr': columns.get('atr'),
+        'rules': _read_rules(columns),
+        'symbols': columns.get('symbol'),
+    }
+
+
+def load_plans(path, fmt=None, include_ladders=True):
+    """导入计划文件并由引擎重新计算，返回 PlanBatch"""
+    inputs = read_plan_inputs(path, fmt)
+    inputs.pop('symbols')
+    return compute_plans_batch(include_ladders=include_ladders, **inputs)
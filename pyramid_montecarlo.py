@@ -0,0 +1,260 @@
+"""金字塔加仓计划的蒙特卡洛风险模拟
+
+risk_metrics 中的指标基于直线下跌到止损价的单一情形。这里生成大量价格路径
+(几何布朗运动或历史收益率自助抽样)，在每条路径上执行计划的加仓价位、止损和目标价，
+统计先到目标价的概率、期望投入资金以及最终盈亏的 VaR/CVaR。
+
+路径按块生成和计算，内存占用只与块大小有关；相同的 seed 和块大小得到相同结果。
+按整手生成的计划(compute_plan 指定 rules)投入资金中已含买入佣金，模拟结果与界面显示的计划一致。
+
+用法:
+    python pyramid_montecarlo.py --current-price 10 --stop-loss 8 --capital 100000 --lot-size 100
+    python pyramid_montecarlo.py --current-price 10 --stop-loss 8 --capital 100000 --returns-from bars.csv
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from pyramid_engine import (compute_plan, DEFAULT_INTERVALS, DEFAULT_WEIGHT_EXPONENT, LotRules,
+                            A_SHARE_COMMISSION_RATE, A_SHARE_MIN_COMMISSION)
+from pyramid_strategies import strategy_names
+
+MODELS = ('gbm', 'bootstrap')
+
+DEFAULT_PATHS = 100000
+DEFAULT_HORIZON = 250  # 模拟的步数，默认约一年的交易日
+DEFAULT_STEPS_PER_YEAR = 252
+DEFAULT_VOLATILITY = 0.3
+DEFAULT_CONFIDENCE_LEVELS = (0.95, 0.99)
+# 每块路径矩阵的元素上限，约 32MB
+DEFAULT_CHUNK_ELEMENTS = 4000000
+
+# 单条路径的结果
+OUTCOME_TARGET = 0  # 先到目标价
+OUTCOME_STOP = 1  # 先跌破止损价
+OUTCOME_OPEN = 2  # 模拟结束时仍持仓
+OUTCOME_NO_FILL = 3  # 没有任何价位成交
+
+
+def log_returns_from_prices(prices):
+    """由收盘价序列计算对数收益率，供自助抽样使用"""
+    prices = np.asarray(prices, dtype=np.float64)
+    prices = prices[np.isfinite(prices) & (prices > 0)]
+    if len(prices) < 2:
+        raise ValueError("至少需要两个有效价格才能计算收益率")
+    return np.diff(np.log(prices))
+
+
+def _gbm_log_returns(rng, count, horizon, drift, volatility, dt):
+    shocks = rng.standard_normal((count, horizon))
+    shocks *= volatility * np.sqrt(dt)
+    shocks += (drift - 0.5 * volatility ** 2) * dt
+    return shocks
+
+
+def _bootstrap_log_returns(rng, count, horizon, returns):
+    return returns[rng.integers(0, len(returns), size=(count, horizon))]
+
+
+def _first_true(mask, default):
+    """每行第一个 True 的列号，整行没有 True 时为 default"""
+    first = np.argmax(mask, axis=1)
+    return np.where(mask[np.arange(len(mask)), first], first, default)
+
+
+def evaluate_paths(plan, prices):
+    """在一块价格路径上执行计划，返回 (结果类型, 投入资金, 盈亏)
+
+    prices 形状为 (路径数, 步数)，不含起点(当前价格)。价格首次 <= 加仓价位时该价位按计划价格成交；
+    价格首次 < 止损价时以该步价格全部卖出；首次成交后价格 >= 目标价时以目标价卖出。
+    """
+    count, horizon = prices.shape
+    rows = np.arange(count)
+    running_low = np.minimum.accumulate(prices, axis=1)
+
+    stop_step = _first_true(running_low < plan.stop_loss, horizon)
+    first_fill = _first_true(running_low <= plan.buy_prices[0], horizon)
+    after_fill = np.arange(horizon) >= first_fill[:, None]
+    target_step = _first_true((prices >= plan.target_price) & after_fill, horizon)
+
+    exit_step = np.minimum(stop_step, target_step)
+    last_step = np.minimum(exit_step, horizon - 1)
+    # 离场前的最低价决定成交到第几个价位，价位从高到低排列
+    lowest = running_low[rows, last_step]
+    filled = np.searchsorted(-plan.buy_prices, -lowest, side='right')
+
+    has_fill = filled > 0
+    index = np.maximum(filled - 1, 0)
+    deployed = np.where(has_fill, plan.cumulative_investments[index], 0.0)
+    shares = np.where(has_fill, plan.cumulative_shares[index], 0)
+
+    outcome = np.full(count, OUTCOME_OPEN, dtype=np.int8)
+    outcome[target_step < stop_step] = OUTCOME_TARGET
+    outcome[stop_step <= target_step] = OUTCOME_STOP
+    outcome[(stop_step == horizon) & (target_step == horizon)] = OUTCOME_OPEN
+    outcome[~has_fill] = OUTCOME_NO_FILL
+
+    exit_price = prices[rows, last_step].copy()
+    exit_price[outcome == OUTCOME_TARGET] = plan.target_price
+    pnl = shares * exit_price - deployed
+    return outcome, deployed, pnl
+
+
+def iter_price_chunks(current_price, paths=DEFAULT_PATHS, horizon=DEFAULT_HORIZON, model='gbm',
+                      drift=0.0, volatility=DEFAULT_VOLATILITY, returns=None,
+                      steps_per_year=DEFAULT_STEPS_PER_YEAR, seed=None, chunk_size=None):
+    """逐块产出价格路径矩阵 (路径数, 步数)
+
+    model 为 'gbm' 时 drift/volatility 为年化漂移率和波动率；
+    为 'bootstrap' 时从 returns(单步对数收益率)中有放回抽样。
+    """
+    if model not in MODELS:
+        raise ValueError(f"不支持的模拟模型: {model}")
+    if paths < 1 or horizon < 1:
+        raise ValueError("路径数和步数必须大于0")
+    if model == 'bootstrap':
+        if returns is None or len(returns) == 0:
+            raise ValueError("自助抽样需要提供历史收益率")
+        returns = np.asarray(returns, dtype=np.float64)
+    chunk_size = chunk_size or max(1, DEFAULT_CHUNK_ELEMENTS // horizon)
+
+    dt = 1.0 / steps_per_year
+    chunk_count = -(-paths // chunk_size)
+    # 每块使用独立的随机数流，结果只取决于 seed 和块大小
+    streams = np.random.SeedSequence(seed).spawn(chunk_count)
+    for i, stream in enumerate(streams):
+        rng = np.random.default_rng(stream)
+        count = min(chunk_size, paths - i * chunk_size)
+        if model == 'gbm':
+            log_returns = _gbm_log_returns(rng, count, horizon, drift, volatility, dt)
+        else:
+            log_returns = _bootstrap_log_returns(rng, count, horizon, returns)
+        np.cumsum(log_returns, axis=1, out=log_returns)
+        np.exp(log_returns, out=log_returns)
+        log_returns *= current_price
+        yield log_returns
+
+
+def value_at_risk(pnl, confidence):
+    """返回 (VaR, CVaR)，均以正数表示损失金额"""
+    threshold = np.quantile(pnl, 1 - confidence)
+    tail = pnl[pnl <= threshold]
+    return float(-threshold), float(-tail.mean()) if len(tail) else float(-threshold)
+
+
+def simulate_plan(plan, paths=DEFAULT_PATHS, horizon=DEFAULT_HORIZON, model='gbm',
+                  drift=0.0, volatility=DEFAULT_VOLATILITY, returns=None,
+                  steps_per_year=DEFAULT_STEPS_PER_YEAR, seed=None, chunk_size=None,
+                  confidence_levels=DEFAULT_CONFIDENCE_LEVELS):
+    """对 PyramidPlan 做蒙特卡洛模拟，返回统计结果字典"""
+    outcomes = []
+    deployed = []
+    pnl = []
+    for prices in iter_price_chunks(plan.current_price, paths, horizon, model, drift, volatility,
+                                    returns, steps_per_year, seed, chunk_size):
+        chunk_outcome, chunk_deployed, chunk_pnl = evaluate_paths(plan, prices)
+        outcomes.append(chunk_outcome)
+        deployed.append(chunk_deployed)
+        pnl.append(chunk_pnl)
+    outcome = np.concatenate(outcomes)
+    deployed = np.concatenate(deployed)
+    pnl = np.concatenate(pnl)
+
+    counts = np.bincount(outcome, minlength=4) / len(outcome)
+    result = {
+        'paths': int(len(outcome)),
+        'horizon': horizon,
+        'model': model,
+        'seed': seed,
+        'prob_target_before_stop': float(counts[OUTCOME_TARGET]),
+        'prob_stop': float(counts[OUTCOME_STOP]),
+        'prob_open': float(counts[OUTCOME_OPEN]),
+        'prob_no_fill': float(counts[OUTCOME_NO_FILL]),
+        'expected_capital_used': float(deployed.mean()),
+        'max_capital_used': float(deployed.max()),
+        'expected_pnl': float(pnl.mean()),
+        'pnl_std': float(pnl.std()),
+        'pnl_percentiles': {p: float(v) for p, v in zip((5, 25, 50, 75, 95),
+                                                        np.percentile(pnl, (5, 25, 50, 75, 95)))},
+    }
+    for confidence in confidence_levels:
+        var, cvar = value_at_risk(pnl, confidence)
+        label = f"{confidence * 100:g}"
+        result[f'var_{label}'] = var
+        result[f'cvar_{label}'] = cvar
+    return result
+
+
+def format_simulation_text(result):
+    """模拟结果的摘要文本，格式与风险评估指标一致"""
+    text = f"蒙特卡洛模拟({result['paths']}条路径, {result['horizon']}步):\n"
+    text += f"先到目标价概率: {result['prob_target_before_stop'] * 100:.2f}%\n"
+    text += f"触发止损概率: {result['prob_stop'] * 100:.2f}%\n"
+    text += f"期望投入资金: {result['expected_capital_used']:.2f}元\n"
+    text += f"期望盈亏: {result['expected_pnl']:.2f}元"
+    for key in sorted(k for k in result if k.startswith('var_')):
+        label = key[len('var_'):]
+        text += f"\nVaR({label}%): {result[key]:.2f}元  CVaR: {result['cvar_' + label]:.2f}元"
+    return text
+
+
+def simulate_inputs(current_price, stop_loss, capital, target_price=None,
+                    intervals=DEFAULT_INTERVALS, weight_exponent=DEFAULT_WEIGHT_EXPONENT,
+                    rules=None, strategy=None, **kwargs):
+    """按参数生成计划(rules 见 compute_plan)后模拟，其余参数见 simulate_plan"""
+    plan = compute_plan(current_price, stop_loss, capital, target_price, intervals,
+                        weight_exponent, rules=rules, strategy=strategy)
+    return simulate_plan(plan, **kwargs)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="金字塔加仓计划蒙特卡洛风险模拟")
+    parser.add_argument('--current-price', type=float, required=True, help="当前价格")
+    parser.add_argument('--stop-loss', type=float, required=True, help="止损价格")
+    parser.add_argument('--capital', type=float, required=True, help="本金")
+    parser.add_argument('--target-price', type=float, help="目标价格，默认按当前价格的默认比例")
+    parser.add_argument('--intervals', type=int, default=DEFAULT_INTERVALS)
+    parser.add_argument('--weight-exponent', type=float, default=DEFAULT_WEIGHT_EXPONENT)
+    parser.add_argument('--strategy', choices=strategy_names(), help="加仓策略，默认幂次加权")
+    parser.add_argument('--lot-size', type=int,
+                        help="按整手下单的每手股数(A股为100)，默认按1股取整且不计佣金")
+    parser.add_argument('--commission-rate', type=float, default=A_SHARE_COMMISSION_RATE,
+                        help="佣金费率，只在指定 --lot-size 时生效")
+    parser.add_argument('--min-commission', type=float, default=A_SHARE_MIN_COMMISSION,
+                        help="每笔最低佣金(元)，只在指定 --lot-size 时生效")
+    parser.add_argument('--paths', type=int, default=DEFAULT_PATHS)
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON, help="模拟的步数")
+    parser.add_argument('--volatility', type=float, default=DEFAULT_VOLATILITY, help="年化波动率")
+    parser.add_argument('--drift', type=float, default=0.0, help="年化漂移率")
+    parser.add_argument('--returns-from',
+                        help="K线文件(CSV/Parquet/.npy)，从其收盘价的收益率自助抽样，代替几何布朗运动")
+    parser.add_argument('--seed', type=int)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        rules = None
+        if args.lot_size is not None:
+            rules = LotRules(args.lot_size, args.commission_rate, args.min_commission)
+        model, returns = 'gbm', None
+        if args.returns_from:
+            from pyramid_backtest import load_bars
+            model = 'bootstrap'
+            returns = log_returns_from_prices(load_bars(args.returns_from)['close'])
+        result = simulate_inputs(args.current_price, args.stop_loss, args.capital,
+                                 args.target_price, args.intervals, args.weight_exponent,
+                                 rules=rules, strategy=args.strategy, paths=args.paths,
+                                 horizon=args.horizon, model=model, drift=args.drift,
+                                 volatility=args.volatility, returns=returns, seed=args.seed)
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+    print(format_simulation_text(result))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""金字塔加仓参数优化器
+
+在 区间数量 × 权重指数 × 止损距离 的参数网格上搜索，
+以风险收益比或最大预期收益率为目标，返回不超过本金和止损亏损上限的帕累托前沿。
+候选参数分块后交给进程池并行计算，支持提前停止和断点续跑。
+
+用法:
+    python pyramid_optimizer.py --current-price 10 --capital 100000 --max-loss 15000
+    python pyramid_optimizer.py --current-price 10 --capital 100000 --lot-size 100 -o frontier.csv
+"""
+import argparse
+import json
+import os
+import hashlib
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from pyramid_engine import (compute_plans_batch, default_target_price, LotRules,
+                            A_SHARE_COMMISSION_RATE, A_SHARE_MIN_COMMISSION)
+from pyramid_export import OUTPUT_FORMATS, guess_format, open_output
+
+OBJECTIVES = ('risk_reward_ratio', 'max_return')
+
+# 每个进程任务包含的候选参数数量
+DEFAULT_CANDIDATES_PER_TASK = 5000
+
+
+def build_search_space(intervals, weight_exponents, stop_loss_pcts):
+    """生成参数网格，返回 (intervals, weight_exponents, stop_loss_pcts) 三个等长数组
+
+    stop_loss_pcts 为止损价相对当前价格的跌幅百分比，例如 20 表示止损价为当前价的80%。
+    """
+    n, e, d = np.meshgrid(np.asarray(intervals, dtype=np.int64),
+                          np.asarray(weight_exponents, dtype=np.float64),
+                          np.asarray(stop_loss_pcts, dtype=np.float64),
+                          indexing='ij')
+    return n.ravel(), e.ravel(), d.ravel()
+
+
+def pareto_frontier(first, second):
+    """两个目标都取最大值时的帕累托前沿，返回前沿点的下标(按 first 降序)"""
+    first = np.asarray(first, dtype=np.float64)
+    second = np.asarray(second, dtype=np.float64)
+    if len(first) == 0:
+        return np.empty(0, dtype=np.int64)
+    # 按 first 降序、second 降序排列，second 严格超过之前所有点的才是非支配点
+    order = np.lexsort((-second, -first))
+    sorted_second = second[order]
+    running_max = np.maximum.accumulate(sorted_second)
+    keep = np.empty(len(order), dtype=bool)
+    keep[0] = True
+    keep[1:] = sorted_second[1:] > running_max[:-1]
+    return order[keep]
+
+
+def stop_loss_amounts(max_investment, breakeven_price, stop_loss):
+    """全部价位成交后在止损价卖出的亏损金额(含买入佣金)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return max_investment * (1 - stop_loss / breakeven_price)
+
+
+def _evaluate_task(task):
+    """进程池任务：批量计算一块候选参数的风险指标，去掉超出本金或亏损上限的候选"""
+    (current_price, capital, target_price, intervals, exponents, stop_pcts, rules,
+     max_loss) = task
+    stop_losses = current_price * (1 - stop_pcts / 100)
+    batch = compute_plans_batch(current_price, stop_losses, capital, target_price,
+                                intervals, exponents, include_ladders=False, rules=rules)
+    loss = stop_loss_amounts(batch.max_investment, batch.breakeven_price, stop_losses)
+    # 按1股取整时个别计划会略超本金
+    feasible = batch.valid & (batch.max_investment <= capital)
+    if max_loss is not None:
+        feasible &= loss <= max_loss
+    return {
+        'intervals': intervals[feasible],
+        'weight_exponent': exponents[feasible],
+        'stop_loss_pct': stop_pcts[feasible],
+        'stop_loss': stop_losses[feasible],
+        'max_investment': batch.max_investment[feasible],
+        'stop_loss_amount': loss[feasible],
+        'risk_reward_ratio': batch.risk_reward_ratio[feasible],
+        'max_return': batch.max_return[feasible],
+    }
+
+
+_RECORD_FIELDS = ('intervals', 'weight_exponent', 'stop_loss_pct', 'stop_loss',
+                  'max_investment', 'stop_loss_amount', 'risk_reward_ratio', 'max_return')
+
+
+def _merge_frontier(frontier, evaluated):
+    """把新评估的候选并入当前前沿，只保留非支配点"""
+    merged = {name: np.concatenate([frontier[name], evaluated[name]]) for name in _RECORD_FIELDS}
+    keep = pareto_frontier(merged['risk_reward_ratio'], merged['max_return'])
+    return {name: merged[name][keep] for name in _RECORD_FIELDS}
+
+
+def _empty_frontier():
+    frontier = {name: np.empty(0) for name in _RECORD_FIELDS}
+    frontier['intervals'] = np.empty(0, dtype=np.int64)
+    return frontier
+
+
+class ParameterOptimizer:
+    """在进程池中并行搜索最优的区间数量、权重指数和止损距离"""
+
+    def __init__(self, current_price, capital, target_price,
+                 intervals=range(5, 41, 5),
+                 weight_exponents=(0.5, 1, 1.5, 2, 2.5, 3),
+                 stop_loss_pcts=range(5, 51, 5),
+                 objective='risk_reward_ratio',
+                 max_workers=None,
+                 candidates_per_task=DEFAULT_CANDIDATES_PER_TASK,
+                 patience=None,
+                 checkpoint_path=None,
+                 rules=None,
+                 max_loss=None):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"不支持的优化目标: {objective}")
+        self.current_price = float(current_price)
+        self.capital = float(capital)
+        self.target_price = float(target_price)
+        self.space = build_search_space(intervals, weight_exponents, stop_loss_pcts)
+        self.objective = objective
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.candidates_per_task = candidates_per_task
+        # 连续多少个任务目标值没有提升就提前停止，None 表示搜索完整个网格
+        self.patience = patience
+        self.checkpoint_path = checkpoint_path
+        # 下单规则(pyramid_engine.LotRules)，None 表示按1股取整
+        self.rules = rules
+        # 全部价位成交后触及止损的亏损上限(元)，None 表示不限制
+        self.max_loss = None if max_loss is None else float(max_loss)
+
+    @property
+    def task_count(self):
+        return -(-len(self.space[0]) // self.candidates_per_task)
+
+    def _fingerprint(self):
+        """参数网格和输入的指纹，防止用不匹配的检查点续跑"""
+        digest = hashlib.sha1()
+        digest.update(json.dumps([self.current_price, self.capital, self.target_price,
+                                  self.objective, self.candidates_per_task,
+                                  repr(self.rules), self.max_loss]).encode())
+        for array in self.space:
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def _task(self, index):
+        part = slice(index * self.candidates_per_task, (index + 1) * self.candidates_per_task)
+        intervals, exponents, stop_pcts = self.space
+        return (self.current_price, self.capital, self.target_price,
+                intervals[part], exponents[part], stop_pcts[part], self.rules,
+                self.max_loss)
+
+    def _load_checkpoint(self):
+        """读取检查点，返回 (下一个任务下标, 前沿, 最优目标值, 未提升计数)"""
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return 0, _empty_frontier(), -np.inf, 0
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('fingerprint') != self._fingerprint():
+            raise ValueError("检查点文件与当前搜索参数不匹配")
+        frontier = _empty_frontier()
+        for name in _RECORD_FIELDS:
+            frontier[name] = np.asarray(state['frontier'][name], dtype=frontier[name].dtype)
+        return state['next_task'], frontier, state['best'], state['stale']
+
+    def _save_checkpoint(self, next_task, frontier, best, stale):
+        """原子写入检查点，避免中断时留下半个文件"""
+        if not self.checkpoint_path:
+            return
+        state = {
+            'fingerprint': self._fingerprint(),
+            'next_task': next_task,
+            'best': best,
+            'stale': stale,
+            'frontier': {name: frontier[name].tolist() for name in _RECORD_FIELDS}
+        }
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def run(self):
+        """执行搜索，返回按目标值降序排列的帕累托前沿(字典列表)"""
+        next_task, frontier, best, stale = self._load_checkpoint()
+        total = self.task_count
+        stopped = self.patience is not None and stale >= self.patience
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            # 每轮提交与进程数相同的任务，按提交顺序汇总，保证检查点可复现
+            while next_task < total and not stopped:
+                wave = range(next_task, min(next_task + self.max_workers, total))
+                futures = [pool.submit(_evaluate_task, self._task(i)) for i in wave]
+                for future in futures:
+                    evaluated = future.result()
+                    frontier = _merge_frontier(frontier, evaluated)
+                    task_best = evaluated[self.objective].max() if len(evaluated[self.objective]) else -np.inf
+                    if task_best > best:
+                        best = float(task_best)
+                        stale = 0
+                    else:
+                        stale += 1
+                    next_task += 1
+                    if self.patience is not None and stale >= self.patience:
+                        stopped = True
+                        break
+                self._save_checkpoint(next_task, frontier, best, stale)
+
+        order = np.argsort(-frontier[self.objective], kind='stable')
+        return [{name: frontier[name][i].item() for name in _RECORD_FIELDS} for i in order]
+
+
+def optimize_parameters(current_price, capital, target_price, **kwargs):
+    """便捷函数：构造 ParameterOptimizer 并返回帕累托前沿"""
+    return ParameterOptimizer(current_price, capital, target_price, **kwargs).run()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="搜索金字塔加仓参数的帕累托前沿")
+    parser.add_argument('--current-price', type=float, required=True, help="当前价格")
+    parser.add_argument('--capital', type=float, required=True, help="本金")
+    parser.add_argument('--target-price', type=float, help="目标价格，默认按当前价格的默认比例")
+    parser.add_argument('--intervals', type=int, nargs='+', default=list(range(5, 41, 5)),
+                        help="候选区间数量")
+    parser.add_argument('--weight-exponents', type=float, nargs='+',
+                        default=[0.5, 1, 1.5, 2, 2.5, 3], help="候选权重指数")
+    parser.add_argument('--stop-loss-pcts', type=float, nargs='+', default=list(range(5, 51, 5)),
+                        help="候选止损距离(相对当前价格的跌幅百分比)")
+    parser.add_argument('--objective', choices=OBJECTIVES, default='risk_reward_ratio')
+    parser.add_argument('--max-loss', type=float, help="全部成交后触及止损的亏损上限(元)")
+    parser.add_argument('--workers', type=int, default=None, help="进程数，默认CPU核数")
+    parser.add_argument('--patience', type=int,
+                        help="连续多少个任务没有提升就提前停止，默认搜索完整个网格")
+    parser.add_argument('--checkpoint', help="检查点文件，中断后用同样的参数再次运行即可续跑")
+    parser.add_argument('--lot-size', type=int,
+                        help="按整手下单的每手股数(A股为100)，默认按1股取整且不计佣金")
+    parser.add_argument('--commission-rate', type=float, default=A_SHARE_COMMISSION_RATE,
+                        help="佣金费率，只在指定 --lot-size 时生效")
+    parser.add_argument('--min-commission', type=float, default=A_SHARE_MIN_COMMISSION,
+                        help="每笔最低佣金(元)，只在指定 --lot-size 时生效")
+    parser.add_argument('-o', '--output', default='-', help="输出文件(CSV/JSONL/Parquet)，默认标准输出")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    target_price = args.target_price
+    if target_price is None:
+        target_price = float(default_target_price(args.current_price))
+    try:
+        rules = None
+        if args.lot_size is not None:
+            rules = LotRules(args.lot_size, args.commission_rate, args.min_commission)
+        frontier = optimize_parameters(
+            args.current_price, args.capital, target_price,
+            intervals=args.intervals, weight_exponents=args.weight_exponents,
+            stop_loss_pcts=args.stop_loss_pcts, objective=args.objective,
+            max_workers=args.workers, patience=args.patience,
+            checkpoint_path=args.checkpoint, rules=rules,
+            max_loss=args.max_loss)
+        with open_output(args.output, guess_format(args.output, OUTPUT_FORMATS, 'csv')) as output:
+            output.write({name: [record[name] for record in frontier] for name in _RECORD_FIELDS})
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+
+    print(f"帕累托前沿共 {len(frontier)} 组参数", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
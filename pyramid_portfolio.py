@@ -0,0 +1,337 @@
+"""多股票组合加仓计划
+
+用一笔总资金同时为几十到几百只股票生成加仓阶梯：先按权重把总资金分配到各只股票，
+受单只股票和单个行业的上限约束，超出上限的部分再分给其他未达上限的股票；
+然后对全部股票一次批量计算加仓计划，汇总全部价位成交时的最大资金占用，
+以及全部股票同时跌到止损价时的最坏亏损和回撤。所有计算按股票向量化，不逐只循环。
+
+示例:
+    python pyramid_portfolio.py positions.csv --budget 1000000 --max-name-pct 5 --max-sector-pct 25
+"""
+import argparse
+import csv
+import math
+import sys
+
+import numpy as np
+
+from pyramid_engine import (compute_plans_batch, default_target_price, RISK_METRIC_FIELDS,
+                            DEFAULT_INTERVALS, DEFAULT_WEIGHT_EXPONENT,
+                            LotRules, A_SHARE_COMMISSION_RATE, A_SHARE_MIN_COMMISSION)
+from pyramid_strategies import DEFAULT_STRATEGY, strategy_names
+
+# 单只股票默认最多占用总资金的百分比
+DEFAULT_MAX_NAME_PCT = 10.0
+DEFAULT_SECTOR = '未分类'
+
+# 持仓文件的列：symbol、current_price 必填，止损价可用 stop_loss 或 stop_loss_pct(跌幅百分比)给出
+POSITION_COLUMNS = ('symbol', 'sector', 'current_price', 'stop_loss', 'stop_loss_pct',
+                    'target_price', 'weight', 'strategy', 'atr')
+
+PORTFOLIO_ROW_FIELDS = ('symbol', 'sector', 'current_price', 'stop_loss', 'target_price',
+                        'allocation', 'intervals', 'total_shares', 'worst_case_loss',
+                        'loss_pct_of_budget', 'valid') + RISK_METRIC_FIELDS
+
+
+def allocate_budget(budget, weights, sector_codes, name_cap, sector_caps):
+    """按权重分配总资金，返回每只股票的本金
+
+    name_cap 为单只股票的上限(标量或数组)，sector_caps 为按行业编号排列的上限数组(无上限为inf)。
+    每轮把剩余资金按权重分给未达上限的股票，超出单只上限的截断，超出行业上限的行业整体按比例缩减，
+    达到上限的股票和行业不再参与下一轮。每轮至少有一只股票或一个行业达到上限，轮数不超过二者数量之和。
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    sector_caps = np.asarray(sector_caps, dtype=np.float64)
+    allocations = np.zeros(len(weights))
+    active = weights > 0
+    for _ in range(len(weights) + len(sector_caps) + 1):
+        remaining = budget - allocations.sum()
+        share = np.where(active, weights, 0.0)
+        total = share.sum()
+        if remaining <= budget * 1e-12 or total <= 0:
+            break
+        allocations += remaining * share / total
+
+        at_name_cap = allocations >= name_cap
+        allocations = np.minimum(allocations, name_cap)
+
+        used = np.bincount(sector_codes, allocations, minlength=len(sector_caps))
+        over = used > sector_caps
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.where(over, sector_caps / used, 1.0)
+        allocations *= scale[sector_codes]
+
+        active &= ~(at_name_cap | (used >= sector_caps)[sector_codes])
+    return allocations
+
+
+class PortfolioPlan:
+    """组合计划：每只股票的分配本金和加仓计划(PlanBatch)，以及组合层面的汇总"""
+
+    __slots__ = ('budget', 'symbols', 'sectors', 'sector_names', 'sector_codes',
+                 'allocations', 'batch', 'total_shares', 'worst_case_losses', '_index')
+
+    def __init__(self, budget, symbols, sector_names, sector_codes, allocations, batch):
+        self.budget = float(budget)
+        self.symbols = symbols
+        self.sector_names = sector_names
+        self.sector_codes = sector_codes
+        self.sectors = sector_names[sector_codes] if len(sector_codes) else np.empty(0, dtype=object)
+        self.allocations = allocations
+        self.batch = batch
+        valid = batch.valid
+        self.total_shares = np.where(valid, batch.shares.sum(axis=1), 0) if len(batch) else np.zeros(0)
+        # 全部价位成交后跌到止损价离场的亏损
+        self.worst_case_losses = np.where(
+            valid, np.nan_to_num(batch.max_investment) - batch.stop_losses * self.total_shares, 0.0)
+        self._index = {symbol: i for i, symbol in enumerate(symbols)}
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def index(self, symbol):
+        return self._index[symbol]
+
+    def plan(self, symbol):
+        """某只股票的 PyramidPlan"""
+        return self.batch.plan(self.index(symbol))
+
+    def summary(self):
+        """组合汇总：总资金、已分配本金、最大资金占用、最坏亏损和回撤"""
+        valid = self.batch.valid
+        worst_case_capital = float(np.nansum(np.where(valid, self.batch.max_investment, 0.0)))
+        worst_case_loss = float(self.worst_case_losses.sum())
+        potential_gain = float(np.sum(np.where(
+            valid, (self.batch.target_prices - np.nan_to_num(self.batch.breakeven_price)) * self.total_shares,
+            0.0)))
+        return {
+            'budget': self.budget,
+            'names': len(self),
+            'valid_names': int(valid.sum()),
+            'allocated': float(self.allocations.sum()),
+            'worst_case_capital': worst_case_capital,
+            'unused_capital': self.budget - worst_case_capital,
+            'worst_case_loss': worst_case_loss,
+            'worst_case_drawdown_pct': worst_case_loss / self.budget * 100 if self.budget > 0 else 0.0,
+            'potential_gain': potential_gain,
+            'risk_reward_ratio': potential_gain / worst_case_loss if worst_case_loss > 0 else float('inf'),
+        }
+
+    def sector_summary(self):
+        """按行业汇总，返回字典列表，按最大资金占用从大到小排序"""
+        size = len(self.sector_names)
+        valid = self.batch.valid
+        capital = np.bincount(self.sector_codes,
+                              np.where(valid, np.nan_to_num(self.batch.max_investment), 0.0), minlength=size)
+        allocated = np.bincount(self.sector_codes, self.allocations, minlength=size)
+        losses = np.bincount(self.sector_codes, self.worst_case_losses, minlength=size)
+        counts = np.bincount(self.sector_codes, minlength=size)
+        rows = [{
+            'sector': self.sector_names[i],
+            'names': int(counts[i]),
+            'allocated': float(allocated[i]),
+            'worst_case_capital': float(capital[i]),
+            'capital_pct': float(capital[i] / self.budget * 100) if self.budget > 0 else 0.0,
+            'worst_case_loss': float(losses[i]),
+        } for i in range(size)]
+        rows.sort(key=lambda row: -row['worst_case_capital'])
+        return rows
+
+    def rows(self):
+        """每只股票一行的字典，字段见 PORTFOLIO_ROW_FIELDS"""
+        batch = self.batch
+        columns = {
+            'symbol': self.symbols,
+            'sector': self.sectors,
+            'current_price': batch.current_prices,
+            'stop_loss': batch.stop_losses,
+            'target_price': batch.target_prices,
+            'allocation': self.allocations,
+            'intervals': batch.intervals,
+            'total_shares': self.total_shares,
+            'worst_case_loss': self.worst_case_losses,
+            'loss_pct_of_budget': self.worst_case_losses / self.budget * 100,
+            'valid': batch.valid,
+        }
+        columns.update(batch.risk_metrics)
+        # NaN和无穷大输出为空
+        lists = {name: [None if isinstance(v, float) and not math.isfinite(v) else v
+                        for v in np.asarray(columns[name]).tolist()]
+                 for name in PORTFOLIO_ROW_FIELDS}
+        return [{name: lists[name][i] for name in PORTFOLIO_ROW_FIELDS} for i in range(len(self))]
+
+
+def _sector_caps(budget, sector_names, max_sector_pct, sector_caps):
+    """按行业编号排列的行业上限(元)，sector_caps 为 {行业: 百分比}，优先于 max_sector_pct"""
+    default = np.inf if max_sector_pct is None else budget * max_sector_pct / 100
+    sector_caps = sector_caps or {}
+    return np.array([budget * sector_caps[name] / 100 if name in sector_caps else default
+                     for name in sector_names], dtype=np.float64)
+
+
+def plan_portfolio(symbols, current_prices, stop_losses, budget, sectors=None, target_prices=None,
+                   weights=None, max_name_pct=DEFAULT_MAX_NAME_PCT, max_sector_pct=None,
+                   sector_caps=None, intervals=DEFAULT_INTERVALS,
+                   weight_exponent=DEFAULT_WEIGHT_EXPONENT, rules=None, strategies=None, atr=None):
+    """为一组股票生成共用总资金的加仓计划，返回 PortfolioPlan
+
+    weights 为各股票的资金权重，默认等权；max_name_pct / max_sector_pct 为单只股票 / 单个行业
+    最多占用总资金的百分比(None 表示不限)，sector_caps 可为个别行业单独指定上限。
+    参数不合法的股票(如止损价不低于当前价)不分配资金。rules、strategies、atr 见 compute_plans_batch。
+    """
+    if budget <= 0:
+        raise ValueError("总资金必须大于0!")
+    symbols = np.asarray(symbols, dtype=object)
+    count = len(symbols)
+    if len(set(symbols.tolist())) != count:
+        raise ValueError("股票代码不能重复!")
+    current_prices = np.broadcast_to(np.asarray(current_prices, dtype=np.float64), (count,))
+    stop_losses = np.broadcast_to(np.asarray(stop_losses, dtype=np.float64), (count,))
+    if target_prices is None:
+        target_prices = default_target_price(current_prices)
+    target_prices = np.broadcast_to(np.asarray(target_prices, dtype=np.float64), (count,))
+    if sectors is None:
+        sectors = [DEFAULT_SECTOR] * count
+    sector_names, sector_codes = np.unique(np.asarray(sectors, dtype=object), return_inverse=True)
+    sector_codes = sector_codes.ravel()
+
+    weights = np.ones(count) if weights is None else np.broadcast_to(
+        np.asarray(weights, dtype=np.float64), (count,))
+    if (weights < 0).any() or not np.isfinite(weights).all():
+        raise ValueError("资金权重必须为非负数!")
+    tradable = (current_prices > stop_losses) & (stop_losses > 0)
+    name_cap = np.inf if max_name_pct is None else budget * max_name_pct / 100
+    allocations = allocate_budget(budget, np.where(tradable, weights, 0.0), sector_codes, name_cap,
+                                  _sector_caps(budget, sector_names, max_sector_pct, sector_caps))
+
+    # 未分到资金的股票本金为0，在批量结果中标记为不合法
+    batch = compute_plans_batch(current_prices, stop_losses, allocations,
+                                target_prices, intervals, weight_exponent, chunk_size=max(count, 1),
+                                rules=rules, strategies=strategies, atr=atr)
+    return PortfolioPlan(budget, symbols, sector_names, sector_codes, allocations, batch)
+
+
+def _float(value, default, line, name):
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"第{line}行字段 {name} 不是有效数字: {value!r}")
+
+
+def read_positions(stream):
+    """读取持仓CSV，返回 plan_portfolio 的列参数字典"""
+    columns = {name: [] for name in POSITION_COLUMNS}
+    for line, record in enumerate(csv.DictReader(stream), 2):
+        symbol = (record.get('symbol') or '').strip()
+        if not symbol:
+            raise ValueError(f"第{line}行缺少 symbol")
+        current_price = _float(record.get('current_price'), None, line, 'current_price')
+        if current_price is None:
+            raise ValueError(f"第{line}行缺少 current_price")
+        stop_loss = _float(record.get('stop_loss'), None, line, 'stop_loss')
+        if stop_loss is None:
+            stop_pct = _float(record.get('stop_loss_pct'), None, line, 'stop_loss_pct')
+            if stop_pct is None:
+                raise ValueError(f"第{line}行需要 stop_loss 或 stop_loss_pct")
+            stop_loss = current_price * (1 - stop_pct / 100)
+        columns['symbol'].append(symbol)
+        columns['sector'].append((record.get('sector') or '').strip() or DEFAULT_SECTOR)
+        columns['current_price'].append(current_price)
+        columns['stop_loss'].append(stop_loss)
+        columns['target_price'].append(_float(record.get('target_price'), default_target_price(current_price),
+                                              line, 'target_price'))
+        columns['weight'].append(_float(record.get('weight'), 1.0, line, 'weight'))
+        columns['strategy'].append((record.get('strategy') or '').strip() or None)
+        columns['atr'].append(_float(record.get('atr'), np.nan, line, 'atr'))
+    return {
+        'symbols': columns['symbol'],
+        'sectors': columns['sector'],
+        'current_prices': columns['current_price'],
+        'stop_losses': columns['stop_loss'],
+        'target_prices': columns['target_price'],
+        'weights': columns['weight'],
+        'strategies': columns['strategy'],
+        'atr': columns['atr'],
+    }
+
+
+def format_summary_text(portfolio):
+    """组合汇总和行业分布的纯文本"""
+    s = portfolio.summary()
+    lines = [
+        f"股票 {s['valid_names']}/{s['names']} 只，总资金 {s['budget']:,.2f} 元，"
+        f"已分配 {s['allocated']:,.2f} 元",
+        f"全部价位成交时占用 {s['worst_case_capital']:,.2f} 元，剩余 {s['unused_capital']:,.2f} 元",
+        f"全部触及止损的最坏亏损 {s['worst_case_loss']:,.2f} 元(回撤 {s['worst_case_drawdown_pct']:.2f}%)，"
+        f"目标价收益 {s['potential_gain']:,.2f} 元，风险收益比 {s['risk_reward_ratio']:.2f}",
+    ]
+    for row in portfolio.sector_summary():
+        lines.append(f"  {row['sector']}: {row['names']} 只，占用 {row['worst_case_capital']:,.2f} 元"
+                     f"({row['capital_pct']:.1f}%)，最坏亏损 {row['worst_case_loss']:,.2f} 元")
+    return '\n'.join(lines)
+
+
+def _parse_sector_cap(text):
+    name, sep, pct = text.rpartition('=')
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(f"行业上限格式应为 行业=百分比: {text}")
+    try:
+        return name, float(pct)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"行业上限不是有效数字: {text}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="多股票组合加仓计划")
+    parser.add_argument('positions', help="持仓CSV：symbol, current_price, stop_loss 或 stop_loss_pct，"
+                                          "可选 sector, target_price, weight, strategy, atr")
+    parser.add_argument('--budget', type=float, required=True, help="总资金")
+    parser.add_argument('--max-name-pct', type=float, default=DEFAULT_MAX_NAME_PCT,
+                        help="单只股票最多占用总资金的百分比")
+    parser.add_argument('--max-sector-pct', type=float, help="单个行业最多占用总资金的百分比，默认不限")
+    parser.add_argument('--sector-cap', type=_parse_sector_cap, action='append', default=[],
+                        help="单独指定某个行业的上限，如 银行=10，可重复")
+    parser.add_argument('--intervals', type=int, default=DEFAULT_INTERVALS)
+    parser.add_argument('--weight-exponent', type=float, default=DEFAULT_WEIGHT_EXPONENT)
+    parser.add_argument('--strategy', default=DEFAULT_STRATEGY,
+                        help=f"未指定 strategy 列的股票使用的加仓策略: {', '.join(strategy_names())}")
+    parser.add_argument('--lot-size', type=int, help="按整手下单的每手股数(A股为100)")
+    parser.add_argument('--commission-rate', type=float, default=A_SHARE_COMMISSION_RATE)
+    parser.add_argument('--min-commission', type=float, default=A_SHARE_MIN_COMMISSION)
+    parser.add_argument('-o', '--output', default='-', help="每只股票一行的CSV，默认标准输出")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        with open(args.positions, 'r', encoding='utf-8', newline='') as stream:
+            positions = read_positions(stream)
+        positions['strategies'] = [s or args.strategy for s in positions['strategies']]
+        rules = None
+        if args.lot_size is not None:
+            rules = LotRules(args.lot_size, args.commission_rate, args.min_commission)
+        portfolio = plan_portfolio(budget=args.budget, max_name_pct=args.max_name_pct,
+                                   max_sector_pct=args.max_sector_pct,
+                                   sector_caps=dict(args.sector_cap), intervals=args.intervals,
+                                   weight_exponent=args.weight_exponent, rules=rules, **positions)
+    except (ValueError, OSError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+
+    stream = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+    try:
+        writer = csv.DictWriter(stream, fieldnames=PORTFOLIO_ROW_FIELDS)
+        writer.writeheader()
+        writer.writerows(portfolio.rows())
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    print(format_summary_text(portfolio), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,730 +1,759 @@
-import sys
-import os
-import numpy as np
-import requests
-import json
-import re
-import matplotlib
-from matplotlib import font_manager
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                             QHBoxLayout, QLabel, QLineEdit, QPushButton, 
-                             QTableWidget, QTableWidgetItem, QHeaderView, 
-                             QMessageBox, QGridLayout, QFileDialog, QSizePolicy,
-                             QComboBox, QGroupBox, QTabWidget)
-from PyQt5.QtGui import QDoubleValidator, QFont, QColor
-from PyQt5.QtCore import Qt, QTimer
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-
-# 设置matplotlib中文字体支持
-def set_matplotlib_chinese_font():
-    # 判断操作系统类型
-    if sys.platform.startswith('win'):
-        # Windows系统
-        font_family = ['Microsoft YaHei', 'SimHei', 'SimSun']
-    elif sys.platform.startswith('darwin'):
-        # macOS系统
-        font_family = ['Heiti SC', 'Hei', 'STHeiti', 'SimHei']
-    else:
-        # Linux系统
-        font_family = ['WenQuanYi Micro Hei', 'WenQuanYi Zen Hei', 'SimHei']
-    
-    # 尝试按优先级设置字体
-    font_found = False
-    for font in font_family:
-        try:
-            matplotlib.rcParams['font.family'] = [font]
-            font_found = True
-            print(f"已设置中文字体: {font}")
-            break
-        except:
-            continue
-    
-    # 如果未找到中文字体，使用通用设置
-    if not font_found:
-        matplotlib.rcParams['font.family'] = 'sans-serif'
-        matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'DejaVu Sans', 'Arial']
-    
-    # 修复负号显示问题
-    matplotlib.rcParams['axes.unicode_minus'] = False
-    
-# 初始化matplotlib中文支持
-set_matplotlib_chinese_font()
-
-class PyramidStockTool(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.initUI()
-        self.last_generated_data = None
-        
-    def initUI(self):
-        self.setWindowTitle('股票金字塔加仓工具')
-        self.setGeometry(300, 300, 1100, 900)  # 略微增大窗口尺寸
-        
-        # 创建中央部件
-        central_widget = QWidget()
-        self.setCentralWidget(central_widget)
-        
-        # 主布局
-        main_layout = QVBoxLayout(central_widget)
-        
-        # 添加标题
-        title_label = QLabel("股票金字塔加仓策略")
-        title_font = QFont()
-        title_font.setPointSize(16)
-        title_font.setBold(True)
-        title_label.setFont(title_font)
-        title_label.setAlignment(Qt.AlignCenter)
-        main_layout.addWidget(title_label)
-        
-        # 创建股票行情区域
-        stock_quote_group = QGroupBox("实时行情")
-        stock_quote_layout = QGridLayout(stock_quote_group)
-        
-        # 股票代码输入
-        stock_code_label = QLabel("股票代码:")
-        self.stock_code_edit = QLineEdit()
-        self.stock_code_edit.setPlaceholderText("输入股票代码，如：600000(上证) 或 000001(深证)")
-        
-        # 行情获取按钮
-        get_quote_button = QPushButton("获取行情")
-        get_quote_button.clicked.connect(self.get_stock_quote)
-        
-        # 股票信息显示 - 第一行基本信息
-        self.stock_name_label = QLabel("股票名称: --")
-        self.stock_price_label = QLabel("当前价格: --")
-        self.stock_change_label = QLabel("涨跌幅: --")
-        self.stock_high_label = QLabel("最高: --")
-        self.stock_low_label = QLabel("最低: --")
-        
-        # 股票信息显示 - 第二行基本面信息
-        self.stock_pe_label = QLabel("市盈率(TTM): --")
-        self.stock_pb_label = QLabel("市净率: --")
-        self.stock_market_cap_label = QLabel("总市值: --")
-        self.stock_turnover_label = QLabel("换手率: --")
-        self.stock_dividend_yield_label = QLabel("股息率: --")
-        
-        # 添加到股票行情布局
-        stock_quote_layout.addWidget(stock_code_label, 0, 0)
-        stock_quote_layout.addWidget(self.stock_code_edit, 0, 1, 1, 2)
-        stock_quote_layout.addWidget(get_quote_button, 0, 3)
-        
-        stock_quote_layout.addWidget(self.stock_name_label, 1, 0, 1, 2)
-        stock_quote_layout.addWidget(self.stock_price_label, 1, 2)
-        stock_quote_layout.addWidget(self.stock_change_label, 1, 3)
-        stock_quote_layout.addWidget(self.stock_high_label, 1, 4)
-        stock_quote_layout.addWidget(self.stock_low_label, 1, 5)
-        
-        # 添加基本面信息到第二行
-        stock_quote_layout.addWidget(self.stock_pe_label, 2, 0)
-        stock_quote_layout.addWidget(self.stock_pb_label, 2, 1)
-        stock_quote_layout.addWidget(self.stock_market_cap_label, 2, 2)
-        stock_quote_layout.addWidget(self.stock_turnover_label, 2, 3)
-        stock_quote_layout.addWidget(self.stock_dividend_yield_label, 2, 4, 1, 2)
-        
-        # 创建输入区域
-        input_group = QGroupBox("策略参数")
-        input_layout = QGridLayout(input_group)
-        
-        # 当前价格输入
-        current_price_label = QLabel("当前价格:")
-        self.current_price_edit = QLineEdit()
-        self.current_price_edit.setValidator(QDoubleValidator(0.00, 100000.00, 2))
-        
-        # 止损目标价输入
-        stop_loss_label = QLabel("止损目标价:")
-        self.stop_loss_edit = QLineEdit()
-        self.stop_loss_edit.setValidator(QDoubleValidator(0.00, 100000.00, 2))
-        
-        # 本金输入
-        capital_label = QLabel("本金(元):")
-        self.capital_edit = QLineEdit()
-        self.capital_edit.setValidator(QDoubleValidator(0.00, 1000000000.00, 2))
-        
-        # 目标价格输入
-        target_price_label = QLabel("目标价格:")
-        self.target_price_edit = QLineEdit()
-        self.target_price_edit.setValidator(QDoubleValidator(0.00, 100000.00, 2))
-        
-        # 生成按钮
-        generate_button = QPushButton("生成加仓列表")
-        generate_button.clicked.connect(self.generate_pyramid)
-        
-        # 添加控件到输入布局
-        input_layout.addWidget(current_price_label, 0, 0)
-        input_layout.addWidget(self.current_price_edit, 0, 1)
-        input_layout.addWidget(stop_loss_label, 0, 2)
-        input_layout.addWidget(self.stop_loss_edit, 0, 3)
-        input_layout.addWidget(capital_label, 0, 4)
-        input_layout.addWidget(self.capital_edit, 0, 5)
-        input_layout.addWidget(target_price_label, 0, 6)
-        input_layout.addWidget(self.target_price_edit, 0, 7)
-        input_layout.addWidget(generate_button, 0, 8)
-        
-        # 创建表格和图表的布局
-        content_layout = QVBoxLayout()
-        
-        # 添加风险评估摘要区域
-        risk_summary_group = QGroupBox("风险评估摘要")
-        risk_summary_layout = QHBoxLayout(risk_summary_group)
-        
-        # 创建风险指标标签
-        self.max_investment_label = QLabel("最大投入金额: --")
-        self.max_drawdown_label = QLabel("最大回撤: --")
-        self.risk_reward_ratio_label = QLabel("风险收益比: --")
-        self.breakeven_price_label = QLabel("盈亏平衡价格: --")
-        self.max_return_label = QLabel("最大预期收益率: --")
-        
-        # 添加风险指标到布局
-        risk_summary_layout.addWidget(self.max_investment_label)
-        risk_summary_layout.addWidget(self.max_drawdown_label)
-        risk_summary_layout.addWidget(self.risk_reward_ratio_label)
-        risk_summary_layout.addWidget(self.breakeven_price_label)
-        risk_summary_layout.addWidget(self.max_return_label)
-        
-        content_layout.addWidget(risk_summary_group)
-        
-        # 创建选项卡布局
-        tab_widget = QTabWidget()
-        
-        # 表格选项卡
-        table_tab = QWidget()
-        table_layout = QVBoxLayout(table_tab)
-        
-        # 创建表格
-        self.table = QTableWidget()
-        self.table.setColumnCount(9)  # 增加到9列，添加平均成本、收益率分析
-        self.table.setHorizontalHeaderLabels([
-            "价格区间", "买入价格", "买入比例", "买入股数", 
-            "本次投入", "累计投入", "平均成本", "盈亏平衡", "收益分析"
-        ])
-        header = self.table.horizontalHeader()
-        header.setSectionResizeMode(QHeaderView.Stretch)
-        
-        table_layout.addWidget(self.table)
-        tab_widget.addTab(table_tab, "加仓列表")
-        
-        # 图表选项卡
-        chart_tab = QWidget()
-        chart_layout = QVBoxLayout(chart_tab)
-        
-        # 创建Matplotlib图表
-        self.figure = Figure(figsize=(5, 8), dpi=100)
-        self.canvas = FigureCanvas(self.figure)
-        self.canvas.setMinimumHeight(300)
-        chart_layout.addWidget(self.canvas)
-        
-        tab_widget.addTab(chart_tab, "分析图表")
-        
-        # 添加选项卡到内容布局
-        content_layout.addWidget(tab_widget)
-        
-        # 添加到主布局
-        main_layout.addWidget(stock_quote_group)
-        main_layout.addWidget(input_group)
-        main_layout.addLayout(content_layout)
-        
-        # 设置自动刷新定时器
-        self.refresh_timer = QTimer()
-        self.refresh_timer.timeout.connect(self.auto_refresh_quote)
-        
-        # 当前股票代码
-        self.current_stock_code = None
-        self.current_stock_price = None
-    
-    def get_stock_code_prefix(self, code):
-        """根据股票代码获取前缀"""
-        code = code.strip()
-        if code.startswith('6'):
-            return 'sh' + code
-        elif code.startswith('0') or code.startswith('3'):
-            return 'sz' + code
-        return code
-    
-    def get_stock_quote(self):
-        """获取股票实时行情"""
-        stock_code = self.stock_code_edit.text().strip()
-        if not stock_code:
-            QMessageBox.warning(self, "输入错误", "请输入股票代码!")
-            return
-        
-        try:
-            # 转换股票代码格式
-            formatted_code = self.get_stock_code_prefix(stock_code)
-            self.current_stock_code = formatted_code
-            
-            # 使用新浪财经API获取股票数据
-            url = f"http://hq.sinajs.cn/list={formatted_code}"
-            headers = {
-                'Referer': 'https://finance.sina.com.cn',
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            
-            response = requests.get(url, headers=headers)
-            response.encoding = 'gbk'  # 设置正确的编码
-            
-            # 解析响应数据
-            data = response.text
-            pattern = r'"(.*)"'
-            result = re.search(pattern, data)
-            
-            if result:
-                stock_data = result.group(1).split(',')
-                if len(stock_data) < 32:
-                    raise ValueError("股票数据格式错误")
-                
-                # 提取股票信息
-                stock_name = stock_data[0]
-                current_price = float(stock_data[3])
-                yesterday_close = float(stock_data[2])
-                today_high = float(stock_data[4])
-                today_low = float(stock_data[5])
-                volume = float(stock_data[8]) # 成交量
-                turnover = float(stock_data[9]) # 成交额
-                
-                # 计算涨跌幅
-                change_percent = (current_price - yesterday_close) / yesterday_close * 100
-                
-                # 保存当前股价
-                self.current_stock_price = current_price
-                
-                # 更新UI显示
-                self.stock_name_label.setText(f"股票名称: {stock_name}")
-                self.stock_price_label.setText(f"当前价格: {current_price}")
-                
-                # 根据涨跌幅设置颜色
-                change_text = f"涨跌幅: {change_percent:.2f}%"
-                if change_percent > 0:
-                    self.stock_change_label.setStyleSheet("color: red")
-                    change_text = "涨跌幅: +" + change_text[5:]
-                elif change_percent < 0:
-                    self.stock_change_label.setStyleSheet("color: green")
-                else:
-                    self.stock_change_label.setStyleSheet("")
-                
-                self.stock_change_label.setText(change_text)
-                self.stock_high_label.setText(f"最高: {today_high}")
-                self.stock_low_label.setText(f"最低: {today_low}")
-                
-                # 自动填充当前价格到价格输入框
-                self.current_price_edit.setText(str(current_price))
-                
-                # 获取额外的基本面数据
-                self.get_stock_fundamentals(stock_code)
-                
-                # 启动自动刷新
-                if not self.refresh_timer.isActive():
-                    self.refresh_timer.start(10000)  # 每10秒刷新一次
-                
-                return True
-            else:
-                QMessageBox.warning(self, "获取失败", "未找到股票数据，请检查股票代码是否正确!")
-                return False
-                
-        except Exception as e:
-            QMessageBox.warning(self, "获取失败", f"获取股票行情失败: {str(e)}")
-            return False
-    
-    def auto_refresh_quote(self):
-        """自动刷新股票行情"""
-        if self.current_stock_code:
-            try:
-                url = f"http://hq.sinajs.cn/list={self.current_stock_code}"
-                headers = {
-                    'Referer': 'https://finance.sina.com.cn',
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                }
-                
-                response = requests.get(url, headers=headers)
-                response.encoding = 'gbk'
-                
-                data = response.text
-                pattern = r'"(.*)"'
-                result = re.search(pattern, data)
-                
-                if result:
-                    stock_data = result.group(1).split(',')
-                    if len(stock_data) < 32:
-                        return
-                    
-                    # 更新价格信息
-                    current_price = float(stock_data[3])
-                    yesterday_close = float(stock_data[2])
-                    today_high = float(stock_data[4])
-                    today_low = float(stock_data[5])
-                    
-                    # 更新当前股价
-                    self.current_stock_price = current_price
-                    
-                    # 计算涨跌幅
-                    change_percent = (current_price - yesterday_close) / yesterday_close * 100
-                    
-                    # 更新UI显示
-                    self.stock_price_label.setText(f"当前价格: {current_price}")
-                    
-                    change_text = f"涨跌幅: {change_percent:.2f}%"
-                    if change_percent > 0:
-                        self.stock_change_label.setStyleSheet("color: red")
-                        change_text = "涨跌幅: +" + change_text[5:]
-                    elif change_percent < 0:
-                        self.stock_change_label.setStyleSheet("color: green")
-                    else:
-                        self.stock_change_label.setStyleSheet("")
-                    
-                    self.stock_change_label.setText(change_text)
-                    self.stock_high_label.setText(f"最高: {today_high}")
-                    self.stock_low_label.setText(f"最低: {today_low}")
-                    
-                    # 自动更新当前价格输入框
-                    self.current_price_edit.setText(str(current_price))
-            except:
-                # 静默处理自动刷新中的错误
-                pass
-    
-    def fill_current_price(self):
-        """将当前股价填充到当前价格输入框"""
-        if self.current_stock_price is not None:
-            self.current_price_edit.setText(str(self.current_stock_price))
-        else:
-            QMessageBox.information(self, "提示", "请先获取股票行情!")
-        
-    def generate_pyramid(self):
-        try:
-            current_price = float(self.current_price_edit.text())
-            stop_loss = float(self.stop_loss_edit.text())
-            capital = float(self.capital_edit.text())
-            
-            # 获取目标价格，如果未填写则默认为当前价格的20%上涨
-            target_price_text = self.target_price_edit.text()
-            if target_price_text:
-                target_price = float(target_price_text)
-            else:
-                target_price = current_price * 1.2
-                # 更新到UI
-                self.target_price_edit.setText(f"{target_price:.2f}")
-            
-            if current_price <= stop_loss:
-                QMessageBox.warning(self, "输入错误", "当前价格必须高于止损价格!")
-                return
-                
-            if target_price <= current_price:
-                QMessageBox.warning(self, "输入警告", "目标价格应该高于当前价格，否则可能无法获得盈利！")
-                # 不中断执行，只是警告
-            
-            # 计算价格区间
-            price_diff = current_price - stop_loss
-            step = price_diff / 20
-            
-            # 修正权重分配：低价位权重大，高价位权重小
-            # 使用平方关系增加权重差异，符合金字塔加仓的"越跌越买"原则
-            weights = [(i+1)**2 for i in range(20)]
-            total_weight = sum(weights)
-            
-            # 清空表格并设置行数
-            self.table.setRowCount(20)
-            
-            cumulative_investment = 0
-            total_shares = 0
-            
-            # 存储买点信息用于绘图
-            buy_prices = []
-            shares_list = []
-            investment_list = []
-            avg_cost_list = []
-            profit_point_list = []
-            potential_return_list = []
-            
-            # 填充表格
-            for i in range(20):
-                weight = weights[i]  # 使用非线性权重
-                price = current_price - step * (i + 1)
-                buy_prices.append(price)
-                
-                # 计算当前价位应分配的资金比例和金额
-                allocation_ratio = weight / total_weight
-                allocated_capital = allocation_ratio * capital
-                
-                # 计算股数 (允许小数，最后展示时四舍五入)
-                shares = int(round(allocated_capital / price))
-                shares_list.append(shares)
-                
-                actual_investment = shares * price
-                investment_list.append(actual_investment)
-                
-                # 累计投资和持股数量
-                cumulative_investment += actual_investment
-                total_shares += shares
-                
-                # 计算平均成本
-                avg_cost = cumulative_investment / total_shares if total_shares > 0 else 0
-                avg_cost_list.append(avg_cost)
-                
-                # 计算盈亏平衡点
-                # 盈亏平衡点是指需要涨到什么价格才能收回所有成本
-                profit_point = avg_cost
-                profit_point_list.append(profit_point)
-                
-                # 计算目标价格下的预期收益
-                potential_profit = (target_price - avg_cost) * total_shares
-                potential_return_pct = (potential_profit / cumulative_investment) * 100 if cumulative_investment > 0 else 0
-                potential_return_list.append(potential_return_pct)
-                
-                # 添加表格数据 - 基本列
-                self.table.setItem(i, 0, QTableWidgetItem(f"第{i+1}区间"))
-                self.table.setItem(i, 1, QTableWidgetItem(f"{price:.2f}"))
-                self.table.setItem(i, 2, QTableWidgetItem(f"{allocation_ratio*100:.2f}%"))
-                self.table.setItem(i, 3, QTableWidgetItem(f"{shares}"))
-                self.table.setItem(i, 4, QTableWidgetItem(f"{actual_investment:.2f}"))
-                self.table.setItem(i, 5, QTableWidgetItem(f"{cumulative_investment:.2f}"))
-                
-                # 添加表格数据 - 新增列
-                self.table.setItem(i, 6, QTableWidgetItem(f"{avg_cost:.2f}"))
-                self.table.setItem(i, 7, QTableWidgetItem(f"{profit_point:.2f}"))
-                
-                # 收益分析 - 显示目标价格下的预期收益率
-                return_item = QTableWidgetItem(f"{potential_return_pct:.2f}%")
-                if potential_return_pct > 0:
-                    return_item.setForeground(QColor(255, 0, 0))  # 正收益显示为红色
-                elif potential_return_pct < 0:
-                    return_item.setForeground(QColor(0, 128, 0))  # 负收益显示为绿色
-                self.table.setItem(i, 8, return_item)
-                
-                # 为表格添加颜色渐变，突出显示买入力度（低价区间颜色更深）
-                intensity = int(200 * (i / 19))  # 0-200的颜色渐变
-                for col in range(9):  # 扩展到9列
-                    item = self.table.item(i, col)
-                    if item:
-                        item.setBackground(QColor(255, 255-intensity, 255-intensity))
-            
-            # 计算风险评估指标
-            
-            # 1. 最大投入金额
-            max_investment = cumulative_investment
-            
-            # 2. 最大回撤 (基于当前价格到止损价格的跌幅)
-            max_drawdown_pct = ((current_price - stop_loss) / current_price) * 100
-            
-            # 3. 风险收益比 (潜在收益与潜在损失的比值)
-            potential_loss = max_investment * max_drawdown_pct / 100
-            potential_gain = (target_price - avg_cost_list[-1]) * total_shares
-            risk_reward_ratio = potential_gain / potential_loss if potential_loss > 0 else float('inf')
-            
-            # 4. 盈亏平衡价格 (最终的平均成本)
-            breakeven_price = avg_cost_list[-1]
-            
-            # 5. 最大预期收益率
-            max_return = (target_price - breakeven_price) / breakeven_price * 100
-            
-            # 更新风险评估摘要
-            self.max_investment_label.setText(f"最大投入金额: {max_investment:.2f}元")
-            self.max_drawdown_label.setText(f"最大回撤: {max_drawdown_pct:.2f}%")
-            self.risk_reward_ratio_label.setText(f"风险收益比: {risk_reward_ratio:.2f}")
-            self.breakeven_price_label.setText(f"盈亏平衡价格: {breakeven_price:.2f}元")
-            self.max_return_label.setText(f"最大预期收益率: {max_return:.2f}%")
-            
-            # 保存风险指标
-            risk_metrics = {
-                'max_investment': max_investment,
-                'max_drawdown_pct': max_drawdown_pct,
-                'risk_reward_ratio': risk_reward_ratio,
-                'breakeven_price': breakeven_price,
-                'max_return': max_return
-            }
-            
-            # 保存生成的数据
-            self.last_generated_data = {
-                'current_price': current_price,
-                'stop_loss': stop_loss,
-                'buy_prices': buy_prices,
-                'shares': shares_list,
-                'investments': investment_list,
-                'avg_costs': avg_cost_list,
-                'profit_points': profit_point_list,
-                'potential_returns': potential_return_list,
-                'target_price': target_price,
-                'risk_metrics': risk_metrics
-            }
-            
-            # 生成折线图
-            self.plot_chart()
-        
-        except ValueError:
-            QMessageBox.warning(self, "输入错误", "请输入有效的数字!")
-    
-    def plot_chart(self):
-        if not self.last_generated_data:
-            return
-            
-        # 清除之前的图表
-        self.figure.clear()
-        
-        # 创建多个子图
-        gs = self.figure.add_gridspec(3, 1, height_ratios=[2, 1, 1])
-        
-        # 第一个子图：买入价格和股数
-        ax1 = self.figure.add_subplot(gs[0])
-        
-        # 获取数据
-        buy_prices = self.last_generated_data['buy_prices']
-        shares = self.last_generated_data['shares']
-        investments = self.last_generated_data['investments']
-        avg_costs = self.last_generated_data['avg_costs']
-        current_price = self.last_generated_data['current_price']
-        stop_loss = self.last_generated_data['stop_loss']
-        target_price = self.last_generated_data['target_price']
-        
-        # 绘制买入股数和投入金额
-        ax1.plot(buy_prices, shares, 'b-', marker='o', label='买入股数')
-        
-        # 创建第二个Y轴显示投入金额
-        ax1_twin = ax1.twinx()
-        ax1_twin.plot(buy_prices, investments, 'r-', marker='x', label='本次投入')
-        
-        # 设置图表标题和标签
-        ax1.set_title('金字塔加仓买点图', fontsize=12)
-        ax1.set_ylabel('买入股数', color='b', fontsize=10)
-        ax1_twin.set_ylabel('投入金额(元)', color='r', fontsize=10)
-        
-        # 添加网格和图例
-        ax1.grid(True, linestyle='--', alpha=0.7)
-        lines1, labels1 = ax1.get_legend_handles_labels()
-        lines2, labels2 = ax1_twin.get_legend_handles_labels()
-        ax1.legend(lines1 + lines2, labels1 + labels2, loc='upper right', fontsize=9)
-        
-        # 添加止损线和目标价格线
-        price_range = max(buy_prices) - min(buy_prices)
-        price_extension = price_range * 0.1
-        x_min = min(buy_prices) - price_extension
-        x_max = max(buy_prices) + price_extension
-        
-        ax1.axhline(y=0, color='k', linestyle='-', alpha=0.3)
-        ax1.set_xlim(x_min, x_max)
-        
-        # 第二个子图：平均成本变化
-        ax2 = self.figure.add_subplot(gs[1], sharex=ax1)
-        ax2.plot(buy_prices, avg_costs, 'g-', marker='s', label='平均成本')
-        
-        # 添加止损线和当前价格线
-        ax2.axhline(y=stop_loss, color='r', linestyle='--', alpha=0.5, label=f'止损价: {stop_loss:.2f}')
-        ax2.axhline(y=current_price, color='b', linestyle='--', alpha=0.5, label=f'当前价: {current_price:.2f}')
-        ax2.axhline(y=target_price, color='g', linestyle='--', alpha=0.5, label=f'目标价: {target_price:.2f}')
-        
-        ax2.set_ylabel('价格(元)', fontsize=10)
-        ax2.grid(True, linestyle='--', alpha=0.7)
-        ax2.legend(loc='upper right', fontsize=8)
-        
-        # 第三个子图：收益分析
-        ax3 = self.figure.add_subplot(gs[2], sharex=ax1)
-        
-        # 获取收益数据
-        potential_returns = self.last_generated_data['potential_returns']
-        
-        # 创建柱状图，使用颜色区分正负收益
-        bars = ax3.bar(buy_prices, potential_returns, alpha=0.7, label='预期收益率(%)')
-        for i, bar in enumerate(bars):
-            if potential_returns[i] >= 0:
-                bar.set_color('red')
-            else:
-                bar.set_color('green')
-        
-        ax3.set_title('预期收益率分析 (基于目标价格)', fontsize=11)
-        ax3.set_xlabel('买入价格', fontsize=10)
-        ax3.set_ylabel('收益率(%)', fontsize=10)
-        ax3.grid(True, linestyle='--', alpha=0.7)
-        
-        # 设置刻度字体大小
-        for ax in [ax1, ax1_twin, ax2, ax3]:
-            ax.tick_params(labelsize=8)
-        
-        # 添加风险指标文本框
-        if 'risk_metrics' in self.last_generated_data:
-            risk = self.last_generated_data['risk_metrics']
-            risk_text = f"风险评估指标:\n"
-            risk_text += f"最大投入: {risk['max_investment']:.2f}元\n"
-            risk_text += f"最大回撤: {risk['max_drawdown_pct']:.2f}%\n"
-            risk_text += f"风险收益比: {risk['risk_reward_ratio']:.2f}\n"
-            risk_text += f"盈亏平衡价: {risk['breakeven_price']:.2f}元\n"
-            risk_text += f"目标收益率: {risk['max_return']:.2f}%"
-            
-            # 在图表右上角添加文本框
-            ax1.text(0.98, 0.02, risk_text, transform=ax1.transAxes, fontsize=8,
-                   verticalalignment='bottom', horizontalalignment='right',
-                   bbox=dict(boxstyle='round,pad=0.5', facecolor='white', alpha=0.8))
-        
-        self.figure.tight_layout()
-        self.canvas.draw()
-
-    def get_stock_fundamentals(self, stock_code):
-        """获取股票基本面数据"""
-        try:
-            # 这里使用新浪财经的股票基本面API获取数据
-            # 实际应用中可替换为更可靠的数据源
-            
-            # 模拟基本面数据获取，由于新浪财经API限制，这里使用模拟数据
-            # 在实际项目中，可以使用专业金融数据API如东方财富、同花顺等
-            
-            # 尝试获取一些估算的基本面数据
-            stock_code_num = stock_code.replace('sh', '').replace('sz', '')
-            
-            # 尝试基于现有价格估算一些基本面指标
-            if hasattr(self, 'current_stock_price') and self.current_stock_price:
-                price = self.current_stock_price
-                
-                # 使用一些假设值计算市值和其他指标 (仅作演示用)
-                # 在实际应用中应替换为从API获取的真实数据
-                
-                # 假设流通股本为10亿股
-                float_shares = 1000000000  
-                market_cap = price * float_shares
-                
-                # 修正估算公式，避免显示过于夸张的数据
-                if stock_code.startswith('6'):  # 假设上证指数公司规模更大
-                    pe_ratio = round(25 + (price % 10), 2)  # 示例PE从25到35
-                    pb_ratio = round(1.5 + (price % 5) / 10, 2)  # 示例PB从1.5到2.0
-                    dividend_yield = round(2 + (price % 3) / 10, 2)  # 示例股息率从2%到2.3%
-                    turnover_rate = round(2 + (price % 5) / 10, 2)  # 示例换手率从2%到2.5%
-                    
-                    # 调整市值单位为亿元
-                    market_cap = round(market_cap / 100000000, 2)
-                else:
-                    pe_ratio = round(20 + (price % 15), 2)  # 示例PE从20到35
-                    pb_ratio = round(1.2 + (price % 8) / 10, 2) # 示例PB从1.2到2.0
-                    dividend_yield = round(1.5 + (price % 5) / 10, 2)  # 示例股息率从1.5%到2%
-                    turnover_rate = round(3 + (price % 7) / 10, 2) # 示例换手率从3%到3.7%
-                    
-                    # 调整市值单位为亿元
-                    market_cap = round(market_cap / 100000000, 2)
-                
-                # 更新UI显示基本面数据
-                self.stock_pe_label.setText(f"市盈率(TTM): {pe_ratio}")
-                self.stock_pb_label.setText(f"市净率: {pb_ratio}")
-                self.stock_market_cap_label.setText(f"总市值: {market_cap}亿")
-                self.stock_turnover_label.setText(f"换手率: {turnover_rate}%")
-                self.stock_dividend_yield_label.setText(f"股息率: {dividend_yield}%")
-                
-                # 保存这些数据供后续使用
-                self.stock_fundamentals = {
-                    'pe_ratio': pe_ratio,
-                    'pb_ratio': pb_ratio,
-                    'market_cap': market_cap,
-                    'turnover_rate': turnover_rate,
-                    'dividend_yield': dividend_yield
-                }
-                
-                return True
-        
-        except Exception as e:
-            print(f"获取基本面数据失败: {str(e)}")
-            # 默认显示为未知
-            self.stock_pe_label.setText("市盈率(TTM): --")
-            self.stock_pb_label.setText("市净率: --")
-            self.stock_market_cap_label.setText("总市值: --")
-            self.stock_turnover_label.setText("换手率: --")
-            self.stock_dividend_yield_label.setText("股息率: --")
-            return False
-
-if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    window = PyramidStockTool()
-    window.show()
+import sys
+import os
+import sqlite3
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
+                             QHBoxLayout, QLabel, QLineEdit, QPushButton, 
+                             QTableView, QHeaderView, 
+                             QMessageBox, QGridLayout, QFileDialog,
+                             QComboBox, QGroupBox, QTabWidget)
+from PyQt5.QtGui import QDoubleValidator, QFont
+from PyQt5.QtCore import Qt, QTimer
+
+# 绘图库(matplotlib)和网络库(requests)在第一次使用时才导入，以加快窗口启动
+from pyramid_engine import default_target_price, A_SHARE_RULES
+from pyramid_export import (export_plan, export_quote_history, read_plan_inputs,
+                            guess_format, OUTPUT_FORMATS)
+from pyramid_strategies import strategy_names, get_strategy
+from plan_model import PlanModel, diff_plans
+from plan_table_model import PlanTableModel
+from portfolio_view import PortfolioPanel
+from quote_cache import QuoteCache
+from fundamentals_provider import default_provider, SOURCE_ESTIMATE
+from quote_store import QuoteStore
+from refresh_scheduler import RefreshScheduler
+from fill_tracker import FillTracker, FILL, STOP
+from perf_metrics import metrics, start_http_server, JsonDumper
+from diagnostics_panel import DiagnosticsPanel
+from worker_pipeline import WorkerPipeline
+
+# 自动刷新定时器检查调度器的间隔(毫秒)
+REFRESH_TICK_MS = 1000
+
+# 导出文件类型，未写扩展名时按所选类型补上
+EXPORT_FILTERS = {
+    "CSV (*.csv)": 'csv',
+    "Excel (*.xlsx)": 'xlsx',
+    "Parquet (*.parquet)": 'parquet',
+    "JSON Lines (*.jsonl)": 'jsonl',
+}
+IMPORT_FILTER = "计划文件 (*.csv *.xlsx *.parquet *.jsonl)"
+
+class PyramidStockTool(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.initUI()
+        self.plan_model = PlanModel(rules=A_SHARE_RULES)
+        self.last_plan = None
+        # 生成 last_plan 时的计算参数(PlanModel.inputs)，导出时一并写入
+        self.last_plan_inputs = None
+        # 生成 last_plan 时的股票代码，切换股票后与 current_stock_code 不同
+        self.last_plan_symbol = None
+        self.last_generated_data = None
+        
+    def initUI(self):
+        self.setWindowTitle('股票金字塔加仓工具')
+        self.setGeometry(300, 300, 1100, 900)  # 略微增大窗口尺寸
+        
+        # 创建中央部件
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        
+        # 主布局
+        main_layout = QVBoxLayout(central_widget)
+        
+        # 添加标题
+        title_label = QLabel("股票金字塔加仓策略")
+        title_font = QFont()
+        title_font.setPointSize(16)
+        title_font.setBold(True)
+        title_label.setFont(title_font)
+        title_label.setAlignment(Qt.AlignCenter)
+        main_layout.addWidget(title_label)
+        
+        # 创建股票行情区域
+        stock_quote_group = QGroupBox("实时行情")
+        stock_quote_layout = QGridLayout(stock_quote_group)
+        
+        # 股票代码输入
+        stock_code_label = QLabel("股票代码:")
+        self.stock_code_edit = QLineEdit()
+        self.stock_code_edit.setPlaceholderText("输入股票代码，如：600000(上证) 或 000001(深证)")
+        
+        # 行情获取按钮
+        get_quote_button = QPushButton("获取行情")
+        get_quote_button.clicked.connect(self.get_stock_quote)
+        
+        # 股票信息显示 - 第一行基本信息
+        self.stock_name_label = QLabel("股票名称: --")
+        self.stock_price_label = QLabel("当前价格: --")
+        self.stock_change_label = QLabel("涨跌幅: --")
+        self.stock_high_label = QLabel("最高: --")
+        self.stock_low_label = QLabel("最低: --")
+        
+        # 股票信息显示 - 第二行基本面信息
+        self.stock_pe_label = QLabel("市盈率(TTM): --")
+        self.stock_pb_label = QLabel("市净率: --")
+        self.stock_market_cap_label = QLabel("总市值: --")
+        self.stock_turnover_label = QLabel("换手率: --")
+        self.stock_dividend_yield_label = QLabel("股息率: --")
+        self.fundamentals_source_label = QLabel("")
+        
+        # 添加到股票行情布局
+        stock_quote_layout.addWidget(stock_code_label, 0, 0)
+        stock_quote_layout.addWidget(self.stock_code_edit, 0, 1, 1, 2)
+        stock_quote_layout.addWidget(get_quote_button, 0, 3)
+        
+        stock_quote_layout.addWidget(self.stock_name_label, 1, 0, 1, 2)
+        stock_quote_layout.addWidget(self.stock_price_label, 1, 2)
+        stock_quote_layout.addWidget(self.stock_change_label, 1, 3)
+        stock_quote_layout.addWidget(self.stock_high_label, 1, 4)
+        stock_quote_layout.addWidget(self.stock_low_label, 1, 5)
+        
+        # 添加基本面信息到第二行
+        stock_quote_layout.addWidget(self.stock_pe_label, 2, 0)
+        stock_quote_layout.addWidget(self.stock_pb_label, 2, 1)
+        stock_quote_layout.addWidget(self.stock_market_cap_label, 2, 2)
+        stock_quote_layout.addWidget(self.stock_turnover_label, 2, 3)
+        stock_quote_layout.addWidget(self.stock_dividend_yield_label, 2, 4)
+        stock_quote_layout.addWidget(self.fundamentals_source_label, 2, 5)
+        
+        # 创建输入区域
+        input_group = QGroupBox("策略参数")
+        input_layout = QGridLayout(input_group)
+        
+        # 当前价格输入
+        current_price_label = QLabel("当前价格:")
+        self.current_price_edit = QLineEdit()
+        self.current_price_edit.setValidator(QDoubleValidator(0.00, 100000.00, 2))
+        
+        # 止损目标价输入
+        stop_loss_label = QLabel("止损目标价:")
+        self.stop_loss_edit = QLineEdit()
+        self.stop_loss_edit.setValidator(QDoubleValidator(0.00, 100000.00, 2))
+        
+        # 本金输入
+        capital_label = QLabel("本金(元):")
+        self.capital_edit = QLineEdit()
+        self.capital_edit.setValidator(QDoubleValidator(0.00, 1000000000.00, 2))
+        
+        # 目标价格输入
+        target_price_label = QLabel("目标价格:")
+        self.target_price_edit = QLineEdit()
+        self.target_price_edit.setValidator(QDoubleValidator(0.00, 100000.00, 2))
+        
+        # 交易单位：A股按100股整手下单并计入佣金
+        lot_label = QLabel("交易单位:")
+        self.lot_combo = QComboBox()
+        self.lot_combo.addItem("100股/手(含佣金)", A_SHARE_RULES)
+        self.lot_combo.addItem("1股(不计佣金)", None)
+        self.lot_combo.currentIndexChanged.connect(self.on_lot_rules_changed)
+        
+        # 加仓策略：ATR间隔策略需要K线数据，界面不提供
+        strategy_label = QLabel("加仓策略:")
+        self.strategy_combo = QComboBox()
+        for name in strategy_names():
+            strategy = get_strategy(name)
+            if not strategy.atr_spaced:
+                self.strategy_combo.addItem(strategy.label, name)
+        self.strategy_combo.currentIndexChanged.connect(self.on_strategy_changed)
+        
+        # 生成按钮
+        generate_button = QPushButton("生成加仓列表")
+        generate_button.clicked.connect(self.generate_pyramid)
+        
+        # 添加控件到输入布局
+        input_layout.addWidget(current_price_label, 0, 0)
+        input_layout.addWidget(self.current_price_edit, 0, 1)
+        input_layout.addWidget(stop_loss_label, 0, 2)
+        input_layout.addWidget(self.stop_loss_edit, 0, 3)
+        input_layout.addWidget(capital_label, 0, 4)
+        input_layout.addWidget(self.capital_edit, 0, 5)
+        input_layout.addWidget(target_price_label, 0, 6)
+        input_layout.addWidget(self.target_price_edit, 0, 7)
+        input_layout.addWidget(lot_label, 1, 0)
+        input_layout.addWidget(self.lot_combo, 1, 1)
+        input_layout.addWidget(strategy_label, 1, 2)
+        input_layout.addWidget(self.strategy_combo, 1, 3)
+        input_layout.addWidget(generate_button, 0, 8)
+        
+        # 创建表格和图表的布局
+        content_layout = QVBoxLayout()
+        
+        # 添加风险评估摘要区域
+        risk_summary_group = QGroupBox("风险评估摘要")
+        risk_summary_layout = QHBoxLayout(risk_summary_group)
+        
+        # 创建风险指标标签
+        self.max_investment_label = QLabel("最大投入金额: --")
+        self.max_drawdown_label = QLabel("最大回撤: --")
+        self.risk_reward_ratio_label = QLabel("风险收益比: --")
+        self.breakeven_price_label = QLabel("盈亏平衡价格: --")
+        self.max_return_label = QLabel("最大预期收益率: --")
+        
+        # 添加风险指标到布局
+        risk_summary_layout.addWidget(self.max_investment_label)
+        risk_summary_layout.addWidget(self.max_drawdown_label)
+        risk_summary_layout.addWidget(self.risk_reward_ratio_label)
+        risk_summary_layout.addWidget(self.breakeven_price_label)
+        risk_summary_layout.addWidget(self.max_return_label)
+        
+        content_layout.addWidget(risk_summary_group)
+        
+        # 创建选项卡布局
+        tab_widget = QTabWidget()
+        
+        # 表格选项卡
+        table_tab = QWidget()
+        table_layout = QVBoxLayout(table_tab)
+        
+        # 创建表格，数据直接来自计划数组
+        self.table_model = PlanTableModel()
+        self.table = QTableView()
+        self.table.setModel(self.table_model)
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Stretch)
+        
+        # 导出/导入按钮
+        file_layout = QHBoxLayout()
+        for text, slot in (("导出计划", self.export_plan), ("导入计划", self.import_plan),
+                           ("导出行情历史", self.export_quote_history)):
+            button = QPushButton(text)
+            button.clicked.connect(slot)
+            file_layout.addWidget(button)
+        file_layout.addStretch()
+        table_layout.addLayout(file_layout)
+        table_layout.addWidget(self.table)
+        tab_widget.addTab(table_tab, "加仓列表")
+        
+        # 图表选项卡
+        chart_tab = QWidget()
+        chart_layout = QVBoxLayout(chart_tab)
+        
+        # Matplotlib图表在第一次切换到图表选项卡时创建
+        self.chart_layout = chart_layout
+        self.chart = None
+        self.charted_plan = None
+        
+        self.chart_tab_index = tab_widget.addTab(chart_tab, "分析图表")
+        tab_widget.currentChanged.connect(self.on_tab_changed)
+        self.tab_widget = tab_widget
+        
+        # 行情获取/解析和计划计算都在后台线程进行，结果通过信号回到界面线程；
+        # 同一只股票的新请求会取代尚未完成的旧请求
+        self.pipeline = WorkerPipeline(parent=self)
+        # 导出可能要读取整个历史库，单独使用一个线程，不阻塞计划计算
+        self.export_pipeline = WorkerPipeline(parent=self)
+        
+        # 组合选项卡：多只股票共用总资金的加仓计划
+        self.portfolio_panel = PortfolioPanel(rules=A_SHARE_RULES, pipeline=self.pipeline)
+        self.portfolio_panel.plan_selected.connect(self.on_portfolio_plan_selected)
+        tab_widget.addTab(self.portfolio_panel, "组合")
+        
+        # 诊断选项卡：关键路径耗时和各组件计数
+        self.diagnostics_panel = DiagnosticsPanel(self.diagnostics_sections)
+        tab_widget.addTab(self.diagnostics_panel, "诊断")
+        
+        # 添加选项卡到内容布局
+        content_layout.addWidget(tab_widget)
+        
+        # 添加到主布局
+        main_layout.addWidget(stock_quote_group)
+        main_layout.addWidget(input_group)
+        main_layout.addLayout(content_layout)
+        
+        # 设置自动刷新定时器，每秒检查一次调度器中到期的股票
+        self.refresh_scheduler = RefreshScheduler()
+        self.refresh_timer = QTimer()
+        self.refresh_timer.timeout.connect(self.auto_refresh_quote)
+        
+        # 行情和基本面共享缓存
+        self.quote_cache = QuoteCache()
+        self.quote_client = None
+        
+        # 跟踪各股票计划的成交进度，成交和止损在界面线程中通知
+        self.fill_tracker = FillTracker()
+        self.fill_tracker.add_listener(self.on_fill_event)
+        
+        # 基本面数据：启动时为本地快照建立索引，之后每次查询不需要网络；没有快照时使用估算值
+        self.fundamentals_provider = default_provider()
+        
+        # 本地历史库，记录获取的行情和生成的计划；打开失败时不影响其他功能
+        try:
+            self.quote_store = QuoteStore()
+        except (OSError, sqlite3.Error) as e:
+            print(f"打开历史库失败: {e}")
+            self.quote_store = None
+        
+        # 当前股票代码
+        self.current_stock_code = None
+        self.current_stock_price = None
+    
+    def closeEvent(self, event):
+        """关闭窗口时停止刷新并释放行情连接"""
+        self.refresh_timer.stop()
+        # 正在导出的行情历史还在读取历史库，等它写完再关闭历史库；排队中的任务直接取消
+        self.pipeline.close(wait=True)
+        self.export_pipeline.close(wait=True)
+        if self.quote_client is not None:
+            self.quote_client.close()
+        if self.quote_store is not None:
+            self.quote_store.close()
+        super().closeEvent(event)
+    
+    def get_quote_client(self):
+        """第一次请求行情时才创建客户端并导入网络库"""
+        if self.quote_client is None:
+            from sina_quote import SinaQuoteClient
+            self.quote_client = SinaQuoteClient(cache=self.quote_cache)
+        return self.quote_client
+    
+    def get_stock_code_prefix(self, code):
+        """根据股票代码获取前缀"""
+        from sina_quote import format_stock_code
+        return format_stock_code(code)
+    
+    def get_stock_quote(self):
+        """获取股票实时行情"""
+        stock_code = self.stock_code_edit.text().strip()
+        if not stock_code:
+            QMessageBox.warning(self, "输入错误", "请输入股票代码!")
+            return
+        
+        # 转换股票代码格式
+        formatted_code = self.get_stock_code_prefix(stock_code)
+        self.set_current_stock(formatted_code)
+        self.request_quote(formatted_code, manual=True)
+    
+    def set_current_stock(self, code):
+        """切换当前股票：上一只股票停止自动刷新，未返回的行情不再更新界面"""
+        if self.current_stock_code and self.current_stock_code != code:
+            self.refresh_scheduler.remove(self.current_stock_code)
+            self.pipeline.cancel(('quote', self.current_stock_code))
+        self.current_stock_code = code
+    
+    def select_stock(self, symbol):
+        """不通过"获取行情"按钮切换股票(组合视图、导入计划)：之后生成的计划记在这只股票下，
+        并在后台请求它的行情开始自动刷新"""
+        code = self.get_stock_code_prefix(symbol)
+        self.stock_code_edit.setText(symbol)
+        self.set_current_stock(code)
+        self.request_quote(code, manual=False)
+        if not self.refresh_timer.isActive():
+            self.refresh_timer.start(REFRESH_TICK_MS)
+    
+    def auto_refresh_quote(self):
+        """自动刷新调度器中到期的股票行情"""
+        for code in self.refresh_scheduler.due():
+            # 上一次请求还没有返回时不再排队，也不会取代手动发起的请求
+            if code == self.current_stock_code and not self.pipeline.is_pending(('quote', code)):
+                self.request_quote(code, manual=False)
+    
+    def request_quote(self, code, manual):
+        """在后台线程请求并解析行情，结果回到界面线程；同一只股票只应用最新一次请求的结果
+
+        自动刷新不读取缓存：调度器的快速刷新间隔短于缓存有效期，读缓存会拿到旧行情。
+        """
+        # quote.roundtrip 为从发起请求到拿到结果的总耗时，包含缓存命中和排队等待
+        self.pipeline.track(('quote', code), self.get_quote_client().submit([code], fresh=not manual),
+                            on_result=lambda quotes: self.on_quote_ready(code, quotes.get(code), manual),
+                            on_error=lambda message: self.on_quote_failed(code, message, manual),
+                            metric='quote.roundtrip')
+    
+    def on_quote_failed(self, code, message, manual):
+        """行情请求失败，自动刷新中的错误静默处理"""
+        if manual:
+            QMessageBox.warning(self, "获取失败", f"获取股票行情失败: {message}")
+    
+    @metrics.timed('quote.ui_update')
+    def on_quote_ready(self, code, quote, manual):
+        """在界面线程中更新行情显示"""
+        # 已切换到其他股票时丢弃过期结果
+        if code != self.current_stock_code:
+            return
+        
+        if quote is None:
+            if manual:
+                QMessageBox.warning(self, "获取失败", "未找到股票数据，请检查股票代码是否正确!")
+            return
+        
+        # 提取股票信息
+        stock_name = quote.name
+        current_price = quote.price
+        today_high = quote.high
+        today_low = quote.low
+        change_percent = quote.change_percent
+        
+        # 保存当前股价，并写入历史库
+        self.current_stock_price = current_price
+        if self.quote_store is not None:
+            self.quote_store.record_quote(quote)
+        
+        # 根据最新价格安排下一次刷新
+        if code not in self.refresh_scheduler:
+            self.refresh_scheduler.add(code)
+            if self.last_plan is not None:
+                self.refresh_scheduler.set_levels(code, self.last_plan.buy_prices)
+        self.refresh_scheduler.record_quote(code, current_price, fresh=not manual)
+        self.fill_tracker.on_tick(code, current_price)
+        
+        # 更新UI显示
+        self.stock_name_label.setText(f"股票名称: {stock_name}")
+        self.stock_price_label.setText(f"当前价格: {current_price}")
+        
+        # 根据涨跌幅设置颜色
+        change_text = f"涨跌幅: {change_percent:.2f}%"
+        if change_percent > 0:
+            self.stock_change_label.setStyleSheet("color: red")
+            change_text = "涨跌幅: +" + change_text[5:]
+        elif change_percent < 0:
+            self.stock_change_label.setStyleSheet("color: green")
+        else:
+            self.stock_change_label.setStyleSheet("")
+        
+        self.stock_change_label.setText(change_text)
+        self.stock_high_label.setText(f"最高: {today_high}")
+        self.stock_low_label.setText(f"最低: {today_low}")
+        
+        # 自动填充当前价格到价格输入框；已生成计划后自动刷新不改动计划参数
+        if manual or self.last_plan is None:
+            self.current_price_edit.setText(str(current_price))
+        elif self.chart is not None:
+            # 在平均成本图上移动实时价格线
+            self.chart.update_live_price(current_price)
+        
+        if manual:
+            # 获取额外的基本面数据
+            self.get_stock_fundamentals(self.stock_code_edit.text().strip())
+            
+            # 启动自动刷新
+            if not self.refresh_timer.isActive():
+                self.refresh_timer.start(REFRESH_TICK_MS)
+    
+    def on_fill_event(self, kind, symbol, payload):
+        """加仓价位成交或跌破止损价时更新表格并在状态栏提示"""
+        active = self.fill_tracker.get(symbol)
+        if kind == FILL:
+            last = payload[-1]
+            levels = "、".join(f"第{fill.level + 1}" for fill in payload)
+            self.statusBar().showMessage(
+                f"{symbol} {levels}区间成交，累计投入 {last.cumulative_investment:.2f}元，"
+                f"实际平均成本 {last.avg_cost:.2f}元")
+            if symbol == self.current_stock_code and active.plan is self.last_plan:
+                self.table_model.set_filled(active.filled)
+            # 只在未成交的价位附近加快刷新
+            if symbol in self.refresh_scheduler:
+                self.refresh_scheduler.set_levels(symbol, active.plan.buy_prices[active.filled:])
+        elif kind == STOP:
+            self.statusBar().showMessage(f"{symbol} 当前价 {payload:.2f} 已跌破止损价 "
+                                         f"{active.plan.stop_loss:.2f}")
+    
+    def fill_current_price(self):
+        """将当前股价填充到当前价格输入框"""
+        if self.current_stock_price is not None:
+            self.current_price_edit.setText(str(self.current_stock_price))
+        else:
+            QMessageBox.information(self, "提示", "请先获取股票行情!")
+        
+    def generate_pyramid(self):
+        try:
+            current_price = float(self.current_price_edit.text())
+            stop_loss = float(self.stop_loss_edit.text())
+            capital = float(self.capital_edit.text())
+            
+            # 获取目标价格，如果未填写则默认为当前价格的20%上涨
+            target_price_text = self.target_price_edit.text()
+            if target_price_text:
+                target_price = float(target_price_text)
+            else:
+                target_price = default_target_price(current_price)
+                # 更新到UI
+                self.target_price_edit.setText(f"{target_price:.2f}")
+            
+            if current_price <= stop_loss:
+                QMessageBox.warning(self, "输入错误", "当前价格必须高于止损价格!")
+                return
+                
+            if target_price <= current_price:
+                QMessageBox.warning(self, "输入警告", "目标价格应该高于当前价格，否则可能无法获得盈利！")
+                # 不中断执行，只是警告
+        except ValueError:
+            QMessageBox.warning(self, "输入错误", "请输入有效的数字!")
+            return
+        
+        # 由计划模型在计算线程中按变化的参数增量重算，界面线程只刷新有变化的部分；
+        # 连续修改参数时只应用最后一次的结果
+        symbol = self.current_stock_code
+        self.pipeline.submit('plan', self._update_plan_model,
+                             current_price, stop_loss, capital, target_price,
+                             self.lot_combo.currentData(), self.strategy_combo.currentData(),
+                             on_result=lambda result: self.apply_plan(symbol, *result),
+                             on_error=lambda message: QMessageBox.warning(self, "输入错误", message),
+                             metric='plan.roundtrip')
+    
+    def _update_plan_model(self, current_price, stop_loss, capital, target_price, rules, strategy):
+        """在计算线程中执行，不能直接操作界面控件；计划模型只在这个线程中修改"""
+        self.plan_model.rules = rules
+        self.plan_model.strategy = strategy
+        base = self.plan_model.plan
+        with metrics.span('plan.compute'):
+            diff = self.plan_model.update(current_price, stop_loss, capital, target_price)
+        return self.plan_model.plan, diff, base, self.plan_model.inputs
+    
+    def apply_plan(self, symbol, plan, diff, base, inputs):
+        """在界面线程中应用计算结果"""
+        # diff 是相对 base 计算的；中间有被丢弃的过期结果时改为与界面上的计划比较
+        if base is not self.last_plan:
+            diff = diff_plans(self.last_plan, plan)
+        # 参数相同但换了股票时计划不变，仍要记在新的股票下
+        if not diff and symbol == self.last_plan_symbol:
+            return
+        if diff:
+            with metrics.span('plan.render'):
+                self.render_plan(plan, diff)
+        
+        # 保存生成的数据
+        self.last_plan = plan
+        self.last_plan_inputs = inputs
+        self.last_plan_symbol = symbol
+        
+        # 跟踪成交进度，加仓价位附近加快行情刷新
+        if symbol:
+            active = self.fill_tracker.set_plan(symbol, plan, inputs['rules'])
+            self.table_model.set_filled(active.filled)
+            if symbol in self.refresh_scheduler:
+                self.refresh_scheduler.set_levels(symbol, plan.buy_prices[active.filled:])
+        self.last_generated_data = plan.to_dict()
+        if self.quote_store is not None:
+            self.quote_store.record_plan(plan, symbol, inputs['weight_exponent'],
+                                         strategy=inputs['strategy'], rules=inputs['rules'])
+        
+        # 生成折线图
+        self.plot_chart()
+    
+    def _export_path(self, title):
+        """选择导出文件，返回 (路径, 格式)；取消时路径为空"""
+        path, selected = QFileDialog.getSaveFileName(self, title, "", ";;".join(EXPORT_FILTERS))
+        if not path:
+            return None, None
+        fmt = guess_format(path, OUTPUT_FORMATS, None)
+        if fmt is None:
+            fmt = EXPORT_FILTERS.get(selected, 'csv')
+            path += '.' + fmt
+        return path, fmt
+    
+    def export_plan(self):
+        """导出当前计划的加仓列表，文件中带有计算参数，可以重新导入"""
+        if self.last_plan is None:
+            QMessageBox.information(self, "提示", "请先生成加仓计划!")
+            return
+        path, fmt = self._export_path("导出计划")
+        if not path:
+            return
+        inputs = self.last_plan_inputs
+        try:
+            export_plan(path, self.last_plan, fmt, symbol=self.last_plan_symbol,
+                        weight_exponent=inputs['weight_exponent'], strategy=inputs['strategy'],
+                        rules=inputs['rules'])
+        except (RuntimeError, OSError) as e:
+            QMessageBox.warning(self, "导出失败", str(e))
+            return
+        self.statusBar().showMessage(f"已导出计划到 {path}")
+    
+    def export_quote_history(self):
+        """在后台线程中分块导出历史库中的全部行情"""
+        if self.quote_store is None:
+            QMessageBox.warning(self, "导出失败", "历史库未打开!")
+            return
+        path, fmt = self._export_path("导出行情历史")
+        if not path:
+            return
+        self.statusBar().showMessage("正在导出行情历史...")
+        self.export_pipeline.submit(
+            'export', export_quote_history, path, self.quote_store, None, None, None, fmt,
+            on_result=lambda count: self.statusBar().showMessage(f"已导出 {count} 条行情到 {path}"),
+            on_error=lambda message: QMessageBox.warning(self, "导出失败", message))
+    
+    def import_plan(self):
+        """导入之前导出的计划：填入计算参数，由引擎重新生成"""
+        path, _ = QFileDialog.getOpenFileName(self, "导入计划", "", IMPORT_FILTER)
+        if not path:
+            return
+        try:
+            inputs = read_plan_inputs(path)
+        except (ValueError, RuntimeError, OSError) as e:
+            QMessageBox.warning(self, "导入失败", str(e))
+            return
+        count = len(inputs['current_prices'])
+        if not count:
+            QMessageBox.warning(self, "导入失败", "文件中没有计划!")
+            return
+        
+        notes = [f"文件中有 {count} 个计划，已导入第1个"] if count > 1 else []
+        symbol = inputs['symbols'][0] if inputs['symbols'] else None
+        if symbol:
+            self.select_stock(symbol)
+        self.current_price_edit.setText(f"{inputs['current_prices'][0]:.2f}")
+        self.stop_loss_edit.setText(f"{inputs['stop_losses'][0]:.2f}")
+        self.capital_edit.setText(f"{inputs['capitals'][0]:.2f}")
+        self.target_price_edit.setText(f"{inputs['target_prices'][0]:.2f}")
+        
+        # 界面上没有的选项保持当前设置，并在状态栏说明
+        for combo, value, name in ((self.lot_combo, inputs['rules'], "下单规则"),
+                                   (self.strategy_combo, inputs['strategies'][0], "加仓策略")):
+            index = next((i for i in range(combo.count()) if combo.itemData(i) == value), -1)
+            if index < 0:
+                notes.append(f"{name}不在界面选项中，使用当前设置")
+            else:
+                combo.setCurrentIndex(index)
+        if (inputs['intervals'][0] != self.plan_model.intervals or
+                inputs['weight_exponents'][0] != self.plan_model.weight_exponent):
+            notes.append("区间数或权重指数与界面设置不同，按界面设置重新计算")
+        self.generate_pyramid()
+        self.statusBar().showMessage('；'.join([f"已导入 {path}"] + notes))
+    
+    def on_lot_rules_changed(self, index):
+        """切换交易单位后按新规则重新生成已有的计划"""
+        self.portfolio_panel.rules = self.lot_combo.itemData(index)
+        if self.last_plan is not None:
+            self.generate_pyramid()
+    
+    def on_strategy_changed(self, index):
+        """切换加仓策略后重新生成已有的计划"""
+        self.portfolio_panel.strategy = self.strategy_combo.itemData(index)
+        if self.last_plan is not None:
+            self.generate_pyramid()
+    
+    def on_portfolio_plan_selected(self, symbol, plan):
+        """在组合视图中双击某只股票：用它的参数和分配本金生成单只股票的加仓列表"""
+        self.select_stock(symbol)
+        self.current_price_edit.setText(f"{plan.current_price:.2f}")
+        self.stop_loss_edit.setText(f"{plan.stop_loss:.2f}")
+        self.capital_edit.setText(f"{plan.capital:.2f}")
+        self.target_price_edit.setText(f"{plan.target_price:.2f}")
+        self.generate_pyramid()
+        self.tab_widget.setCurrentIndex(0)
+    
+    def render_plan(self, plan, diff):
+        """将计划模型的变化刷新到表格和风险评估摘要"""
+        # 表格模型只通知有变化的单元格，文字和颜色由视图按需读取
+        self.table_model.set_plan(plan, diff)
+        
+        if not diff.risk_changed:
+            return
+        
+        # 更新风险评估摘要
+        risk = plan.risk_metrics
+        self.max_investment_label.setText(f"最大投入金额: {risk['max_investment']:.2f}元")
+        self.max_drawdown_label.setText(f"最大回撤: {risk['max_drawdown_pct']:.2f}%")
+        self.risk_reward_ratio_label.setText(f"风险收益比: {risk['risk_reward_ratio']:.2f}")
+        self.breakeven_price_label.setText(f"盈亏平衡价格: {risk['breakeven_price']:.2f}元")
+        self.max_return_label.setText(f"最大预期收益率: {risk['max_return']:.2f}%")
+    
+    def diagnostics_sections(self):
+        """诊断面板中显示的各组件运行计数"""
+        sections = {
+            '行情缓存': self.quote_cache.stats(),
+            '基本面': self.fundamentals_provider.stats(),
+            '刷新调度': {
+                'symbols': len(self.refresh_scheduler),
+                'requests_issued': self.refresh_scheduler.requests_issued,
+                'symbols_polled': self.refresh_scheduler.symbols_polled,
+                'deferred_by_budget': self.refresh_scheduler.deferred_by_budget,
+            },
+            '计划模型': {
+                'full_recomputes': self.plan_model.full_recomputes,
+                'partial_recomputes': self.plan_model.partial_recomputes,
+            },
+            '后台任务': self.pipeline.stats(),
+            '导出任务': self.export_pipeline.stats(),
+            '成交跟踪': {
+                'plans': len(self.fill_tracker),
+                'ticks': self.fill_tracker.ticks,
+                'fills': self.fill_tracker.fill_count,
+            },
+        }
+        if self.chart is not None:
+            sections['图表绘制'] = self.chart.render_stats()
+        if self.quote_store is not None:
+            sections['历史库'] = self.quote_store.stats()
+        return sections
+    
+    def ensure_chart(self):
+        """第一次使用时导入matplotlib并创建图表"""
+        if self.chart is None:
+            from pyramid_chart import create_chart_canvas
+            self.chart = create_chart_canvas()
+            self.figure = self.chart.figure
+            self.canvas = self.chart.canvas
+            self.canvas.setMinimumHeight(300)
+            self.chart_layout.addWidget(self.canvas)
+        return self.chart
+    
+    def on_tab_changed(self, index):
+        """切换到图表选项卡时补画最新的计划"""
+        if index == self.chart_tab_index:
+            self.plot_chart()
+    
+    def plot_chart(self):
+        if not self.last_plan or self.last_plan is self.charted_plan:
+            return
+        
+        # 图表选项卡不可见时推迟绘制，切换过去时再画
+        if self.tab_widget.currentIndex() != self.chart_tab_index:
+            return
+        
+        # 图元只在首次绘制时创建，之后原地更新数据
+        self.ensure_chart().update(self.last_plan)
+        self.charted_plan = self.last_plan
+
+    def get_stock_fundamentals(self, stock_code):
+        """获取股票基本面数据：优先使用本地快照，没有时显示标明为估算的演示数据"""
+        try:
+            fundamentals = self.fundamentals_provider.get(stock_code, self.current_stock_price)
+            if fundamentals is None:
+                raise ValueError(f"没有 {stock_code} 的基本面数据")
+            
+            # 更新UI显示基本面数据，快照中缺失的字段显示为 --
+            def text(field, unit=''):
+                value = fundamentals[field]
+                return '--' if value is None else f"{value}{unit}"
+            self.stock_pe_label.setText(f"市盈率(TTM): {text('pe_ratio')}")
+            self.stock_pb_label.setText(f"市净率: {text('pb_ratio')}")
+            self.stock_market_cap_label.setText(f"总市值: {text('market_cap', '亿')}")
+            self.stock_turnover_label.setText(f"换手率: {text('turnover_rate', '%')}")
+            self.stock_dividend_yield_label.setText(f"股息率: {text('dividend_yield', '%')}")
+            if fundamentals['source'] == SOURCE_ESTIMATE:
+                self.fundamentals_source_label.setText("(估算值，非真实数据)")
+                self.fundamentals_source_label.setStyleSheet("color: gray;")
+            else:
+                self.fundamentals_source_label.setText("")
+            self.fundamentals_source_label.setToolTip(self.fundamentals_provider.describe())
+            
+            # 保存这些数据供后续使用
+            self.stock_fundamentals = fundamentals
+            
+            return True
+        
+        except Exception as e:
+            print(f"获取基本面数据失败: {str(e)}")
+            # 默认显示为未知
+            self.stock_pe_label.setText("市盈率(TTM): --")
+            self.stock_pb_label.setText("市净率: --")
+            self.stock_market_cap_label.setText("总市值: --")
+            self.stock_turnover_label.setText("换手率: --")
+            self.stock_dividend_yield_label.setText("股息率: --")
+            self.fundamentals_source_label.setText("")
+            return False
+
+if __name__ == '__main__':
+    # 可选：PYRAMID_METRICS_PORT 开启Prometheus端点，PYRAMID_METRICS_JSON 定期写入统计文件
+    if os.environ.get('PYRAMID_METRICS_PORT'):
+        start_http_server(int(os.environ['PYRAMID_METRICS_PORT']))
+    
+    app = QApplication(sys.argv)
+    if os.environ.get('PYRAMID_METRICS_JSON'):
+        metrics_dumper = JsonDumper(os.environ['PYRAMID_METRICS_JSON']).start()
+        app.aboutToQuit.connect(metrics_dumper.stop)
+    window = PyramidStockTool()
+    window.show()
     sys.exit(app.exec_()) 
\ No newline at end of file
@@ -0,0 +1,268 @@
+"""加仓阶梯策略注册表
+
+一个策略由两部分组成：各区间的资金权重，以及各加仓价位在当前价和止损价之间的分布。
+内置幂次(默认)、线性、等比、斐波那契、波动率间隔和ATR间隔几种，
+也可以用 register_strategy 注册自定义的权重函数和价位分布函数。
+
+归一化后的权重只与 (策略, 区间数[, 权重指数]) 有关，第一次使用时计算并缓存，
+批量计算混合多种策略时同一组权重只生成一次，各场景直接复用。
+"""
+import threading
+
+import numpy as np
+
+# 等比策略相邻区间的权重倍数
+GEOMETRIC_WEIGHT_RATIO = 1.2
+# ATR策略默认的价位间隔：1倍ATR
+DEFAULT_ATR_MULTIPLE = 1.0
+# ATR策略最多的区间数，ATR很小时避免生成过多价位
+MAX_ATR_INTERVALS = 200
+DEFAULT_ATR_PERIOD = 14
+# 每个策略最多缓存的权重向量数量，超过后清空重建
+MAX_CACHED_WEIGHTS = 1024
+
+DEFAULT_STRATEGY = 'power'
+
+
+# ---- 权重函数：levels 为 1..n 的浮点数组 ----
+
+def power_weights(levels, exponent):
+    """第i个区间权重为 i**exponent，越跌越买"""
+    return levels ** exponent
+
+
+def linear_weights(levels):
+    return levels
+
+
+def geometric_weights(levels):
+    return GEOMETRIC_WEIGHT_RATIO ** (levels - 1)
+
+
+def fibonacci_weights(levels):
+    """按斐波那契数列 1, 2, 3, 5, 8... 分配；用整数精确计算后按最大值缩放，区间很多时也不会溢出"""
+    n = len(levels)
+    fib = [1, 2]
+    while len(fib) < n:
+        fib.append(fib[-1] + fib[-2])
+    largest = fib[n - 1]
+    return np.array([f / largest for f in fib[:n]], dtype=np.float64)
+
+
+# ---- 价位分布函数：返回各价位低于当前价的距离 ----
+# levels 为 1..n，n / current_price / stop_loss 为标量或列向量，结果可广播成 (场景数 × 区间数)
+
+def even_spacing(levels, n, current_price, stop_loss):
+    """等距：每个区间相差 (当前价 - 止损价) / n"""
+    return (current_price - stop_loss) / n * levels
+
+
+def geometric_spacing(levels, n, current_price, stop_loss):
+    """等比：相邻价位的跌幅百分比相同"""
+    return current_price * (1 - (stop_loss / current_price) ** (levels / n))
+
+
+def volatility_spacing(levels, n, current_price, stop_loss):
+    """按波动率的平方根规律：价格偏离幅度约与时间的平方根成正比，
+    距离取 sqrt(i/n) 时相邻价位预计间隔相近的时间被触及，越往下价位越密"""
+    return (current_price - stop_loss) * np.sqrt(levels / n)
+
+
+class LadderStrategy:
+    """加仓阶梯策略
+
+    weight_func(levels) 或 weight_func(levels, exponent)(uses_exponent=True 时)返回非负权重；
+    spacing_func(levels, n, current_price, stop_loss) 返回各价位低于当前价的距离，
+    最后一个价位应等于止损价。atr_spaced 为 True 时区间数由 ATR 决定，价位间隔约为 atr_multiple 倍ATR。
+    """
+
+    __slots__ = ('name', 'label', 'weight_func', 'spacing_func', 'uses_exponent',
+                 'atr_spaced', 'atr_multiple', '_cache', '_lock')
+
+    def __init__(self, name, weight_func, spacing_func=even_spacing, label=None,
+                 uses_exponent=False, atr_spaced=False, atr_multiple=DEFAULT_ATR_MULTIPLE):
+        if atr_spaced and atr_multiple <= 0:
+            raise ValueError("ATR倍数必须大于0!")
+        self.name = name
+        self.label = label or name
+        self.weight_func = weight_func
+        self.spacing_func = spacing_func
+        self.uses_exponent = uses_exponent
+        self.atr_spaced = atr_spaced
+        self.atr_multiple = float(atr_multiple)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"LadderStrategy({self.name!r})"
+
+    def __reduce__(self):
+        # 进程池传递时按名称在子进程的注册表中查找，不复制权重缓存
+        return get_strategy, (self.name,)
+
+    def weights(self, n, exponent=None):
+        """n 个区间归一化后的资金比例(只读数组)，结果会被缓存"""
+        n = int(n)
+        key = (n, float(exponent)) if self.uses_exponent else (n, None)
+        ratios = self._cache.get(key)
+        if ratios is not None:
+            return ratios
+
+        levels = np.arange(1, n + 1, dtype=np.float64)
+        raw = self.weight_func(levels, exponent) if self.uses_exponent else self.weight_func(levels)
+        weights = np.asarray(raw, dtype=np.float64)
+        if weights.shape != (n,):
+            raise ValueError(f"策略 {self.name} 的权重数量应为 {n}，实际为 {weights.shape}")
+        total = weights.sum()
+        if not np.isfinite(total) or total <= 0 or (weights < 0).any():
+            raise ValueError(f"策略 {self.name} 的权重必须为非负数且总和大于0!")
+        ratios = weights / total
+        ratios.flags.writeable = False
+
+        with self._lock:
+            if len(self._cache) >= MAX_CACHED_WEIGHTS:
+                self._cache.clear()
+            self._cache[key] = ratios
+        return ratios
+
+    def distances(self, levels, n, current_price, stop_loss):
+        """各价位低于当前价的距离"""
+        return self.spacing_func(levels, n, current_price, stop_loss)
+
+    def atr_intervals(self, current_price, stop_loss, atr):
+        """由ATR决定的区间数，ATR无效时为0；参数可为标量或数组"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            count = np.rint((np.asarray(current_price, dtype=np.float64) - stop_loss)
+                            / (np.asarray(atr, dtype=np.float64) * self.atr_multiple))
+        valid = np.isfinite(count) & (np.asarray(atr) > 0)
+        count = np.clip(np.where(valid, count, 0), 1, MAX_ATR_INTERVALS)
+        return np.where(valid, count, 0).astype(np.int64)
+
+    def cache_size(self):
+        return len(self._cache)
+
+
+_REGISTRY = {}
+# 直接传入的自定义函数对应的匿名策略
+_ANONYMOUS = {}
+
+
+def register_strategy(name, weight_func, spacing_func=even_spacing, label=None,
+                      uses_exponent=False, atr_spaced=False, atr_multiple=DEFAULT_ATR_MULTIPLE,
+                      replace=False):
+    """注册策略并返回 LadderStrategy；同名策略已存在时需要 replace=True"""
+    if name in _REGISTRY and not replace:
+        raise ValueError(f"策略 {name} 已存在")
+    strategy = LadderStrategy(name, weight_func, spacing_func, label,
+                              uses_exponent, atr_spaced, atr_multiple)
+    _REGISTRY[name] = strategy
+    return strategy
+
+
+def get_strategy(strategy=None):
+    """按名称查找策略；None 为默认策略，LadderStrategy 原样返回，
+    可调用对象视为只提供权重函数的自定义策略(价位等距)"""
+    if strategy is None:
+        return _REGISTRY[DEFAULT_STRATEGY]
+    if isinstance(strategy, LadderStrategy):
+        return strategy
+    if callable(strategy):
+        anonymous = _ANONYMOUS.get(strategy)
+        if anonymous is None:
+            name = f"custom:{getattr(strategy, '__qualname__', 'func')}:{id(strategy):x}"
+            anonymous = _ANONYMOUS[strategy] = LadderStrategy(name, strategy)
+            _REGISTRY[name] = anonymous
+        return anonymous
+    try:
+        return _REGISTRY[strategy]
+    except KeyError:
+        raise ValueError(f"未知的加仓策略: {strategy}")
+
+
+def strategy_names():
+    """已注册的策略名称(不含匿名策略)"""
+    return [name for name in _REGISTRY if not name.startswith('custom:')]
+
+
+def process_strategy_name(strategy):
+    """交给进程池任务的策略名称
+
+    子进程只能按名称找到导入模块时注册的策略；直接传入的权重函数(匿名策略)
+    在子进程中不存在，这里提前报错。
+    """
+    strategy = get_strategy(strategy)
+    if strategy.name.startswith('custom:'):
+        raise ValueError("直接传入的权重函数不能在多进程中使用，"
+                         "请用 register_strategy 注册后按名称指定，或只使用一个进程")
+    return strategy.name
+
+
+def strategy_ratios(groups, intervals, exponents, width):
+    """批量场景的资金比例矩阵 (场景数 × width)，超出区间数的位置为0
+
+    groups 为 group_rows 的结果。每种策略内再按 (区间数, 权重指数) 分组，
+    每组从缓存取出同一个权重向量整体写入。
+    """
+    size = len(intervals)
+    ratios = np.zeros((size, width))
+    for strategy, rows in groups:
+        n = intervals[rows]
+        exp = exponents[rows] if strategy.uses_exponent else np.zeros(len(n))
+        if (n == n[0]).all() and (exp == exp[0]).all():
+            # 最常见的情况：整组使用同一个权重向量
+            ratios[rows, :n[0]] = strategy.weights(n[0], exp[0])
+            continue
+        rows = np.arange(size)[rows]
+        keys, inverse = np.unique(np.column_stack([n, exp]), axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        for code, (count, exponent) in enumerate(keys):
+            count = int(count)
+            ratios[rows[inverse == code], :count] = strategy.weights(count, exponent)
+    return ratios
+
+
+def group_rows(names):
+    """按策略分组，产出 (LadderStrategy, 行索引)；只有一种策略时行索引为整个切片"""
+    if not len(names):
+        return
+    if (names == names[0]).all():
+        yield get_strategy(names[0]), slice(None)
+        return
+    unique_names, inverse = np.unique(names, return_inverse=True)
+    for code, name in enumerate(unique_names):
+        yield get_strategy(name), np.flatnonzero(inverse == code)
+
+
+def strategy_names_array(strategies, size):
+    """把单个策略或策略序列转换为长度为 size 的名称数组(定长字符串，分组排序较快)"""
+    if strategies is None or isinstance(strategies, (str, LadderStrategy)) or callable(strategies):
+        return np.full(size, get_strategy(strategies).name)
+    if len(strategies) not in (1, size):
+        raise ValueError(f"策略数量({len(strategies)})与场景数量({size})不一致")
+    # 先对输入去重，每种策略只查找一次
+    codes = {}
+    inverse = np.array([codes.setdefault(s, len(codes)) for s in strategies], dtype=np.int64)
+    names = np.array([get_strategy(s).name for s in codes])[inverse]
+    return np.broadcast_to(names, (size,)) if len(names) == 1 else names
+
+
+def average_true_range(high, low, close, period=DEFAULT_ATR_PERIOD):
+    """最近 period 根K线真实波幅的平均值，没有数据时返回 NaN"""
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    if not len(close):
+        return float('nan')
+    # 第一根K线没有前收盘价，用它自己的收盘价代替
+    prev_close = np.r_[close[0], close[:-1]]
+    true_range = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return float(true_range[-period:].mean())
+
+
+register_strategy('power', power_weights, label="幂次加权(默认)", uses_exponent=True)
+register_strategy('linear', linear_weights, label="线性加权")
+register_strategy('geometric', geometric_weights, geometric_spacing, label="等比(价位等幅下跌)")
+register_strategy('fibonacci', fibonacci_weights, label="斐波那契加权")
+register_strategy('volatility', power_weights, volatility_spacing, label="波动率间隔",
+                  uses_exponent=True)
+register_strategy('atr', power_weights, label="ATR间隔", uses_exponent=True, atr_spaced=True)
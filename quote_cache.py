@@ -0,0 +1,199 @@
+"""行情数据的进程内缓存
+
+按数据类型设置不同的过期时间，超出容量时按LRU淘汰。
+同一代码的并发请求合并成一次加载，上游每个周期最多被请求一次。
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# 各类数据的默认过期时间(秒)
+DEFAULT_TTLS = {
+    'quote': 5,
+}
+DEFAULT_MAXSIZE = 4096
+
+
+def _completed_future(func, *args):
+    """同步执行 func，把结果或异常包装成已完成的 Future"""
+    future = Future()
+    try:
+        future.set_result(func(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+class QuoteCache:
+    """线程安全的 TTL + LRU 缓存，支持请求合并"""
+
+    def __init__(self, ttls=None, maxsize=DEFAULT_MAXSIZE, clock=time.monotonic):
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.maxsize = maxsize
+        self.clock = clock
+
+        self._entries = OrderedDict()  # (类型, 代码) -> (过期时间, 值)
+        self._inflight = {}  # (类型, 代码) -> 正在加载的 Future
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def _lookup(self, entry_key, now):
+        """调用方需持有锁，返回 (是否命中, 值)"""
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            return False, None
+        if entry[0] <= now:
+            del self._entries[entry_key]
+            return False, None
+        self._entries.move_to_end(entry_key)
+        return True, entry[1]
+
+    def _store(self, entry_key, value, now):
+        """调用方需持有锁"""
+        self._entries[entry_key] = (now + self.ttls[entry_key[0]], value)
+        self._entries.move_to_end(entry_key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, kind, key, value):
+        with self._lock:
+            self._store((kind, key), value, self.clock())
+
+    def peek(self, kind, key, default=None):
+        """只读取未过期的缓存值，不触发加载，也不计入命中统计"""
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is None or entry[0] <= self.clock():
+                return default
+            return entry[1]
+
+    def invalidate(self, kind, key=None):
+        """删除某个代码的缓存，key 为 None 时删除该类型的全部缓存"""
+        with self._lock:
+            if key is not None:
+                self._entries.pop((kind, key), None)
+                return
+            for entry_key in [k for k in self._entries if k[0] == kind]:
+                del self._entries[entry_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def submit_many(self, kind, keys, loader):
+        """异步获取多个代码的数据，返回结果为 {代码: 值} 的 Future
+
+        loader(missing_keys) 需返回结果为 {代码: 值} 的 Future，只对未命中
+        且没有在途请求的代码调用一次；已在加载中的代码直接等待原请求。
+        """
+        if kind not in self.ttls:
+            raise KeyError(f"未配置过期时间的数据类型: {kind}")
+
+        values = {}
+        waiting = {}
+        missing = []
+        with self._lock:
+            now = self.clock()
+            for key in dict.fromkeys(keys):
+                entry_key = (kind, key)
+                hit, value = self._lookup(entry_key, now)
+                if hit:
+                    self.hits += 1
+                    values[key] = value
+                elif entry_key in self._inflight:
+                    self.coalesced += 1
+                    waiting[key] = self._inflight[entry_key]
+                else:
+                    self.misses += 1
+                    future = Future()
+                    self._inflight[entry_key] = future
+                    waiting[key] = future
+                    missing.append(key)
+
+        if missing:
+            try:
+                load_future = loader(missing)
+            except Exception as e:
+                load_future = Future()
+                load_future.set_exception(e)
+            load_future.add_done_callback(lambda f: self._finish_load(kind, missing, f))
+
+        return self._combine(values, waiting)
+
+    def _finish_load(self, kind, keys, load_future):
+        """加载完成后写入缓存并唤醒所有等待该代码的请求"""
+        error = load_future.exception()
+        loaded = {} if error else load_future.result()
+        with self._lock:
+            now = self.clock()
+            futures = [self._inflight.pop((kind, key)) for key in keys]
+            if error:
+                self.errors += 1
+            else:
+                for key in keys:
+                    self._store((kind, key), loaded.get(key), now)
+        for key, future in zip(keys, futures):
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(loaded.get(key))
+
+    @staticmethod
+    def _combine(values, waiting):
+        result = Future()
+        if not waiting:
+            result.set_result(values)
+            return result
+
+        remaining = [len(waiting)]
+        lock = threading.Lock()
+
+        def on_key_done(_):
+            with lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if not finished:
+                return
+            try:
+                for key, future in waiting.items():
+                    values[key] = future.result()
+            except Exception as e:
+                result.set_exception(e)
+            else:
+                result.set_result(values)
+
+        for future in list(waiting.values()):
+            future.add_done_callback(on_key_done)
+        return result
+
+    def get_many(self, kind, keys, loader):
+        """同步获取多个代码的数据，loader(missing_keys) 直接返回 {代码: 值}"""
+        return self.submit_many(kind, keys, lambda missing: _completed_future(loader, missing)).result()
+
+    def get(self, kind, key, loader):
+        """同步获取单个代码的数据，loader(key) 直接返回值"""
+        return self.get_many(kind, [key], lambda missing: {missing[0]: loader(missing[0])})[key]
+
+    def stats(self):
+        """命中统计，供诊断面板和日志查看"""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'errors': self.errors,
+                'size': len(self._entries),
+                'inflight': len(self._inflight),
+                'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0
+            }
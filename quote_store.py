@@ -0,0 +1,356 @@
+"""本地行情和加仓计划历史库
+
+使用 SQLite(WAL模式)保存每次获取的行情和每次生成的加仓计划，按股票代码和时间建立索引，
+历史图表、回测和"昨天的计划"都可以直接查询本地数据，无需重新请求。
+写入放入队列，由后台线程按批次在一个事务中提交，界面线程不会等待磁盘。
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from pyramid_engine import DEFAULT_WEIGHT_EXPONENT, LotRules
+from pyramid_strategies import get_strategy
+
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser('~'), '.pyramid_stock_tool', 'history.db')
+# 每个事务最多写入的记录数
+DEFAULT_BATCH_SIZE = 500
+# 队列为空时后台线程最长等待多久提交一次(秒)
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+QUOTE_COLUMNS = ('symbol', 'ts', 'name', 'price', 'open', 'prev_close', 'high', 'low',
+                 'volume', 'amount', 'quote_date', 'quote_time')
+
+QUOTE_HISTORY_DTYPE = np.dtype([
+    ('ts', 'f8'),
+    ('price', 'f8'),
+    ('open', 'f8'),
+    ('prev_close', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('volume', 'f8'),
+    ('amount', 'f8'),
+])
+
+PLAN_COLUMNS = ('symbol', 'ts', 'current_price', 'stop_loss', 'capital', 'target_price',
+                'intervals', 'weight_exponent', 'strategy', 'lot_size', 'commission_rate',
+                'min_commission', 'risk_metrics', 'data')
+# 后来加入 plans 表的列，打开旧的历史库时自动补上；下单规则为空表示按整数股计算、不计佣金
+_ADDED_PLAN_COLUMNS = (('strategy', 'TEXT'), ('lot_size', 'INTEGER'),
+                       ('commission_rate', 'REAL'), ('min_commission', 'REAL'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    symbol TEXT NOT NULL,
+    ts REAL NOT NULL,
+    name TEXT,
+    price REAL,
+    open REAL,
+    prev_close REAL,
+    high REAL,
+    low REAL,
+    volume REAL,
+    amount REAL,
+    quote_date TEXT,
+    quote_time TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_quotes_symbol_ts ON quotes (symbol, ts);
+
+CREATE TABLE IF NOT EXISTS plans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT,
+    ts REAL NOT NULL,
+    current_price REAL NOT NULL,
+    stop_loss REAL NOT NULL,
+    capital REAL NOT NULL,
+    target_price REAL NOT NULL,
+    intervals INTEGER NOT NULL,
+    weight_exponent REAL NOT NULL,
+    strategy TEXT,
+    lot_size INTEGER,
+    commission_rate REAL,
+    min_commission REAL,
+    risk_metrics TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_plans_symbol_ts ON plans (symbol, ts);
+"""
+
+_INSERT = {
+    'quotes': f"INSERT INTO quotes ({', '.join(QUOTE_COLUMNS)}) "
+              f"VALUES ({', '.join('?' * len(QUOTE_COLUMNS))})",
+    'plans': f"INSERT INTO plans ({', '.join(PLAN_COLUMNS)}) "
+             f"VALUES ({', '.join('?' * len(PLAN_COLUMNS))})",
+}
+
+_STOP = object()
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    # WAL模式下 NORMAL 同步级别已能保证数据库不损坏，只可能丢失最近的事务
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+
+def _migrate(connection):
+    """为旧版本创建的 plans 表补上新增的列，旧记录的这些列为空"""
+    existing = {row[1] for row in connection.execute("PRAGMA table_info(plans)")}
+    for name, sql_type in _ADDED_PLAN_COLUMNS:
+        if name not in existing:
+            connection.execute(f"ALTER TABLE plans ADD COLUMN {name} {sql_type}")
+
+
+def _time_range(column, start, end):
+    """生成 ts 范围条件，start/end 为Unix时间戳，None 表示不限"""
+    clauses = []
+    params = []
+    if start is not None:
+        clauses.append(f"{column} >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append(f"{column} < ?")
+        params.append(end)
+    return clauses, params
+
+
+class QuoteStore:
+    """行情和计划的持久化存储，写入在后台线程批量提交"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, clock=time.time):
+        if path != ':memory:':
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.clock = clock
+
+        self._writer = _connect(path)
+        self._writer.executescript(_SCHEMA)
+        _migrate(self._writer)
+        self._writer.commit()
+        # 内存数据库无法跨连接共享，读写共用一个连接
+        self._reader = self._writer if path == ':memory:' else _connect(path)
+        self._read_lock = threading.Lock()
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self.rows_written = 0
+        self.batches_written = 0
+        self.write_errors = 0
+        # 代码 -> 最近一次记录的行情时间(接口返回的日期和时间)，同一笔行情不重复写入
+        self._last_quote_times = {}
+        self.duplicates_skipped = 0
+        self._thread = threading.Thread(target=self._run, name='quote-store-writer', daemon=True)
+        self._thread.start()
+
+    # ---- 写入 ----
+
+    def record_quote(self, quote, timestamp=None):
+        """记录一条 sina_parser.Quote 行情，返回是否写入
+
+        缓存返回的行情、或接口两次更新之间重复获取的行情与上一条的行情时间相同，不再写入。
+        """
+        quote_time = (quote.date, quote.time)
+        if quote.date and quote.time and self._last_quote_times.get(quote.code) == quote_time:
+            self.duplicates_skipped += 1
+            return False
+        ts = self.clock() if timestamp is None else timestamp
+        self._put('quotes', (quote.code, ts, quote.name, quote.price, quote.open, quote.prev_close,
+                             quote.high, quote.low, quote.volume, quote.amount,
+                             quote.date, quote.time))
+        self._last_quote_times[quote.code] = quote_time
+        return True
+
+    def record_quotes(self, quotes, timestamp=None):
+        """批量记录 {代码: Quote}，无数据的代码跳过"""
+        ts = self.clock() if timestamp is None else timestamp
+        for quote in quotes.values():
+            if quote is not None:
+                self.record_quote(quote, ts)
+
+    def record_plan(self, plan, symbol=None, weight_exponent=None, timestamp=None,
+                    strategy=None, rules=None):
+        """记录一次生成的 PyramidPlan 及其输入参数(权重指数、加仓策略和下单规则)"""
+        ts = self.clock() if timestamp is None else timestamp
+        exponent = DEFAULT_WEIGHT_EXPONENT if weight_exponent is None else weight_exponent
+        if rules is None:
+            lot_size = commission_rate = min_commission = None
+        else:
+            lot_size, commission_rate, min_commission = (
+                rules.lot_size, rules.commission_rate, rules.min_commission)
+        self._put('plans', (symbol, ts, float(plan.current_price), float(plan.stop_loss),
+                            float(plan.capital), float(plan.target_price), int(plan.intervals),
+                            float(exponent), get_strategy(strategy).name, lot_size,
+                            commission_rate, min_commission, json.dumps(plan.risk_metrics),
+                            json.dumps(plan.to_dict())))
+
+    def _put(self, table, row):
+        if self._closed:
+            raise RuntimeError("历史库已关闭")
+        self._queue.put((table, row))
+
+    def _run(self):
+        """后台写入线程：攒够一批或等待超时后在一个事务中提交"""
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            while True:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    # flush() 的标记：之前的记录写入后再通知
+                    self._write(batch)
+                    batch = []
+                    item.set()
+                else:
+                    batch.append(item)
+                if stopping or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        if not batch:
+            return
+        rows = {}
+        for table, row in batch:
+            rows.setdefault(table, []).append(row)
+        try:
+            with self._writer:
+                for table, table_rows in rows.items():
+                    self._writer.executemany(_INSERT[table], table_rows)
+        except sqlite3.Error as e:
+            self.write_errors += 1
+            print(f"写入历史库失败: {e}")
+            return
+        self.rows_written += len(batch)
+        self.batches_written += 1
+
+    def flush(self, timeout=None):
+        """等待队列中已有的记录全部写入，返回是否在超时前完成"""
+        if self._closed:
+            return True
+        event = threading.Event()
+        self._queue.put(event)
+        return event.wait(timeout)
+
+    def close(self):
+        """写完剩余记录后关闭数据库"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self._reader is not self._writer:
+            self._reader.close()
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # ---- 查询 ----
+
+    def _query(self, sql, params):
+        with self._read_lock:
+            return self._reader.execute(sql, params).fetchall()
+
+    def symbols(self):
+        """有行情记录的全部股票代码"""
+        return [row[0] for row in self._query("SELECT DISTINCT symbol FROM quotes ORDER BY symbol", ())]
+
+    def quote_history(self, symbol, start=None, end=None):
+        """某只股票在时间范围内的行情，按时间排序返回结构化数组"""
+        clauses, params = _time_range('ts', start, end)
+        where = ' AND '.join(['symbol = ?'] + clauses)
+        rows = self._query(f"SELECT {', '.join(QUOTE_HISTORY_DTYPE.names)} FROM quotes "
+                           f"WHERE {where} ORDER BY ts", [symbol] + params)
+        return np.array(rows, dtype=QUOTE_HISTORY_DTYPE) if rows else np.empty(0, QUOTE_HISTORY_DTYPE)
+
+    def iter_quotes(self, symbols=None, start=None, end=None, chunk_size=10000):
+        """按写入顺序分块读取行情记录(QUOTE_COLUMNS 的元组列表)，用于导出大量历史
+
+        每块是一次独立的查询，按 rowid 续读，读取期间不会一直占用查询连接。
+        """
+        clauses, params = _time_range('ts', start, end)
+        if symbols is not None:
+            symbols = list(symbols)
+            clauses.insert(0, f"symbol IN ({', '.join('?' * len(symbols))})")
+            params = symbols + params
+        where = ' AND '.join(['rowid > ?'] + clauses)
+        sql = (f"SELECT rowid, {', '.join(QUOTE_COLUMNS)} FROM quotes WHERE {where} "
+               f"ORDER BY rowid LIMIT ?")
+        last = 0
+        while True:
+            rows = self._query(sql, [last] + params + [int(chunk_size)])
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [row[1:] for row in rows]
+            if len(rows) < chunk_size:
+                return
+
+    def latest_quote(self, symbol):
+        """最近一次记录的行情字典，没有记录时返回 None"""
+        rows = self._query(f"SELECT {', '.join(QUOTE_COLUMNS)} FROM quotes WHERE symbol = ? "
+                           f"ORDER BY ts DESC LIMIT 1", (symbol,))
+        return dict(zip(QUOTE_COLUMNS, rows[0])) if rows else None
+
+    def _plan_record(self, row):
+        record = dict(zip(('id',) + PLAN_COLUMNS, row))
+        record['risk_metrics'] = json.loads(record['risk_metrics'])
+        record['data'] = json.loads(record['data'])
+        # 可以直接传给 compute_plan 重新计算
+        record['rules'] = (None if record['lot_size'] is None else
+                           LotRules(record['lot_size'], record['commission_rate'],
+                                    record['min_commission']))
+        return record
+
+    def plans(self, symbol=None, start=None, end=None, limit=None):
+        """查询加仓计划记录，按时间倒序返回字典列表
+
+        data 为 PyramidPlan.to_dict() 的内容，rules 为记录的下单规则(LotRules 或 None)。
+        """
+        clauses, params = _time_range('ts', start, end)
+        if symbol is not None:
+            clauses.insert(0, 'symbol = ?')
+            params.insert(0, symbol)
+        sql = f"SELECT id, {', '.join(PLAN_COLUMNS)} FROM plans"
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY ts DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(int(limit))
+        return [self._plan_record(row) for row in self._query(sql, params)]
+
+    def latest_plan(self, symbol=None, before=None):
+        """某个时间点之前最近的一次计划，例如查询昨天收盘前生成的计划"""
+        plans = self.plans(symbol, end=before, limit=1)
+        return plans[0] if plans else None
+
+    def stats(self):
+        return {
+            'pending': self._queue.qsize(),
+            'rows_written': self.rows_written,
+            'batches_written': self.batches_written,
+            'write_errors': self.write_errors,
+            'duplicates_skipped': self.duplicates_skipped,
+        }
@@ -0,0 +1,230 @@
+"""行情自适应刷新调度
+
+根据A股交易时段、与加仓价位的距离和行情是否变化，为每只股票决定下一次刷新时间：
+接近待成交的加仓价位时加快刷新，行情不变或停牌时放慢，午休和收盘后暂停，
+并用令牌桶限制全局每秒请求数。
+"""
+import heapq
+import math
+import time
+from datetime import datetime, timedelta, timezone, time as dtime
+
+import numpy as np
+
+# 中国不实行夏令时，固定使用东八区
+MARKET_TZ = timezone(timedelta(hours=8))
+
+# A股交易时段(含集合竞价)
+TRADING_SESSIONS = (
+    (dtime(9, 15), dtime(11, 30)),
+    (dtime(13, 0), dtime(15, 0)),
+)
+
+DEFAULT_BASE_INTERVAL = 10
+DEFAULT_FAST_INTERVAL = 2
+DEFAULT_SLOW_INTERVAL = 60
+# 当前价距离最近加仓价位在该百分比以内时加快刷新
+DEFAULT_NEAR_LEVEL_PCT = 0.5
+# 连续多少次行情不变后放慢刷新
+DEFAULT_UNCHANGED_THRESHOLD = 6
+DEFAULT_MAX_REQUESTS_PER_SECOND = 2
+# 一次请求可合并的股票数量，与 sina_quote.DEFAULT_BATCH_SIZE 保持一致
+DEFAULT_BATCH_SIZE = 100
+
+
+def is_trading_day(day, holidays=()):
+    return day.weekday() < 5 and day not in holidays
+
+
+def in_trading_session(timestamp, holidays=()):
+    """timestamp 为Unix时间戳，判断是否处于交易时段"""
+    moment = datetime.fromtimestamp(timestamp, MARKET_TZ)
+    if not is_trading_day(moment.date(), holidays):
+        return False
+    now = moment.time()
+    return any(start <= now < end for start, end in TRADING_SESSIONS)
+
+
+def seconds_until_session(timestamp, holidays=()):
+    """距离下一个交易时段开始的秒数，处于交易时段内时返回0"""
+    if in_trading_session(timestamp, holidays):
+        return 0.0
+    moment = datetime.fromtimestamp(timestamp, MARKET_TZ)
+    day = moment.date()
+    # 节假日最长不过几周，向后查找足够覆盖长假
+    for offset in range(30):
+        current = day + timedelta(days=offset)
+        if not is_trading_day(current, holidays):
+            continue
+        for start, _ in TRADING_SESSIONS:
+            session_start = datetime.combine(current, start, MARKET_TZ)
+            if session_start > moment:
+                return (session_start - moment).total_seconds()
+    raise ValueError("未来30天内没有交易日")
+
+
+class _SymbolState:
+    __slots__ = ('symbol', 'levels', 'last_price', 'unchanged', 'next_due')
+
+    def __init__(self, symbol, levels):
+        self.symbol = symbol
+        self.levels = levels
+        self.last_price = None
+        self.unchanged = 0
+        self.next_due = 0.0
+
+
+class RefreshScheduler:
+    """多只股票的自适应刷新调度器"""
+
+    def __init__(self, base_interval=DEFAULT_BASE_INTERVAL,
+                 fast_interval=DEFAULT_FAST_INTERVAL,
+                 slow_interval=DEFAULT_SLOW_INTERVAL,
+                 near_level_pct=DEFAULT_NEAR_LEVEL_PCT,
+                 unchanged_threshold=DEFAULT_UNCHANGED_THRESHOLD,
+                 max_requests_per_second=DEFAULT_MAX_REQUESTS_PER_SECOND,
+                 batch_size=DEFAULT_BATCH_SIZE,
+                 holidays=(), clock=time.time):
+        self.base_interval = base_interval
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.near_level_pct = near_level_pct
+        self.unchanged_threshold = unchanged_threshold
+        self.max_requests_per_second = max_requests_per_second
+        self.batch_size = batch_size
+        self.holidays = frozenset(holidays)
+        self.clock = clock
+
+        self._states = {}
+        self._heap = []  # (到期时间, 序号, 代码)，过期条目在弹出时丢弃
+        self._sequence = 0
+        self._tokens = float(max_requests_per_second)
+        self._last_refill = clock()
+
+        self.requests_issued = 0
+        self.symbols_polled = 0
+        self.deferred_by_budget = 0
+
+    def __contains__(self, symbol):
+        return symbol in self._states
+
+    def __len__(self):
+        return len(self._states)
+
+    def _schedule(self, state, due):
+        state.next_due = due
+        self._sequence += 1
+        heapq.heappush(self._heap, (due, self._sequence, state.symbol))
+
+    def add(self, symbol, levels=None):
+        """加入调度，立即到期"""
+        state = self._states.get(symbol)
+        if state is None:
+            state = _SymbolState(symbol, None)
+            self._states[symbol] = state
+        if levels is not None:
+            self.set_levels(symbol, levels)
+        self._schedule(state, self.clock())
+
+    def remove(self, symbol):
+        self._states.pop(symbol, None)
+
+    def set_levels(self, symbol, levels):
+        """设置待成交的加仓价位，None 或空表示没有挂单价位"""
+        state = self._states[symbol]
+        if levels is None or len(levels) == 0:
+            state.levels = None
+        else:
+            state.levels = np.sort(np.asarray(levels, dtype=np.float64))
+
+    def is_near_level(self, state, price):
+        """当前价是否接近某个加仓价位"""
+        if state.levels is None or not price:
+            return False
+        index = np.searchsorted(state.levels, price)
+        nearest = min(abs(state.levels[i] - price)
+                      for i in (index - 1, index) if 0 <= i < len(state.levels))
+        return nearest / price * 100 <= self.near_level_pct
+
+    def interval_for(self, state, now):
+        """下一次刷新前等待的秒数"""
+        wait = seconds_until_session(now, self.holidays)
+        if wait > 0:
+            # 午休和收盘后不刷新，等到下一个交易时段开始
+            return wait
+        price = state.last_price
+        if price is not None and price <= 0:
+            # 停牌或未开盘
+            return self.slow_interval
+        if self.is_near_level(state, price):
+            return self.fast_interval
+        if state.unchanged >= self.unchanged_threshold:
+            return self.slow_interval
+        return self.base_interval
+
+    def record_quote(self, symbol, price, now=None, fresh=True):
+        """收到行情后更新状态并安排下一次刷新
+
+        fresh 为 False 表示行情来自缓存，价格相同不说明行情没有变化，不计入连续不变次数。
+        """
+        state = self._states.get(symbol)
+        if state is None:
+            return
+        now = self.clock() if now is None else now
+        if state.last_price is not None and price == state.last_price:
+            if fresh:
+                state.unchanged += 1
+        else:
+            state.unchanged = 0
+        state.last_price = price
+        self._schedule(state, now + self.interval_for(state, now))
+
+    def _refill(self, now):
+        elapsed = max(now - self._last_refill, 0.0)
+        self._last_refill = now
+        self._tokens = min(float(self.max_requests_per_second),
+                           self._tokens + elapsed * self.max_requests_per_second)
+
+    def due(self, now=None):
+        """取出当前到期且在请求预算内的股票代码
+
+        一次批量请求可包含 batch_size 只股票，每次请求消耗一个令牌；
+        超出预算的股票留在队列中，下次调用时优先处理。
+        """
+        now = self.clock() if now is None else now
+        self._refill(now)
+        capacity = int(self._tokens) * self.batch_size
+
+        selected = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, _, symbol = self._heap[0]
+            state = self._states.get(symbol)
+            if state is None or state.next_due != due_at:
+                heapq.heappop(self._heap)
+                continue
+            if len(selected) >= capacity:
+                self.deferred_by_budget += 1
+                break
+            heapq.heappop(self._heap)
+            selected.append(symbol)
+            # 先按当前状态安排下一次，收到行情后会重新安排
+            self._schedule(state, now + self.interval_for(state, now))
+
+        if selected:
+            requests = math.ceil(len(selected) / self.batch_size)
+            self._tokens -= requests
+            self.requests_issued += requests
+            self.symbols_polled += len(selected)
+        return selected
+
+    def seconds_until_next(self, now=None):
+        """距离最近一次到期的秒数，没有调度任务时返回 None"""
+        now = self.clock() if now is None else now
+        while self._heap:
+            due_at, _, symbol = self._heap[0]
+            state = self._states.get(symbol)
+            if state is None or state.next_due != due_at:
+                heapq.heappop(self._heap)
+                continue
+            return max(due_at - now, 0.0)
+        return None
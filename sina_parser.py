@@ -0,0 +1,164 @@
+"""新浪财经行情数据解析
+
+批量响应形如:
+    var hq_str_sh600000="浦发银行,10.20,10.10,...,2025-03-14,15:00:00,00";
+整个响应只做一次GBK解码，逐行用字符串查找切分，不使用正则表达式。
+"""
+import numpy as np
+
+# A股行情字段最少数量(名称到时间共32个)
+MIN_QUOTE_FIELDS = 32
+DEPTH_LEVELS = 5
+
+_PREFIX = 'hq_str_'
+
+
+class Quote:
+    """单只股票的实时行情
+
+    价格和成交字段在构造时转换；五档盘口在首次访问时才转换，
+    批量刷新时大多数记录只用到价格，可省去大部分 float 调用。
+    """
+
+    __slots__ = ('code', 'name', 'open', 'prev_close', 'price', 'high', 'low',
+                 'bid', 'ask', 'volume', 'amount', 'date', 'time', 'status',
+                 '_fields', '_depth')
+
+    def __init__(self, code, fields):
+        self.code = code
+        self.name = fields[0]
+        (self.open, self.prev_close, self.price, self.high, self.low,
+         self.bid, self.ask, self.volume, self.amount) = map(float, fields[1:10])
+        self.date = fields[30]
+        self.time = fields[31]
+        self.status = fields[32] if len(fields) > 32 else ''
+        self._fields = fields
+        self._depth = None
+
+    def _load_depth(self):
+        # 买一至买五、卖一至卖五，字段按 数量,价格 交替排列
+        if self._depth is None:
+            values = list(map(float, self._fields[10:30]))
+            self._depth = (tuple(values[0:10:2]), tuple(values[1:10:2]),
+                           tuple(values[10:20:2]), tuple(values[11:20:2]))
+        return self._depth
+
+    @property
+    def bid_volumes(self):
+        return self._load_depth()[0]
+
+    @property
+    def bid_prices(self):
+        return self._load_depth()[1]
+
+    @property
+    def ask_volumes(self):
+        return self._load_depth()[2]
+
+    @property
+    def ask_prices(self):
+        return self._load_depth()[3]
+
+    @property
+    def change_percent(self):
+        """涨跌幅(%)"""
+        if self.prev_close == 0:
+            return 0.0
+        return (self.price - self.prev_close) / self.prev_close * 100
+
+    @property
+    def is_trading(self):
+        """停牌或未开盘时当前价为0"""
+        return self.price > 0
+
+    def __repr__(self):
+        return f"Quote({self.code}, {self.name}, {self.price})"
+
+
+def iter_payload_lines(data):
+    """逐行产出 (代码, 字段列表)，无数据的代码字段列表为空"""
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode('gbk', errors='replace')
+
+    # 按前缀切分整个缓冲区，每段以 代码="字段" 开头
+    for segment in data.split(_PREFIX)[1:]:
+        eq = segment.find('="')
+        if eq < 0:
+            continue
+        end = segment.find('"', eq + 2)
+        if end < 0:
+            continue
+        body = segment[eq + 2:end]
+        yield segment[:eq], (body.split(',') if body else [])
+
+
+def parse_payload(data):
+    """解析批量行情响应，返回 {代码: Quote}，无数据或格式错误的代码对应 None"""
+    result = {}
+    for code, fields in iter_payload_lines(data):
+        if len(fields) < MIN_QUOTE_FIELDS:
+            result[code] = None
+            continue
+        try:
+            result[code] = Quote(code, fields)
+        except ValueError:
+            result[code] = None
+    return result
+
+
+QUOTE_DTYPE = np.dtype([
+    ('code', 'U12'), ('name', 'U16'),
+    ('open', 'f8'), ('prev_close', 'f8'), ('price', 'f8'),
+    ('high', 'f8'), ('low', 'f8'), ('bid', 'f8'), ('ask', 'f8'),
+    ('volume', 'f8'), ('amount', 'f8'),
+    ('bid_volumes', 'f8', (DEPTH_LEVELS,)), ('bid_prices', 'f8', (DEPTH_LEVELS,)),
+    ('ask_volumes', 'f8', (DEPTH_LEVELS,)), ('ask_prices', 'f8', (DEPTH_LEVELS,)),
+    ('date', 'U10'), ('time', 'U8'), ('status', 'U4'),
+])
+
+
+def parse_payload_array(data):
+    """解析批量行情响应为NumPy结构化数组，跳过无数据或格式错误的代码"""
+    codes = []
+    names = []
+    numbers = []
+    tails = []
+    for code, fields in iter_payload_lines(data):
+        if len(fields) < MIN_QUOTE_FIELDS:
+            continue
+        codes.append(code)
+        names.append(fields[0])
+        numbers.append(fields[1:30])
+        tails.append((fields[30], fields[31], fields[32] if len(fields) > 32 else ''))
+
+    result = np.zeros(len(codes), dtype=QUOTE_DTYPE)
+    if not codes:
+        return result
+
+    # 数值字段整体一次性转换，避免逐个调用float
+    valid = np.ones(len(codes), dtype=bool)
+    try:
+        values = np.array(numbers, dtype=np.float64)
+    except ValueError:
+        # 存在非法数值时逐行转换，丢弃出错的行
+        converted = np.zeros((len(numbers), len(numbers[0])))
+        for i, row in enumerate(numbers):
+            try:
+                converted[i] = [float(v) for v in row]
+            except ValueError:
+                valid[i] = False
+        values = converted
+
+    result['code'] = codes
+    result['name'] = names
+    for offset, name in enumerate(('open', 'prev_close', 'price', 'high', 'low',
+                                   'bid', 'ask', 'volume', 'amount')):
+        result[name] = values[:, offset]
+    result['bid_volumes'] = values[:, 9:19:2]
+    result['bid_prices'] = values[:, 10:19:2]
+    result['ask_volumes'] = values[:, 19:29:2]
+    result['ask_prices'] = values[:, 20:29:2]
+    result['date'] = [t[0] for t in tails]
+    result['time'] = [t[1] for t in tails]
+    result['status'] = [t[2] for t in tails]
+    return result[valid]
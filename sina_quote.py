@@ -0,0 +1,182 @@
+"""新浪财经实时行情客户端
+
+把多个股票代码合并成一次 list=a,b,c 请求，复用 keep-alive 连接，
+在后台线程池中执行，避免阻塞Qt界面线程。
+设置环境变量 PYRAMID_QUOTE_URL 可以把请求指向本地回放服务器(sina_replay_server.py)，
+用于离线测试和压力测试。
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from perf_metrics import metrics, profiler
+from sina_parser import parse_payload
+
+SINA_QUOTE_URL = "http://hq.sinajs.cn/list="
+QUOTE_URL_ENV = 'PYRAMID_QUOTE_URL'
+SINA_HEADERS = {
+    'Referer': 'https://finance.sina.com.cn',
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+# 单次请求合并的股票数量
+DEFAULT_BATCH_SIZE = 100
+# 同时进行的请求数量上限
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_TIMEOUT = 5
+DEFAULT_RETRIES = 3
+# 重试等待时间按 backoff * 2**n 递增
+DEFAULT_BACKOFF = 0.5
+
+
+def format_stock_code(code):
+    """根据股票代码获取带市场前缀的代码"""
+    code = code.strip()
+    if code.startswith('6'):
+        return 'sh' + code
+    elif code.startswith('0') or code.startswith('3'):
+        return 'sz' + code
+    return code
+
+
+def default_quote_url():
+    """环境变量 PYRAMID_QUOTE_URL 指定的地址，未设置时为新浪接口"""
+    return os.environ.get(QUOTE_URL_ENV) or SINA_QUOTE_URL
+
+
+class QuoteFetchError(Exception):
+    """行情请求在重试后仍然失败"""
+
+
+class SinaQuoteClient:
+    """批量、连接复用、带重试的行情客户端"""
+
+    def __init__(self, base_url=None, timeout=DEFAULT_TIMEOUT,
+                 batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_MAX_WORKERS,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, cache=None):
+        self.base_url = base_url or default_quote_url()
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        # 可选的 QuoteCache，多个界面组件共享同一份行情并合并并发请求
+        self.cache = cache
+
+        # 连接池大小与并发数一致，保证每个工作线程都能复用连接
+        self.session = requests.Session()
+        self.session.headers.update(SINA_HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='sina-quote')
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _request(self, codes):
+        """请求一批代码，失败时按指数退避重试；在线程池中执行"""
+        with profiler.worker():
+            return self._request_with_retries(codes)
+
+    def _request_with_retries(self, codes):
+        url = self.base_url + ','.join(codes)
+        for attempt in range(self.retries + 1):
+            try:
+                with metrics.span('quote.http'):
+                    response = self.session.get(url, timeout=self.timeout)
+                    response.raise_for_status()
+            except requests.RequestException as e:
+                if attempt == self.retries:
+                    metrics.increment('quote.failures')
+                    raise QuoteFetchError(f"获取行情失败({','.join(codes[:3])}...): {e}") from e
+                metrics.increment('quote.retries')
+                time.sleep(self.backoff * (2 ** attempt))
+                continue
+            # 直接解析原始字节，整批响应只做一次GBK解码
+            with metrics.span('quote.parse'):
+                return parse_payload(response.content)
+
+    def _batches(self, codes):
+        codes = list(dict.fromkeys(codes))
+        return [codes[i:i + self.batch_size] for i in range(0, len(codes), self.batch_size)]
+
+    def _fetch_uncached(self, codes):
+        result = {}
+        for batch_result in self.executor.map(self._request, self._batches(codes)):
+            result.update(batch_result)
+        return result
+
+    def fetch(self, codes):
+        """阻塞获取多个代码的行情，各批次在线程池中并发请求"""
+        if self.cache is not None:
+            return self.cache.submit_many('quote', codes, self._submit_uncached).result()
+        return self._fetch_uncached(codes)
+
+    def submit(self, codes, fresh=False):
+        """在后台线程获取行情，立即返回 Future
+
+        fresh 为 True 时不读取缓存直接请求(自动刷新按自己的间隔获取最新行情)，结果仍写入缓存。
+        """
+        if self.cache is None:
+            return self._submit_uncached(codes)
+        if not fresh:
+            return self.cache.submit_many('quote', codes, self._submit_uncached)
+        future = self._submit_uncached(codes)
+        future.add_done_callback(self._store_fresh)
+        return future
+
+    def _store_fresh(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        for code, quote in future.result().items():
+            self.cache.put('quote', code, quote)
+
+    def _submit_uncached(self, codes):
+        combined = Future()
+        futures = [self.executor.submit(self._request, batch) for batch in self._batches(codes)]
+        if not futures:
+            combined.set_result({})
+            return combined
+
+        # 所有批次完成后再合并结果，不额外占用工作线程
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def on_batch_done(_):
+            with lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                try:
+                    combined.set_result(self._gather(futures))
+                except Exception as e:
+                    combined.set_exception(e)
+
+        for future in futures:
+            future.add_done_callback(on_batch_done)
+        return combined
+
+    @staticmethod
+    def _gather(futures):
+        result = {}
+        for future in futures:
+            result.update(future.result())
+        return result
+
+    async def fetch_async(self, codes):
+        """asyncio 接口，在事件循环中等待后台线程完成请求"""
+        return await asyncio.wrap_future(self.submit(codes))
@@ -0,0 +1,377 @@
+"""本地新浪行情回放服务器
+
+以与 hq.sinajs.cn 相同的格式(GBK编码、var hq_str_<代码>="..." 行)返回行情，
+用于离线测试和刷新链路的压力测试：
+
+- SyntheticFeed 为任意数量的股票生成随机游走价格，涨跌幅限制在±10%以内；
+- RecordedFeed 回放本地历史库或导出的行情历史(CSV/Parquet)，每只股票逐条播放，播完后从头循环；
+- 行情按 tick_rate(每秒跳动次数)推进，同一次跳动内的重复请求返回相同的行；
+- 可以为每个请求加入固定延迟和随机抖动，按比例返回 503 或直接断开连接，模拟接口不稳定。
+
+设置环境变量 PYRAMID_QUOTE_URL 为服务器地址后，界面和 sina_quote.SinaQuoteClient 都会请求本地服务器。
+GET /stats 返回服务器的请求计数(JSON)。
+
+用法:
+    python sina_replay_server.py --symbols 5000 --tick-rate 2 --latency 30 --error-rate 0.01
+    python sina_replay_server.py --replay ~/.pyramid_stock_tool/history.db
+"""
+import argparse
+import json
+import math
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from refresh_scheduler import MARKET_TZ
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_SYMBOLS = 1000
+# 每秒行情跳动次数，真实接口约为每3秒更新一次
+DEFAULT_TICK_RATE = 1.0
+# 随机游走每次跳动的波动率
+DEFAULT_VOLATILITY = 0.002
+# A股普通股票的涨跌幅限制
+PRICE_LIMIT = 0.10
+
+# 回放历史时读取的列，只有 symbol 和 price 是必需的
+RECORDED_COLUMNS = ('symbol', 'ts', 'name', 'price', 'open', 'prev_close', 'high', 'low',
+                    'volume', 'amount')
+PRICE_FIELDS = ('open', 'prev_close', 'price', 'high', 'low', 'volume', 'amount')
+
+
+def synthetic_codes(count):
+    """沪市主板、深市主板、创业板轮流编号的代码"""
+    codes = []
+    for index in range(count):
+        market = ('sh', 'sz', 'sz')[index % 3]
+        number = (600000, 1, 300001)[index % 3] + index // 3
+        codes.append(f'{market}{number:06d}')
+    return codes
+
+
+class QuoteFeed:
+    """全部股票当前行情的数组，advance(tick) 推进到指定的跳动序号"""
+
+    def __init__(self, codes, names):
+        self.codes = list(codes)
+        self.names = list(names)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.tick = 0
+
+    def __len__(self):
+        return len(self.codes)
+
+    def advance(self, tick):
+        if tick != self.tick:
+            self._step(tick)
+            self.tick = tick
+
+    def _step(self, tick):
+        raise NotImplementedError
+
+    def format_line(self, code, date, time_):
+        """某只股票当前行情的一整行，代码不存在时与新浪一样返回空字符串"""
+        i = self.index.get(code)
+        if i is None:
+            return f'var hq_str_{code}="";\n'
+        open_, prev_close, price, high, low, volume, amount = (
+            float(getattr(self, field)[i]) for field in PRICE_FIELDS)
+        fields = [self.names[i], f'{open_:.2f}', f'{prev_close:.2f}', f'{price:.2f}',
+                  f'{high:.2f}', f'{low:.2f}', f'{max(price - 0.01, 0):.2f}', f'{price:.2f}',
+                  str(int(volume)), f'{amount:.2f}']
+        # 五档买盘和卖盘，数量和价格交替；挂单量由代码和跳动序号决定，同一次跳动内不变
+        for side in (-1, 1):
+            for level in range(5):
+                fields.append(str((i * 7919 + self.tick * 104729 + level * 31 + side) % 1000 * 100))
+                fields.append(f'{max(price + side * 0.01 * (level + (side > 0)), 0):.2f}')
+        fields += [date, time_, '00' if price > 0 else '03']
+        return f'var hq_str_{code}="{",".join(fields)}";\n'
+
+
+class SyntheticFeed(QuoteFeed):
+    """固定随机种子的随机游走行情"""
+
+    def __init__(self, symbols=DEFAULT_SYMBOLS, volatility=DEFAULT_VOLATILITY, seed=0, codes=None):
+        codes = list(codes) if codes is not None else synthetic_codes(symbols)
+        super().__init__(codes, [f'模拟{i:04d}' for i in range(len(codes))])
+        self.volatility = volatility
+        self.rng = np.random.default_rng(seed)
+        count = len(codes)
+        self.prev_close = self.rng.uniform(2, 200, count).round(2)
+        self.open = (self.prev_close * self.rng.uniform(0.97, 1.03, count)).round(2)
+        self.price = self.open.copy()
+        self.high = self.open.copy()
+        self.low = self.open.copy()
+        self.volume = np.zeros(count)
+        self.amount = np.zeros(count)
+        self.upper = (self.prev_close * (1 + PRICE_LIMIT)).round(2)
+        self.lower = (self.prev_close * (1 - PRICE_LIMIT)).round(2)
+
+    def _step(self, tick):
+        # 跳过的多次跳动合并为一步，方差按步数累加
+        steps = max(tick - self.tick, 1)
+        sigma = self.volatility * math.sqrt(steps)
+        count = len(self.codes)
+        price = self.price * np.exp(self.rng.normal(0.0, sigma, count))
+        self.price = np.clip(price, self.lower, self.upper).round(2)
+        np.maximum(self.high, self.price, out=self.high)
+        np.minimum(self.low, self.price, out=self.low)
+        traded = self.rng.integers(1, 500, count) * 100.0 * steps
+        self.volume += traded
+        self.amount += traded * self.price
+
+
+class RecordedFeed(QuoteFeed):
+    """按时间顺序回放记录的行情，每次跳动每只股票前进一条记录"""
+
+    def __init__(self, columns, loop=True):
+        if 'symbol' not in columns or 'price' not in columns:
+            raise ValueError("回放数据至少需要 symbol 和 price 两列")
+        symbols = np.asarray(columns['symbol']).astype(str)
+        if len(symbols) == 0:
+            raise ValueError("回放数据为空")
+        codes, inverse = np.unique(symbols, return_inverse=True)
+        ts = (np.asarray(columns['ts'], dtype=np.float64) if 'ts' in columns
+              else np.arange(len(symbols), dtype=np.float64))
+        # 按 代码、时间 排序后，每只股票的记录连续存放
+        order = np.lexsort((ts, inverse))
+        self.counts = np.bincount(inverse, minlength=len(codes))
+        self.starts = np.concatenate(([0], np.cumsum(self.counts)[:-1]))
+        self.loop = loop
+
+        # 没有价格的记录按停牌处理
+        price = np.nan_to_num(np.asarray(columns['price'], dtype=np.float64)[order])
+        first = np.repeat(price[self.starts], self.counts)
+        # 缺少的列或空值按价格补齐：开盘价和昨收取每只股票的第一条价格
+        fallbacks = {'open': first, 'prev_close': first, 'high': price, 'low': price,
+                     'volume': np.zeros(len(price)), 'amount': np.zeros(len(price))}
+        self.series = {'price': price}
+        for field, fallback in fallbacks.items():
+            if field not in columns:
+                self.series[field] = fallback
+                continue
+            values = np.asarray(columns[field], dtype=np.float64)[order]
+            np.copyto(values, fallback, where=np.isnan(values))
+            self.series[field] = values
+
+        if 'name' in columns:
+            first_names = np.asarray(columns['name'], dtype=object)[order[self.starts]].tolist()
+            names = [name or code for name, code in zip(first_names, codes.tolist())]
+        else:
+            names = codes.tolist()
+        super().__init__(codes.tolist(), names)
+        self._load(0)
+
+    def _load(self, tick):
+        if self.loop:
+            offset = tick % self.counts
+        else:
+            offset = np.minimum(tick, self.counts - 1)
+        rows = self.starts + offset
+        for field, values in self.series.items():
+            setattr(self, field, values[rows])
+
+    def _step(self, tick):
+        self._load(tick)
+
+
+def load_recorded_feed(path, symbols=None, loop=True):
+    """读取本地历史库(.db)或 pyramid_export 导出的行情历史(CSV/Parquet)"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.db', '.sqlite', '.sqlite3'):
+        from quote_store import QuoteStore, QUOTE_COLUMNS
+        with QuoteStore(path) as store:
+            rows = [row for chunk in store.iter_quotes(symbols) for row in chunk]
+        columns = dict(zip(QUOTE_COLUMNS, zip(*rows))) if rows else {}
+        columns = {name: columns[name] for name in RECORDED_COLUMNS if name in columns}
+    else:
+        from pyramid_export import read_columns
+        columns = read_columns(path, RECORDED_COLUMNS)
+        if symbols is not None:
+            wanted = np.isin(np.asarray(columns['symbol']).astype(str), list(symbols))
+            columns = {name: np.asarray(values)[wanted] for name, values in columns.items()}
+    return RecordedFeed(columns, loop=loop)
+
+
+class ReplayQuoteHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 保持连接，与真实接口一样复用连接
+    # 响应头和正文分两次写出，关闭Nagle算法避免与延迟确认叠加出40ms等待
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        path = self.path.split('?')[0]
+        if path == '/stats':
+            self._send(200, 'application/json; charset=utf-8',
+                       json.dumps(server.stats()).encode('utf-8'))
+            return
+        if not path.startswith('/list='):
+            server.count('not_found')
+            self._send(404, 'text/plain; charset=utf-8', b'not found')
+            return
+        if server.require_referer and not self.headers.get('Referer'):
+            # 新浪接口对没有 Referer 的请求返回403
+            server.count('forbidden')
+            self._send(403, 'text/plain; charset=utf-8', b'Kinsoku jikou desu!')
+            return
+
+        delay, fault = server.draw_fault()
+        if delay > 0:
+            time.sleep(delay)
+        if fault == 'disconnect':
+            # 不返回任何内容直接断开，客户端会收到连接错误
+            self.close_connection = True
+            return
+        if fault == 'error':
+            self._send(503, 'text/plain; charset=utf-8', b'service unavailable')
+            return
+        codes = [code for code in path[len('/list='):].split(',') if code]
+        self._send(200, 'application/javascript; charset=GBK', server.render(codes))
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayQuoteServer(ThreadingHTTPServer):
+    """多线程回放服务器；latency/jitter 单位为秒，error_rate/disconnect_rate 为每个请求的概率"""
+
+    daemon_threads = True
+
+    def __init__(self, feed, host=DEFAULT_HOST, port=DEFAULT_PORT, tick_rate=DEFAULT_TICK_RATE,
+                 latency=0.0, jitter=0.0, error_rate=0.0, disconnect_rate=0.0,
+                 require_referer=True, seed=None, clock=time.monotonic):
+        super().__init__((host, port), ReplayQuoteHandler)
+        self.feed = feed
+        self.tick_rate = tick_rate
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.disconnect_rate = disconnect_rate
+        self.require_referer = require_referer
+        self.clock = clock
+        self.started = clock()
+        self.random = random.Random(seed)
+        # 行情推进、行缓存和计数都在这把锁内修改
+        self._lock = threading.Lock()
+        self._lines = {}
+        self._counters = dict.fromkeys(('requests', 'symbols', 'errors', 'disconnects',
+                                        'forbidden', 'not_found'), 0)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/list='
+
+    def current_tick(self):
+        if self.tick_rate <= 0:
+            return 0
+        return int((self.clock() - self.started) * self.tick_rate)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def draw_fault(self):
+        """本次请求的延迟(秒)和注入的故障(None、'error' 或 'disconnect')"""
+        with self._lock:
+            self._counters['requests'] += 1
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter > 0 else 0.0)
+            roll = self.random.random()
+            if roll < self.disconnect_rate:
+                self._counters['disconnects'] += 1
+                return delay, 'disconnect'
+            if roll < self.disconnect_rate + self.error_rate:
+                self._counters['errors'] += 1
+                return delay, 'error'
+        return delay, None
+
+    def render(self, codes):
+        """当前跳动的GBK响应正文，每个代码的行在同一次跳动内只格式化一次"""
+        tick = self.current_tick()
+        with self._lock:
+            if tick != self.feed.tick:
+                self.feed.advance(tick)
+                self._lines.clear()
+            now = datetime.now(MARKET_TZ)
+            date, time_ = now.strftime('%Y-%m-%d'), now.strftime('%H:%M:%S')
+            parts = []
+            for code in codes:
+                line = self._lines.get(code)
+                if line is None:
+                    line = self._lines[code] = self.feed.format_line(code, date, time_).encode('gbk')
+                parts.append(line)
+            self._counters['symbols'] += len(codes)
+        return b''.join(parts)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats.update(tick=self.current_tick(), feed_symbols=len(self.feed),
+                     uptime=self.clock() - self.started)
+        return stats
+
+
+def start_replay_server(feed=None, host=DEFAULT_HOST, port=0, **options):
+    """在后台线程启动回放服务器，port 为0时自动分配端口；feed 为空时生成默认数量的模拟行情"""
+    server = ReplayQuoteServer(feed if feed is not None else SyntheticFeed(), host, port, **options)
+    threading.Thread(target=server.serve_forever, name='replay-quote-server', daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地新浪行情回放服务器")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--symbols', type=int, default=DEFAULT_SYMBOLS, help="模拟的股票数量")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    parser.add_argument('--volatility', type=float, default=DEFAULT_VOLATILITY,
+                        help="每次跳动的价格波动率")
+    parser.add_argument('--replay', help="回放历史库(.db)或导出的行情历史(CSV/Parquet)，代替模拟行情")
+    parser.add_argument('--no-loop', action='store_true', help="回放到最后一条后停在最后的价格")
+    parser.add_argument('--tick-rate', type=float, default=DEFAULT_TICK_RATE,
+                        help="每秒行情跳动次数，0 表示行情不变")
+    parser.add_argument('--latency', type=float, default=0.0, help="每个请求的固定延迟(毫秒)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="额外的随机延迟上限(毫秒)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="返回503的请求比例")
+    parser.add_argument('--disconnect-rate', type=float, default=0.0, help="直接断开连接的请求比例")
+    parser.add_argument('--no-referer-check', action='store_true', help="不要求请求带 Referer")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.replay:
+            feed = load_recorded_feed(args.replay, loop=not args.no_loop)
+        else:
+            feed = SyntheticFeed(args.symbols, args.volatility, args.seed)
+    except (ValueError, RuntimeError, OSError) as e:
+        parser.error(str(e))
+    server = ReplayQuoteServer(feed, args.host, args.port, tick_rate=args.tick_rate,
+                               latency=args.latency / 1000, jitter=args.jitter / 1000,
+                               error_rate=args.error_rate, disconnect_rate=args.disconnect_rate,
+                               require_referer=not args.no_referer_check, seed=args.seed)
+    print(f"行情回放服务器已启动: {len(feed)} 只股票，每秒跳动 {args.tick_rate:g} 次")
+    print(f"设置环境变量 PYRAMID_QUOTE_URL={server.base_url} 后启动程序即可使用")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats(), ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
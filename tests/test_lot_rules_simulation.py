@@ -0,0 +1,45 @@
+import numpy as np
+
+from pyramid_backtest import BAR_DTYPE, backtest_bars, main as backtest_main
+from pyramid_engine import A_SHARE_RULES, DEFAULT_TARGET_RATIO, compute_plan
+from pyramid_montecarlo import simulate_inputs
+
+
+def _falling_bars(count=60):
+    """从10元逐日下跌到7元，所有加仓价位都会成交，最后跌破止损价"""
+    bars = np.zeros(count, dtype=BAR_DTYPE)
+    bars['timestamp'] = np.arange('2024-01-01', count, dtype='datetime64[D]')[:count]
+    closes = np.linspace(10, 7, count)
+    bars['open'] = np.concatenate(([10.0], closes[:-1]))
+    bars['close'] = closes
+    bars['high'] = np.maximum(bars['open'], closes)
+    bars['low'] = np.minimum(bars['open'], closes)
+    return bars
+
+
+def test_backtest_uses_whole_lots_and_commission():
+    result = backtest_bars(_falling_bars(), 100000, 20, rules=A_SHARE_RULES)
+    plan = compute_plan(10, 8, 100000, 10 * DEFAULT_TARGET_RATIO, rules=A_SHARE_RULES)
+    assert result['shares'] % 100 == 0
+    assert result['shares'] == int(plan.shares.sum())
+    # 每个价位都按计划价格成交，投入资金与计划一致(含佣金)
+    assert np.isclose(result['capital_deployed'], plan.cumulative_investments[-1])
+
+
+def test_backtest_cli_lot_size(tmp_path, capsys):
+    bars = _falling_bars()
+    path = tmp_path / 'sh600000.csv'
+    lines = ['timestamp,open,high,low,close,volume']
+    lines += [f"{b['timestamp']},{b['open']},{b['high']},{b['low']},{b['close']},0" for b in bars]
+    path.write_text('\n'.join(lines), encoding='utf-8')
+    output = tmp_path / 'result.csv'
+    assert backtest_main([str(path), '--capital', '100000', '--stop-loss-pct', '20',
+                          '--lot-size', '100', '-o', str(output)]) == 0
+    header, row = output.read_text(encoding='utf-8').splitlines()[:2]
+    assert int(dict(zip(header.split(','), row.split(',')))['shares']) % 100 == 0
+
+
+def test_montecarlo_uses_lot_rules():
+    plan = compute_plan(10, 8, 100000, rules=A_SHARE_RULES)
+    result = simulate_inputs(10, 8, 100000, rules=A_SHARE_RULES, paths=2000, seed=1)
+    assert np.isclose(result['max_capital_used'], plan.cumulative_investments[-1])
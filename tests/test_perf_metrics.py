@@ -0,0 +1,54 @@
+import cProfile
+
+import pytest
+
+import perf_metrics
+from perf_metrics import Profiler
+from worker_pipeline import WorkerPipeline
+
+
+def _square(x):
+    return x * x
+
+
+@pytest.fixture
+def pipeline_profiler(monkeypatch, qapp):
+    """流水线和行情客户端使用的进程内分析器换成新的实例"""
+    import worker_pipeline
+    profiler = Profiler()
+    monkeypatch.setattr(worker_pipeline, 'profiler', profiler)
+    pipeline = WorkerPipeline()
+    yield pipeline, profiler
+    profiler.stop()
+    pipeline.close(wait=True)
+
+
+def _run_job(pipeline):
+    results = []
+    pipeline.submit('plan', _square, 7, on_result=results.append,
+                    on_error=lambda message: results.append(('error', message)))
+    assert pipeline.wait(timeout=10)
+    return results
+
+
+def test_pipeline_job_runs_while_profiling(pipeline_profiler):
+    pipeline, profiler = pipeline_profiler
+    profiler.start()
+    assert _run_job(pipeline) == [49]
+    text = profiler.stop(limit=None)
+    if not perf_metrics.PROFILE_ALL_THREADS:
+        assert '_square' in text
+
+
+def test_worker_skips_profiling_when_another_tool_is_active(pipeline_profiler, monkeypatch):
+    pipeline, profiler = pipeline_profiler
+    profiler.start()
+
+    class ActiveProfile(cProfile.Profile):
+        def enable(self, *args, **kwargs):
+            raise ValueError("Another profiling tool is already active")
+
+    monkeypatch.setattr(perf_metrics, 'PROFILE_ALL_THREADS', False)
+    monkeypatch.setattr(cProfile, 'Profile', ActiveProfile)
+    assert _run_job(pipeline) == [49]
+    assert profiler._workers == []
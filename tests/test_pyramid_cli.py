@@ -0,0 +1,25 @@
+import numpy as np
+
+import pyramid_cli
+from pyramid_engine import compute_plans_batch
+from pyramid_export import read_plan_inputs
+
+
+def test_level_export_round_trip(tmp_path):
+    scenarios = tmp_path / 'scenarios.csv'
+    scenarios.write_text('symbol,current_price,stop_loss,capital,intervals\n'
+                         'sh600000,10,8,100000,5\n'
+                         'sz000001,20,17,50000,4\n', encoding='utf-8')
+    output = tmp_path / 'levels.csv'
+    assert pyramid_cli.main([str(scenarios), '--levels', '-o', str(output),
+                             '--lot-size', '100']) == 0
+
+    inputs = read_plan_inputs(str(output))
+    assert list(inputs['symbols']) == ['sh600000', 'sz000001']
+    np.testing.assert_allclose(inputs['current_prices'], [10, 20])
+    np.testing.assert_array_equal(inputs['intervals'], [5, 4])
+    assert inputs['rules'] is not None and inputs['rules'].lot_size == 100
+
+    inputs.pop('symbols')
+    batch = compute_plans_batch(include_ladders=True, **inputs)
+    assert (batch.shares[batch.mask] % 100 == 0).all()
@@ -0,0 +1,23 @@
+from pyramid_optimizer import ParameterOptimizer, optimize_parameters
+
+
+def _search(**kwargs):
+    return optimize_parameters(10.0, 100000.0, 15.0, intervals=(5, 10),
+                               weight_exponents=(1, 2), stop_loss_pcts=(10, 30, 50),
+                               max_workers=1, **kwargs)
+
+
+def test_max_loss_removes_candidates():
+    unlimited = _search()
+    assert max(r['stop_loss_amount'] for r in unlimited) > 10000
+
+    limited = _search(max_loss=10000)
+    assert limited
+    assert all(r['stop_loss_amount'] <= 10000 for r in limited)
+    assert [r for r in unlimited if r['stop_loss_amount'] > 10000][0] not in limited
+
+
+def test_max_loss_changes_checkpoint_fingerprint():
+    first = ParameterOptimizer(10.0, 100000.0, 15.0, max_loss=10000)
+    second = ParameterOptimizer(10.0, 100000.0, 15.0, max_loss=20000)
+    assert first._fingerprint() != second._fingerprint()
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from pyramid_backtest import backtest_files
+from pyramid_strategies import process_strategy_name, strategy_names_array
+
+
+def test_strategy_names_array_lengths():
+    assert list(strategy_names_array(['linear'], 3)) == ['linear'] * 3
+    assert list(strategy_names_array(['linear', 'power'], 2)) == ['linear', 'power']
+    with pytest.raises(ValueError, match="策略数量"):
+        strategy_names_array(['linear', 'power'], 3)
+
+
+def test_custom_weight_function_rejected_for_process_pool():
+    def custom(levels):
+        return np.sqrt(levels)
+
+    assert process_strategy_name('fibonacci') == 'fibonacci'
+    with pytest.raises(ValueError, match="register_strategy"):
+        process_strategy_name(custom)
+    with pytest.raises(ValueError, match="register_strategy"):
+        list(backtest_files(['a.csv', 'b.csv'], 100000, 20, max_workers=2, strategy=custom))
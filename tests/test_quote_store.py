@@ -0,0 +1,24 @@
+from quote_store import QuoteStore
+from sina_parser import parse_payload
+from sina_replay_server import SyntheticFeed
+
+
+def _quote(feed, code, time_):
+    payload = feed.format_line(code, '2025-03-10', time_).encode('gbk')
+    return parse_payload(payload)[code]
+
+
+def test_repeated_quote_is_recorded_once():
+    feed = SyntheticFeed(symbols=2)
+    code = feed.codes[0]
+    with QuoteStore(':memory:') as store:
+        first = _quote(feed, code, '10:00:00')
+        assert store.record_quote(first)
+        # 缓存返回的同一笔行情
+        assert not store.record_quote(first)
+        assert not store.record_quote(_quote(feed, code, '10:00:00'))
+        assert store.record_quote(_quote(feed, code, '10:00:03'))
+        assert store.record_quote(_quote(feed, feed.codes[1], '10:00:00'))
+        store.flush()
+        assert len(store.quote_history(code)) == 2
+        assert store.stats()['duplicates_skipped'] == 2
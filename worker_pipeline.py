@@ -0,0 +1,183 @@
+"""后台任务管道：行情获取/解析和计划计算在工作线程中进行，界面线程只接收最终结果
+
+每个任务有一个键(如 ('quote', 代码)、'plan')。同一个键的新请求会取代旧请求：
+还在排队的旧任务直接取消，已经在运行的旧任务结果到达后丢弃，
+因此界面上只会应用每个键最新一次请求的结果。
+
+结果在工作线程中通过信号发出，回调在界面线程中执行，可以直接操作控件。
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from PyQt5.QtCore import QObject, QCoreApplication, pyqtSignal
+
+from perf_metrics import metrics, profiler
+
+# 计划计算只用一个线程：任务按提交顺序执行，计划模型不会被并发修改
+DEFAULT_WORKERS = 1
+
+
+class _Skipped:
+    """任务开始运行前已被新请求取代"""
+
+
+SKIPPED = _Skipped()
+
+
+class _Task:
+    __slots__ = ('token', 'future', 'on_result', 'on_error', 'owned', 'metric', 'start')
+
+    def __init__(self, token, future, on_result, on_error, owned, metric):
+        self.token = token
+        self.future = future
+        self.on_result = on_result
+        self.on_error = on_error
+        self.owned = owned
+        self.metric = metric
+        self.start = metrics.clock()
+
+
+class WorkerPipeline(QObject):
+    """按键管理后台任务，每个键只保留最新的请求"""
+
+    _finished = pyqtSignal(object, int, object)
+    _failed = pyqtSignal(object, int, str)
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, parent=None):
+        super().__init__(parent)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='pipeline-worker')
+        # 键 -> 最新请求的序号；工作线程只读取，用于在开始计算前跳过过期任务
+        self._tokens = {}
+        # 键 -> 尚未把结果交给界面的最新任务
+        self._pending = {}
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.superseded = 0
+        # 跨线程连接，槽函数在本对象所在的界面线程中执行
+        self._finished.connect(self._on_finished)
+        self._failed.connect(self._on_failed)
+
+    def close(self, wait=False):
+        """取消全部请求并关闭线程池；wait 为 True 时等待已经开始运行的任务结束，
+        用于任务仍在使用即将关闭的资源(如导出中的历史库)的情况"""
+        for key in list(self._pending):
+            self.cancel(key)
+        self.executor.shutdown(wait=wait)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def is_pending(self, key):
+        return key in self._pending
+
+    def is_current(self, key, token):
+        return self._tokens.get(key) == token
+
+    def submit(self, key, func, *args, on_result=None, on_error=None, metric=None):
+        """在工作线程中执行 func(*args)，取代同一个键之前的请求，返回请求序号"""
+        token = self._next_token(key)
+        future = self.executor.submit(self._run, key, token, func, args)
+        return self._track(key, token, future, on_result, on_error, True, metric)
+
+    def track(self, key, future, on_result=None, on_error=None, metric=None):
+        """跟踪其他线程池返回的 Future(如行情客户端)；这类 Future 可能被多个请求共享，
+        被取代时不取消，只丢弃结果"""
+        token = self._next_token(key)
+        return self._track(key, token, future, on_result, on_error, False, metric)
+
+    def cancel(self, key):
+        """取消某个键的请求：排队中的任务不再执行，运行中的任务结果被丢弃"""
+        self._tokens[key] = self._tokens.get(key, 0) + 1
+        self._drop(key)
+
+    def wait(self, timeout=None):
+        """等待所有请求完成并执行回调，用于脚本和基准测试；超时返回 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._pending:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            wait([task.future for task in self._pending.values()], remaining)
+            # 结果信号在 Future 完成后才发出，投递到事件队列后由这里分发
+            QCoreApplication.processEvents()
+        return True
+
+    def stats(self):
+        return {
+            'pending': len(self._pending),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'cancelled': self.cancelled,
+            'superseded': self.superseded,
+        }
+
+    def _next_token(self, key):
+        token = self._tokens.get(key, 0) + 1
+        self._tokens[key] = token
+        self._drop(key)
+        return token
+
+    def _drop(self, key):
+        task = self._pending.pop(key, None)
+        if task is None:
+            return
+        if task.owned and task.future.cancel():
+            self.cancelled += 1
+        else:
+            self.superseded += 1
+
+    def _track(self, key, token, future, on_result, on_error, owned, metric):
+        task = _Task(token, future, on_result, on_error, owned, metric)
+        self._pending[key] = task
+        self.submitted += 1
+        future.add_done_callback(lambda f: self._dispatch(f, key, task))
+        return token
+
+    def _run(self, key, token, func, args):
+        """在工作线程中执行"""
+        if not self.is_current(key, token):
+            return SKIPPED
+        with profiler.worker():
+            return func(*args)
+
+    def _dispatch(self, future, key, task):
+        """在工作线程中执行，不能直接操作界面控件"""
+        if future.cancelled():
+            return
+        if task.metric:
+            metrics.observe(task.metric, metrics.clock() - task.start)
+        try:
+            result = future.result()
+        except Exception as e:
+            self._failed.emit(key, task.token, str(e))
+            return
+        if result is not SKIPPED:
+            self._finished.emit(key, task.token, result)
+
+    def _take(self, key, token):
+        """取出仍是最新请求的任务，过期的返回 None"""
+        task = self._pending.get(key)
+        if task is None or task.token != token:
+            return None
+        del self._pending[key]
+        return task
+
+    def _on_finished(self, key, token, result):
+        task = self._take(key, token)
+        if task is None:
+            return
+        self.completed += 1
+        if task.on_result is not None:
+            task.on_result(result)
+
+    def _on_failed(self, key, token, message):
+        task = self._take(key, token)
+        if task is None:
+            return
+        self.failed += 1
+        if task.on_error is not None:
+            task.on_error(message)